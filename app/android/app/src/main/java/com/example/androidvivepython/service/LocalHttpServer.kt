@@ -444,19 +444,38 @@ class LocalHttpServer(
             uri == "/builtins/stt" && session.method == Method.POST -> {
                 return jsonError(Response.Status.NOT_IMPLEMENTED, "not_implemented", JSONObject().put("feature", "stt"))
             }
-            (uri == "/brain/status" || uri == "/brain/messages" || uri == "/brain/sessions") && session.method == Method.GET -> {
+            (uri == "/brain/status" || uri == "/brain/messages" || uri == "/brain/sessions" || uri == "/brain/search") && session.method == Method.GET -> {
                 if (runtimeManager.getStatus() != "ok") {
                     runtimeManager.startWorker()
                     waitForPythonHealth(5000)
                 }
+                // Long polls (/brain/messages?since_id=...&wait_ms=...) hold the request for up to 30s.
+                val waitMs = firstParam(session, "wait_ms").toIntOrNull()?.coerceIn(0, 30000) ?: 0
                 val proxied = proxyWorkerRequest(
                     path = uri,
                     method = "GET",
                     body = null,
-                    query = session.queryParameterString
+                    query = session.queryParameterString,
+                    readTimeoutMs = 5000 + waitMs
                 )
                 proxied ?: jsonError(Response.Status.SERVICE_UNAVAILABLE, "python_unavailable")
             }
+            uri == "/brain/messages/stream" && session.method == Method.GET -> {
+                if (runtimeManager.getStatus() != "ok") {
+                    runtimeManager.startWorker()
+                    waitForPythonHealth(5000)
+                }
+                val proxied = proxyWorkerEventStream(uri, session.queryParameterString)
+                proxied ?: jsonError(Response.Status.SERVICE_UNAVAILABLE, "python_unavailable")
+            }
+            uri.startsWith("/brain/blobs/") && session.method == Method.GET -> {
+                if (runtimeManager.getStatus() != "ok") {
+                    runtimeManager.startWorker()
+                    waitForPythonHealth(5000)
+                }
+                val proxied = proxyWorkerBlob(uri, session.headers["range"])
+                proxied ?: jsonError(Response.Status.SERVICE_UNAVAILABLE, "python_unavailable")
+            }
             (uri == "/brain/start" || uri == "/brain/stop" || uri == "/brain/inbox/chat" || uri == "/brain/inbox/event" || uri == "/brain/debug/comment") && session.method == Method.POST -> {
                 if (runtimeManager.getStatus() != "ok") {
                     runtimeManager.startWorker()
@@ -3952,7 +3971,8 @@ class LocalHttpServer(
         path: String,
         method: String,
         body: String? = null,
-        query: String? = null
+        query: String? = null,
+        readTimeoutMs: Int = 5000
     ): Response? {
         return try {
             val fullPath = if (!query.isNullOrBlank()) "$path?$query" else path
@@ -3960,7 +3980,7 @@ class LocalHttpServer(
             val conn = url.openConnection() as java.net.HttpURLConnection
             conn.requestMethod = method
             conn.connectTimeout = 1500
-            conn.readTimeout = 5000
+            conn.readTimeout = readTimeoutMs
             if (method == "POST") {
                 conn.doOutput = true
                 conn.setRequestProperty("Content-Type", "application/json")
@@ -3981,6 +4001,44 @@ class LocalHttpServer(
         }
     }
 
+    // Binary passthrough for worker blobs (tool results/captures); forwards Range for partial reads.
+    private fun proxyWorkerBlob(path: String, range: String?): Response? {
+        return try {
+            val conn = java.net.URL("http://127.0.0.1:8776$path").openConnection() as java.net.HttpURLConnection
+            conn.requestMethod = "GET"
+            conn.connectTimeout = 1500
+            conn.readTimeout = 15000
+            if (!range.isNullOrBlank()) conn.setRequestProperty("Range", range)
+            val code = conn.responseCode
+            val stream = if (code in 200..299) conn.inputStream else (conn.errorStream ?: conn.inputStream)
+            // Blobs can be up to 256 MB: stream them through instead of buffering. NanoHTTPD closes
+            // the body when the response is done, which also releases the worker connection.
+            val body = object : java.io.FilterInputStream(stream) {
+                override fun close() {
+                    try {
+                        super.close()
+                    } finally {
+                        conn.disconnect()
+                    }
+                }
+            }
+            val status = Response.Status.lookup(code) ?: Response.Status.OK
+            val mime = conn.contentType ?: "application/octet-stream"
+            val length = conn.contentLengthLong
+            val response = if (length >= 0) {
+                newFixedLengthResponse(status, mime, body, length)
+            } else {
+                newChunkedResponse(status, mime, body)
+            }
+            for (name in listOf("Content-Range", "Accept-Ranges", "ETag", "Cache-Control")) {
+                conn.getHeaderField(name)?.let { response.addHeader(name, it) }
+            }
+            response
+        } catch (_: Exception) {
+            null
+        }
+    }
+
     // --- Brain config (SharedPreferences) ---
     private val brainPrefs by lazy {
         context.getSharedPreferences("brain_config", Context.MODE_PRIVATE)
@@ -4140,6 +4198,8 @@ class LocalHttpServer(
             .put("enabled", true)
             .put("auto_start", true)
             .put("tool_policy", "required")
+            // Stream Responses API turns so partial replies show up before the whole turn completes.
+            .put("stream", vendor == "openai")
             .put("provider_url", providerUrl)
             .put("model", model)
             .put("api_key_credential", "openai_api_key")
@@ -4421,6 +4481,43 @@ class LocalHttpServer(
         }
     }
 
+    private fun proxyWorkerEventStream(path: String, query: String?): Response? {
+        return try {
+            val qs = if (query.isNullOrBlank()) "" else "?$query"
+            val conn = java.net.URL("http://127.0.0.1:8776$path$qs").openConnection() as java.net.HttpURLConnection
+            conn.requestMethod = "GET"
+            conn.connectTimeout = 5000
+            conn.readTimeout = 0
+            if (conn.responseCode !in 200..299) {
+                val errorStream = conn.errorStream ?: conn.inputStream
+                val errorBody = errorStream.bufferedReader().use { it.readText() }
+                conn.disconnect()
+                return newFixedLengthResponse(
+                    Response.Status.lookup(conn.responseCode) ?: Response.Status.INTERNAL_ERROR,
+                    "application/json",
+                    errorBody
+                )
+            }
+            // Release the worker connection (and its SSE thread) once the client goes away.
+            val body = object : java.io.FilterInputStream(conn.inputStream) {
+                override fun close() {
+                    try {
+                        super.close()
+                    } finally {
+                        conn.disconnect()
+                    }
+                }
+            }
+            val response = newChunkedResponse(Response.Status.OK, "text/event-stream", body)
+            response.addHeader("Cache-Control", "no-cache")
+            response.addHeader("Connection", "keep-alive")
+            response
+        } catch (ex: Exception) {
+            Log.w(TAG, "Brain message stream proxy failed", ex)
+            null
+        }
+    }
+
     private fun waitForPythonHealth(timeoutMs: Long) {
         val deadline = System.currentTimeMillis() + timeoutMs
         while (System.currentTimeMillis() < deadline) {
@@ -0,0 +1,115 @@
+"""
+Per-call latency of control-plane style JSON requests against a local keep-alive stub server.
+
+Compares the previous per-call clients (a fresh urllib connection for tool/control-plane calls, a
+bare requests.post for provider calls) with the shared pooled transport (server/transport.py) and
+the keep-alive KugutzClient (user/lib/kugutz). Against a TLS provider the per-call clients also pay
+a handshake every time, so the gap there is larger than on this plain-HTTP loopback stub.
+
+    python scripts/bench_http_transport.py [--calls 500]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "server"))
+sys.path.insert(0, str(ROOT / "user" / "lib"))
+
+import requests  # noqa: E402
+import transport  # noqa: E402
+from kugutz.client import KugutzClient  # noqa: E402
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle + delayed ACK adds ~40 ms to
+    # every response on a kept-alive connection and the comparison measures the stub, not the client.
+    disable_nagle_algorithm = True
+
+    def _reply(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = json.dumps({"status": "ok", "path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):  # noqa: A002
+        return
+
+
+def _urllib_call(base: str) -> None:
+    req = urllib.request.Request(
+        base + "/tools/device_api/invoke",
+        data=json.dumps({"args": {"action": "camera.status"}}).encode("utf-8"),
+        headers={"Content-Type": "application/json", "Accept": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        json.loads(resp.read().decode("utf-8"))
+
+
+def _measure(fn, calls: int):
+    for _ in range(min(20, calls)):
+        fn()
+    samples = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    body = {"args": {"action": "camera.status"}}
+    pooled = transport.HttpTransport()
+    client = KugutzClient(base)
+    try:
+        results = {
+            "urllib_per_call": _measure(lambda: _urllib_call(base), args.calls),
+            "pooled_transport": _measure(
+                lambda: pooled.request_json("POST", base + "/tools/device_api/invoke", body, timeout_s=5), args.calls
+            ),
+            "requests_post_per_call": _measure(
+                lambda: requests.post(base + "/v1/responses", data=json.dumps(body), timeout=5).json(), args.calls
+            ),
+            "pooled_session_post": _measure(
+                lambda: pooled.post(base + "/v1/responses", data=json.dumps(body), timeout=5).json(), args.calls
+            ),
+            "kugutz_client": _measure(lambda: client.request_json("POST", "/tools/device_api/invoke", body), args.calls),
+        }
+    finally:
+        pooled.close()
+        client.close()
+        server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Per-round CPU cost of assembling Responses API requests for a large session, without the network.
+
+"uncached" repeats what the tool loop did before the prompt-assembly cache: rebuild the tool schema
+list, re-read the policy docs, re-estimate tokens and json.dumps the whole body every round.
+"cached" looks the static parts up once per item and only serializes each round's input.
+
+    python scripts/bench_prompt_assembly.py [--items 50] [--rounds 6] [--messages 400]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "server"))
+
+from agents import runtime as rt  # noqa: E402
+from agents.context import ContextBudget, token_estimator  # noqa: E402
+from agents.prompt_cache import encode_body  # noqa: E402
+from storage.db import Storage  # noqa: E402
+
+
+def _dialogue(messages: int):
+    out = []
+    for i in range(messages):
+        role = "user" if i % 2 == 0 else "assistant"
+        out.append({"role": role, "text": f"message {i}: " + "take a photo and describe the scene. " * 8})
+    return out
+
+
+def _tool_outputs():
+    return [
+        {"type": "function_call_output", "call_id": f"call_{i}", "output": json.dumps({"status": "ok", "items": list(range(50))})}
+        for i in range(3)
+    ]
+
+
+def _uncached_item(brain, cfg, model, dialogue, rounds):
+    durations = []
+    t0 = time.perf_counter()
+    tools = brain._responses_tools()
+    budget = ContextBudget(24000, estimator=token_estimator(model))
+    budget.reserve("tools", json.dumps(tools))
+    system_prompt = str(cfg.get("system_prompt") or "")
+    blob = budget.fit_text("instructions", brain._user_root_policy_blob(), already_used=budget.count(system_prompt))
+    instructions = (system_prompt + "\n\n" + blob).strip()
+    setup = time.perf_counter() - t0
+    for round_idx in range(rounds):
+        t0 = time.perf_counter()
+        inp = [{"role": m["role"], "content": m["text"]} for m in budget.fit_dialogue(dialogue)] if round_idx == 0 else _tool_outputs()
+        body = {"model": model, "tools": tools, "input": inp, "instructions": instructions, "previous_response_id": "resp_x"}
+        json.dumps(body)
+        durations.append(time.perf_counter() - t0)
+    durations[0] += setup
+    return durations
+
+
+def _cached_item(brain, cfg, model, dialogue, rounds):
+    durations = []
+    t0 = time.perf_counter()
+    asm = brain._prompt_assembly(cfg, model)
+    budget = ContextBudget(24000, estimator=token_estimator(model))
+    budget.reserve("tools", asm["tools_json"], tokens=asm["tools_tokens"])
+    budget.fit_text("instructions", asm["policy_blob"], already_used=asm["system_prompt_tokens"], tokens=asm["policy_tokens"])
+    fragments = {"tools": (asm["tools"], asm["tools_json"]), "instructions": (asm["instructions"], asm["instructions_json"])}
+    setup = time.perf_counter() - t0
+    for round_idx in range(rounds):
+        t0 = time.perf_counter()
+        inp = [{"role": m["role"], "content": m["text"]} for m in budget.fit_dialogue(dialogue)] if round_idx == 0 else _tool_outputs()
+        body = {"model": model, "tools": asm["tools"], "input": inp, "instructions": asm["instructions"], "previous_response_id": "resp_x"}
+        encode_body(body, fragments)
+        durations.append(time.perf_counter() - t0)
+    durations[0] += setup
+    return durations
+
+
+def _summary(samples):
+    ms = sorted(s * 1000.0 for s in samples)
+    return {"mean_ms": round(statistics.fmean(ms), 3), "p50_ms": round(ms[len(ms) // 2], 3), "max_ms": round(ms[-1], 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--messages", type=int, default=400)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        user_dir = Path(tmp)
+        (user_dir / "AGENTS.md").write_text("# Agent policy\n" + "- keep outputs short\n" * 400, encoding="utf-8")
+        (user_dir / "TOOLS.md").write_text("# Tools\n" + "- device_api: camera, ssh, python\n" * 300, encoding="utf-8")
+        brain = rt.BrainRuntime(
+            user_dir=user_dir,
+            storage=Storage(user_dir / "app.db"),
+            emit_log=lambda *_: None,
+            shell_exec=lambda *_: {"status": "ok"},
+            tool_invoke=lambda *_: {"status": "ok"},
+        )
+        cfg = brain.get_config()
+        model = "gpt-test"
+        dialogue = _dialogue(args.messages)
+        results = {}
+        for name, fn in (("uncached", _uncached_item), ("cached", _cached_item)):
+            first, later = [], []
+            for _ in range(args.items):
+                durations = fn(brain, cfg, model, dialogue, args.rounds)
+                first.append(durations[0])
+                later.extend(durations[1:])
+            results[name] = {"first_round": _summary(first), "later_rounds": _summary(later) if later else {}}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Storage throughput (ops/sec) for chat insert, chat list and audit insert under concurrent writers.
+
+"per-call" repeats what Storage did before it kept connections open: a fresh sqlite3.connect per
+method call, default rollback journal, and a commit (fsync) per write. "pooled" is the current
+Storage: WAL, per-thread read connections and one queue-fed writer that group-commits.
+
+    python scripts/bench_storage.py [--threads 4] [--ops 300]
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "server"))
+
+from storage import db  # noqa: E402
+from storage.db import Storage  # noqa: E402
+
+
+class PerCallStorage(Storage):
+    """Storage with the old connection-per-call behaviour, running the same SQL."""
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=db.BUSY_TIMEOUT_MS / 1000.0)
+        conn.row_factory = db._row_factory
+        return conn
+
+    def _write(self, fn):
+        conn = self._connect()
+        try:
+            with conn:
+                return fn(conn)
+        finally:
+            conn.close()
+
+
+def _run(storage, threads: int, ops: int, op) -> float:
+    def _worker(t):
+        for i in range(ops):
+            op(storage, t, i)
+
+    workers = [threading.Thread(target=_worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return threads * ops / (time.perf_counter() - t0)
+
+
+OPS = {
+    "chat insert": lambda s, t, i: s.add_chat_message(f"s{t}", "user", f"message {i} " * 20, '{"session_id": "s"}'),
+    "chat list": lambda s, t, i: s.list_chat_messages(f"s{t}", limit=50),
+    "audit insert": lambda s, t, i: s.add_audit("tool_invoked", f'{{"tool": "device_api", "i": {i}}}'),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--ops", type=int, default=300, help="operations per thread")
+    args = ap.parse_args()
+
+    print(f"{args.threads} threads x {args.ops} ops")
+    print(f"{'operation':<14}{'per-call':>12}{'pooled':>12}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as td:
+        stores = {
+            "per-call": PerCallStorage(Path(td) / "per_call.db"),
+            "pooled": Storage(Path(td) / "pooled.db"),
+        }
+        for name, op in OPS.items():
+            rates = {label: _run(storage, args.threads, args.ops, op) for label, storage in stores.items()}
+            print(f"{name:<14}{rates['per-call']:>10.0f}/s{rates['pooled']:>10.0f}/s{rates['pooled'] / rates['per-call']:>9.1f}x")
+        stores["pooled"].close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import json
+from typing import Any, List, Tuple
+
+# Keys emitted first when a dict has to be shrunk, so status/error survive any clipping.
+PRIORITY_KEYS = ("status", "error", "http_status", "code", "path", "truncated", "detail")
+# Large text fields and their per-field caps in shrink mode (other strings get STRING_CAP).
+TEXT_FIELDS = {"content": 4096, "output": 4096, "stderr": 4096, "stdout": 4096, "data_b64": 2048, "body_base64": 2048}
+STRING_CAP = 4096
+MAX_KEYS = 200
+MARKER = "\n...[truncated_for_model]...\n"
+
+
+class _Overflow(Exception):
+    pass
+
+
+class _Writer:
+    """Output chunks with a hard size limit; space for closing brackets of open containers is reserved."""
+
+    def __init__(self, limit: int):
+        self.parts: List[str] = []
+        self.size = 0
+        self.limit = limit
+        self.closing = 0
+
+    def write(self, s: str) -> None:
+        if self.size + len(s) + self.closing > self.limit:
+            raise _Overflow()
+        self.parts.append(s)
+        self.size += len(s)
+
+    def room(self) -> int:
+        return self.limit - self.size - self.closing
+
+    def mark(self) -> Tuple[int, int, int]:
+        return len(self.parts), self.size, self.closing
+
+    def rollback(self, mark: Tuple[int, int, int]) -> None:
+        del self.parts[mark[0]:]
+        self.size = mark[1]
+        self.closing = mark[2]
+
+    def open(self, ch: str, reserve: int = 0) -> None:
+        self.write(ch)
+        self.closing += 1 + reserve
+
+    def release(self, n: int) -> None:
+        self.closing -= n
+
+    def close(self, ch: str) -> None:
+        self.closing -= 1
+        self.parts.append(ch)
+        self.size += 1
+
+
+def _key(k: Any) -> str:
+    # Same key coercion as json.dumps.
+    if isinstance(k, str):
+        return k
+    if isinstance(k, bool):
+        return "true" if k else "false"
+    if k is None:
+        return "null"
+    return str(k)
+
+
+def _scalar(x: Any) -> str:
+    try:
+        return json.dumps(x)
+    except (TypeError, ValueError):
+        return json.dumps(str(x))
+
+
+def _encode_verbatim(x: Any, w: _Writer) -> None:
+    """Exactly json.dumps(x), but gives up as soon as the output passes the limit."""
+    if isinstance(x, str):
+        # Every character encodes to at least one; don't encode a string that can't fit.
+        if len(x) + 2 > w.room():
+            raise _Overflow()
+        w.write(json.dumps(x))
+    elif isinstance(x, dict):
+        w.open("{")
+        for i, (k, v) in enumerate(x.items()):
+            w.write((", " if i else "") + json.dumps(_key(k)) + ": ")
+            _encode_verbatim(v, w)
+        w.close("}")
+    elif isinstance(x, (list, tuple)):
+        w.open("[")
+        for i, it in enumerate(x):
+            if i:
+                w.write(", ")
+            _encode_verbatim(it, w)
+        w.close("]")
+    elif x is None or isinstance(x, (bool, int, float)):
+        w.write(json.dumps(x))
+    else:
+        w.write(_scalar(x))
+
+
+def clip_string(s: str, n: int) -> str:
+    """Keep the head and (when there is room) a 200-char tail of `s` within n characters."""
+    if len(s) <= n:
+        return s
+    tail = 200 if n > 400 + len(MARKER) else 0
+    head = max(0, n - len(MARKER) - tail)
+    return s[:head] + MARKER + (s[-tail:] if tail else "")
+
+
+def _write_clipped(s: str, cap: int, w: _Writer, reserve: int = 0) -> bool:
+    """
+    Write `s` clipped to the cap and the remaining room; returns True if it was clipped.
+    A clipped string leaves `reserve` characters free for whatever the caller appends after it.
+    """
+    n = min(cap, w.room() - 2)
+    if len(s) <= n:
+        encoded = json.dumps(s)
+        if len(encoded) <= w.room():
+            w.write(encoded)
+            return False
+    room = w.room() - reserve
+    n = min(n, room - 2)
+    for _ in range(4):
+        if n < len(MARKER) + 8:
+            break
+        encoded = json.dumps(clip_string(s, n))
+        if len(encoded) <= room:
+            w.write(encoded)
+            return True
+        # Escapes (non-ASCII, quotes, control chars) made it longer than n; shrink proportionally.
+        n = int(n * room / float(len(encoded))) - 1
+    raise _Overflow()
+
+
+def _try(w: _Writer, fn, *args) -> bool:
+    mark = w.mark()
+    try:
+        fn(*args)
+        return True
+    except _Overflow:
+        w.rollback(mark)
+        return False
+
+
+def _encode_shrunk(x: Any, w: _Writer, depth: int, max_list_items: int, max_depth: int) -> None:
+    if depth > max_depth:
+        w.write(json.dumps("(truncated_for_model: max_depth)"))
+    elif isinstance(x, str):
+        _write_clipped(x, STRING_CAP, w)
+    elif isinstance(x, dict):
+        _encode_shrunk_dict(x, w, depth, max_list_items, max_depth)
+    elif isinstance(x, (list, tuple)):
+        w.open("[")
+        written = 0
+        omitted = max(0, len(x) - max_list_items)
+        for idx, it in enumerate(x[:max_list_items]):
+            mark = w.mark()
+            try:
+                if written:
+                    w.write(", ")
+                _encode_shrunk(it, w, depth + 1, max_list_items, max_depth)
+            except _Overflow:
+                w.rollback(mark)
+                omitted = len(x) - idx
+                break
+            written += 1
+        if omitted:
+            _try(w, w.write, (", " if written else "") + json.dumps({"truncated_for_model": True, "omitted_items": omitted}))
+        w.close("]")
+    elif x is None or isinstance(x, (bool, int, float)):
+        w.write(json.dumps(x))
+    else:
+        w.write(_scalar(x))
+
+
+def _encode_shrunk_dict(x: dict, w: _Writer, depth: int, max_list_items: int, max_depth: int) -> None:
+    keys = [k for k in PRIORITY_KEYS if k in x] + [k for k in x if k not in PRIORITY_KEYS]
+    # Keep room for the truncated_for_model flag so clipped values can't crowd it out.
+    flag = ', "truncated_for_model": true'
+    w.open("{", reserve=len(flag))
+    written = 0
+    truncated = False
+    omitted = max(0, len(keys) - MAX_KEYS)
+
+    for idx, k in enumerate(keys[:MAX_KEYS]):
+        v = x[k]
+        mark = w.mark()
+        try:
+            w.write((", " if written else "") + json.dumps(_key(k)) + ": ")
+            if k in TEXT_FIELDS and isinstance(v, str):
+                length = f", {json.dumps(_key(k) + '_len')}: {len(v)}"
+                if _write_clipped(v, TEXT_FIELDS[k], w, reserve=len(length)):
+                    truncated = True
+                    _try(w, w.write, length)
+            else:
+                _encode_shrunk(v, w, depth + 1, max_list_items, max_depth)
+        except _Overflow:
+            w.rollback(mark)
+            omitted = len(keys) - idx
+            break
+        written += 1
+    if omitted:
+        truncated = True
+    w.release(len(flag))
+    if truncated and "truncated_for_model" not in x:
+        if _try(w, w.write, flag if written else flag[2:]):
+            written += 1
+    if omitted:
+        _try(w, w.write, (", " if written else "") + f'"omitted_keys": {omitted}')
+    w.close("}")
+
+
+def dumps_bounded(value: Any, max_chars: int, *, max_list_items: int = 80, max_depth: int = 5) -> str:
+    """
+    JSON-encode `value` into at most `max_chars` characters, writing straight into that budget.
+
+    If the plain encoding fits, the result equals json.dumps(value); that walk stops as soon as the
+    limit is passed, so a multi-megabyte blob is never serialized in full. Otherwise the value is
+    walked once more in shrink mode: priority keys first, long strings clipped (head + tail), lists capped
+    at max_list_items and nesting at max_depth, and anything that no longer fits replaced by
+    truncated_for_model / omitted_keys / omitted_items markers.
+    """
+    max_chars = max(64, int(max_chars))
+    w = _Writer(max_chars)
+    try:
+        _encode_verbatim(value, w)
+        return "".join(w.parts)
+    except _Overflow:
+        pass
+    w = _Writer(max_chars)
+    try:
+        _encode_shrunk(value, w, 0, max(1, int(max_list_items)), max_depth)
+        return "".join(w.parts)
+    except _Overflow:
+        return json.dumps({"truncated_for_model": True, "detail": "tool_output_too_large"})
@@ -0,0 +1,188 @@
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TokenEstimator = Callable[[str], int]
+
+# Rough per-message framing overhead (role, separators) added by chat/responses APIs.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def heuristic_token_count(text: str) -> int:
+    """
+    Cheap tokenizer-free estimate: ~4 characters per token for Latin text, ~1 token per CJK/kana
+    character (Japanese chat is common here), and ~0.7 tokens per character for other non-ASCII text.
+    """
+    if not text:
+        return 0
+    ascii_chars = 0
+    cjk_chars = 0
+    other_chars = 0
+    for ch in text:
+        code = ord(ch)
+        if code < 128:
+            ascii_chars += 1
+        elif 0x3040 <= code <= 0x30FF or 0x3400 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7AF or 0xFF00 <= code <= 0xFFEF:
+            cjk_chars += 1
+        else:
+            other_chars += 1
+    return int(math.ceil(ascii_chars / 4.0 + cjk_chars + other_chars * 0.7))
+
+
+_estimators: List[Tuple[str, TokenEstimator]] = []
+_estimators_lock = threading.Lock()
+
+
+def register_token_estimator(model_prefix: str, estimator: TokenEstimator) -> None:
+    """Use `estimator` for models whose name starts with `model_prefix` (longest prefix wins)."""
+    with _estimators_lock:
+        _estimators[:] = [(p, e) for p, e in _estimators if p != model_prefix]
+        _estimators.append((model_prefix, estimator))
+        _estimators.sort(key=lambda pe: len(pe[0]), reverse=True)
+
+
+def token_estimator(model: str) -> TokenEstimator:
+    name = str(model or "")
+    with _estimators_lock:
+        for prefix, estimator in _estimators:
+            if name.startswith(prefix):
+                return estimator
+    return heuristic_token_count
+
+
+class ContextBudget:
+    """
+    Splits a per-request token budget between prompt sections and records what each one used.
+
+    Fixed costs (tool schemas) are reserved first; the remainder is shared out by `shares`. Sections
+    are filled in order instructions -> memory -> summary -> dialogue, and whatever a section leaves
+    unused rolls over to the dialogue. Tool outputs get their own share per round.
+    """
+
+    DEFAULT_SHARES: Dict[str, float] = {
+        "instructions": 0.25,
+        "memory": 0.10,
+        "summary": 0.08,
+        "dialogue": 0.40,
+        "tool_output": 0.17,
+    }
+
+    def __init__(self, total_tokens: int, *, estimator: Optional[TokenEstimator] = None, shares: Optional[Dict[str, Any]] = None):
+        self.total = max(1000, int(total_tokens or 0))
+        self.count: TokenEstimator = estimator or heuristic_token_count
+        merged = dict(self.DEFAULT_SHARES)
+        for key, value in (shares or {}).items():
+            if key in merged:
+                try:
+                    merged[key] = max(0.0, float(value))
+                except Exception:
+                    pass
+        norm = sum(merged.values()) or 1.0
+        self.shares = {k: v / norm for k, v in merged.items()}
+        self.reserved: Dict[str, int] = {}
+        self.used: Dict[str, int] = {}
+        self._rollover = 0
+
+    def reserve(self, name: str, text: str, *, tokens: Optional[int] = None) -> int:
+        tokens = self.count(text) if tokens is None else int(tokens)
+        self.reserved[name] = self.reserved.get(name, 0) + tokens
+        return tokens
+
+    def available(self) -> int:
+        return max(0, self.total - sum(self.reserved.values()))
+
+    def limit(self, section: str) -> int:
+        base = int(self.available() * self.shares.get(section, 0.0))
+        if section == "dialogue":
+            base += self._rollover
+        return base
+
+    def fit_text(self, section: str, text: str, *, already_used: int = 0, tokens: Optional[int] = None) -> str:
+        """
+        Clip `text` to the section's remaining budget (keeping head and tail) and record usage.
+
+        Pass `tokens` when the count of `text` is already known (e.g. cached) to skip re-estimating.
+        """
+        limit = max(0, self.limit(section) - already_used)
+        tokens = self.count(text) if tokens is None else int(tokens)
+        if tokens > limit:
+            text = clip_to_tokens(text, limit, self.count)
+            tokens = self.count(text)
+        self._record(section, already_used + tokens)
+        return text
+
+    def fit_dialogue(self, messages: List[Dict[str, Any]], *, text_key: str = "text") -> List[Dict[str, Any]]:
+        """
+        Keep the newest messages that fit the dialogue budget (returned oldest-first).
+
+        The newest message is always kept, clipped if it alone exceeds the budget.
+        """
+        limit = self.limit("dialogue")
+        kept: List[Dict[str, Any]] = []
+        used = 0
+        for msg in reversed(messages):
+            text = str(msg.get(text_key) or "")
+            tokens = self.count(text) + MESSAGE_OVERHEAD_TOKENS
+            if used + tokens > limit:
+                if not kept:
+                    room = max(0, limit - MESSAGE_OVERHEAD_TOKENS)
+                    msg = dict(msg, **{text_key: clip_to_tokens(text, room, self.count)})
+                    kept.append(msg)
+                    used += self.count(msg[text_key]) + MESSAGE_OVERHEAD_TOKENS
+                break
+            kept.append(msg)
+            used += tokens
+        self.used["dialogue"] = used
+        return list(reversed(kept))
+
+    def next_round(self) -> None:
+        """Forget the per-item input sections once sent; later rounds carry instructions + tool outputs."""
+        for key in ("memory", "summary", "dialogue"):
+            self.used.pop(key, None)
+        self.reserved.pop("user_turn", None)
+        self.used["tool_output"] = 0
+
+    def tool_output_limit(self, calls: int) -> int:
+        """Token allowance for each of `calls` function outputs sent back in one round."""
+        return max(256, self.limit("tool_output") // max(1, int(calls or 1)))
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        used = dict(self.reserved)
+        for key, value in self.used.items():
+            used[key] = used.get(key, 0) + value
+        out: Dict[str, Any] = {
+            "budget": self.total,
+            "used": used,
+            "total_used": sum(used.values()),
+            "limits": {k: self.limit(k) for k in self.shares},
+        }
+        out.update(extra)
+        return out
+
+    def _record(self, section: str, tokens: int) -> None:
+        self.used[section] = tokens
+        if section in {"instructions", "memory", "summary"}:
+            self._rollover = sum(
+                max(0, int(self.available() * self.shares.get(s, 0.0)) - self.used.get(s, 0))
+                for s in ("instructions", "memory", "summary")
+            )
+
+
+def clip_to_tokens(text: str, max_tokens: int, count: TokenEstimator = heuristic_token_count) -> str:
+    """Shorten `text` to about `max_tokens`, keeping the head and a short tail around a marker."""
+    if max_tokens <= 0:
+        return ""
+    tokens = count(text)
+    if tokens <= max_tokens:
+        return text
+    marker = "\n...[truncated_for_context]...\n"
+    # Scale by the text's own chars/token ratio, then shave until it fits.
+    keep = int(len(text) * (max_tokens / float(tokens))) - len(marker)
+    while keep > 0:
+        tail = min(len(text) // 5, keep // 5)
+        head = keep - tail
+        clipped = text[:head] + marker + (text[-tail:] if tail else "")
+        if count(clipped) <= max_tokens:
+            return clipped
+        keep = int(keep * 0.9)
+    return ""
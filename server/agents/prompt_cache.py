@@ -0,0 +1,61 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class PromptAssemblyCache:
+    """
+    Small LRU of prompt pieces that only change with the brain config or the user-root docs.
+
+    Entries are built once per key (config version, model, AGENTS.md/TOOLS.md signatures) and hold
+    the instructions string and pre-serialized static JSON fragments (tool schemas), so a tool round
+    only has to serialize its dynamic `input`.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self._max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Build outside the lock; two workers racing on a miss build equal entries.
+        entry = build()
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def encode_body(body: Dict[str, Any], fragments: Dict[str, Tuple[Any, str]]) -> str:
+    """
+    json.dumps(body) that splices in pre-serialized values.
+
+    fragments maps key -> (value, value_json); the cached JSON is used only while body[key] is that
+    very object, so a caller that swaps a value in the body never sends a stale fragment.
+    """
+    parts = []
+    for key, value in body.items():
+        frag = fragments.get(key)
+        encoded = frag[1] if frag is not None and frag[0] is value else json.dumps(value)
+        parts.append(json.dumps(key) + ": " + encoded)
+    return "{" + ", ".join(parts) + "}"
@@ -0,0 +1,93 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+def iter_sse(lines: Iterable[Union[str, bytes, None]]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (event, data) pairs from server-sent event lines (e.g. requests' iter_lines()).
+
+    Multi-line data fields are joined with "\\n"; comment lines and unknown fields are ignored.
+    """
+    event = ""
+    data: List[str] = []
+    for raw in lines:
+        if raw is None:
+            continue
+        line = raw.decode("utf-8", "replace") if isinstance(raw, bytes) else str(raw)
+        line = line.rstrip("\r")
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event, data = "", []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+    if data:
+        yield event or "message", "\n".join(data)
+
+
+def collect_responses_stream(
+    lines: Iterable[Union[str, bytes, None]],
+    *,
+    on_text_delta: Optional[Callable[[int, str], None]] = None,
+    on_output_item: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Consume a Responses API event stream (`"stream": true`) and return the same shape as the
+    non-streaming JSON body ({"id": ..., "output": [...]}).
+
+    on_text_delta(output_index, delta) fires for every output_text delta so callers can show partial
+    text; on_output_item(item) fires as soon as an output item (message or function_call) is complete,
+    before the rest of the response has arrived.
+    """
+    response_id = ""
+    done_items: Dict[int, Dict[str, Any]] = {}
+    final: Optional[Dict[str, Any]] = None
+    for event, data in iter_sse(lines):
+        if data.strip() == "[DONE]":
+            break
+        try:
+            msg = json.loads(data)
+        except Exception:
+            continue
+        if not isinstance(msg, dict):
+            continue
+        etype = str(msg.get("type") or event or "")
+        if etype in {"response.created", "response.in_progress"}:
+            resp = msg.get("response") if isinstance(msg.get("response"), dict) else {}
+            response_id = str(resp.get("id") or response_id)
+        elif etype == "response.output_text.delta":
+            delta = msg.get("delta")
+            if on_text_delta and isinstance(delta, str) and delta:
+                on_text_delta(int(msg.get("output_index") or 0), delta)
+        elif etype == "response.output_item.done":
+            item = msg.get("item")
+            if isinstance(item, dict):
+                done_items[int(msg.get("output_index") or len(done_items))] = item
+                if on_output_item:
+                    on_output_item(item)
+        elif etype == "response.completed":
+            resp = msg.get("response") if isinstance(msg.get("response"), dict) else {}
+            final = resp
+            break
+        elif etype in {"response.failed", "response.incomplete", "error"}:
+            resp = msg.get("response") if isinstance(msg.get("response"), dict) else {}
+            err = resp.get("error") or resp.get("incomplete_details") or msg.get("error") or msg.get("message")
+            if isinstance(err, dict):
+                err = err.get("message") or err.get("reason") or json.dumps(err, ensure_ascii=True)
+            raise RuntimeError(f"responses_stream_{etype.rsplit('.', 1)[-1]}: {err or 'unknown'}")
+
+    payload: Dict[str, Any] = dict(final or {})
+    if not payload.get("id"):
+        payload["id"] = response_id or None
+    if not isinstance(payload.get("output"), list) or not payload.get("output"):
+        # Some gateways send an abbreviated response.completed; rebuild output from the item events.
+        payload["output"] = [done_items[idx] for idx in sorted(done_items)]
+    return payload
@@ -3,13 +3,49 @@ import hashlib
 import json
 import os
 import re
+import secrets
 import threading
 import time
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Callable, Deque, Dict, List, Optional
 
-import requests
+import transport
+from storage.db import chat_meta
+
+from .bounded_json import dumps_bounded
+from .context import ContextBudget, clip_to_tokens, heuristic_token_count, token_estimator
+from .prompt_cache import PromptAssemblyCache, encode_body
+from .tool_memo import ToolCallMemo
+from .tool_select import REQUEST_TOOLS, ToolSelection, select_tools
+from .tool_summaries import summarize_tool_result
+from .responses_stream import collect_responses_stream
+from .scheduler import SessionScheduler
+
+# Function tools without side effects. When a round has several of these, they run concurrently.
+PARALLEL_SAFE_TOOLS = frozenset({"list_dir", "read_file", "web_search", "memory_get", "search_history"})
+# Read-only device_api actions (status/list/get); everything else may change device state.
+PARALLEL_SAFE_DEVICE_ACTIONS = frozenset(
+    {
+        "python.status",
+        "ssh.status",
+        "ssh.pin.status",
+        "camera.list",
+        "camera.status",
+        "usb.list",
+        "usb.stream.status",
+        "uvc.ptz.get_abs",
+        "uvc.ptz.get_limits",
+        "brain.memory.get",
+    }
+)
+# Parallel-safe tools that may still stop the round at a permission prompt (Kotlin-gated).
+PERMISSION_GATED_TOOLS = frozenset({"web_search", "memory_get", "device_api"})
+
+
+def _never_idempotent(name: str, args: Dict[str, Any]) -> bool:
+    return False
 
 
 class BrainRuntime:
@@ -31,27 +67,55 @@ class BrainRuntime:
         self._tool_invoke = tool_invoke
 
         self._lock = threading.Lock()
-        self._queue: Deque[Dict] = deque()
+        # Inbox items are queued per session and served round-robin by a small worker pool.
+        self._scheduler = SessionScheduler()
         self._messages: Deque[Dict] = deque(maxlen=200)
-        self._thread: Optional[threading.Thread] = None
+        # session_id -> last completed Responses API turn ({"response_id", "model", "last_text", ...}),
+        # so the next chat item can continue the provider-side conversation via previous_response_id.
+        self._response_chains: Dict[str, Dict[str, Any]] = {}
+        # session_id -> partial assistant text of a streaming Responses round (not persisted).
+        self._stream_drafts: Dict[str, Dict[str, Any]] = {}
+        # Bumped on every draft update; polls only resend a draft whose rev the client hasn't seen.
+        self._draft_rev = 0
+        # session_id -> change counter, bumped on every recorded message or draft update; long polls
+        # on /brain/messages wait on the condition for their session's counter to move.
+        self._message_versions: Dict[str, int] = {}
+        self._message_cond = threading.Condition()
+        # Callbacks run with the session id after each bump (e.g. to wake an asyncio SSE stream).
+        self._message_watchers: List[Callable[[str], None]] = []
+        self._message_seq = 0
+        self._threads: List[threading.Thread] = []
         self._stop = threading.Event()
-        self._busy = False
+        # worker thread name -> item id currently being processed.
+        self._in_flight: Dict[str, str] = {}
         self._last_error = ""
         self._last_processed_at = 0
 
         # Ephemeral per-session notes (no permissions required).
         self._session_notes: Dict[str, Dict[str, str]] = {}
-        # Cache capability -> permission_id so the model doesn't need to remember ids.
+        # Recently called tools per session ("name" or "device_api:<action>"), a tool-selection signal.
+        self._session_tool_usage: Dict[str, Deque[str]] = {}
+        # Cache "<identity>::<capability>" -> permission_id so the model doesn't need to remember ids.
         # This is session-scoped (in-memory) and resets when the brain restarts.
         self._capability_permissions: Dict[str, str] = {}
-        # Used to tag Kotlin permission requests so approvals can be reused per chat session.
-        self._active_identity: str = ""
         # Cache user-root policy docs; re-read when file changes on disk (mtime/size).
         self._user_root_doc_cache: Dict[str, Dict[str, Any]] = {}
         # permission_id -> state for resuming a paused chat item once the user approves/denies.
+        # Mirrored into the durable inbox (status='paused') so a worker restart can still resume.
         self._awaiting_permissions: Dict[str, Dict[str, Any]] = {}
+        # Sessions with a rolling-summary compaction queued or running (one background thread).
+        self._compaction_pending: set[str] = set()
+        self._compactor: Optional[ThreadPoolExecutor] = None
+        # Instructions + serialized tool schemas, rebuilt only when the config or AGENTS.md/TOOLS.md change.
+        self._prompt_cache = PromptAssemblyCache()
+        self._config_version = 0
+        # Identifies this process' leases in the durable inbox.
+        self._inbox_owner = f"{os.getpid()}-{secrets.token_hex(4)}"
 
         self._config = self._load_config()
+        self._apply_transport_config()
+        self._apply_storage_config()
+        self._restore_inbox()
 
     def _read_user_root_doc(self, name: str, *, max_chars: int = 20000) -> Dict[str, Any]:
         """
@@ -172,7 +236,70 @@ class BrainRuntime:
             "max_actions": 10,
             # Max tool-loop rounds for providers that support responses-style tool calling.
             "max_tool_rounds": 18,
-            "idle_sleep_ms": 800,
+            # Number of brain worker threads. Items of one session always run in order on one worker;
+            # different sessions (and device events) can make progress concurrently.
+            "worker_threads": 2,
+            # Durable inbox: an item is leased while being processed. If the worker dies, the lease
+            # expires (or the next worker process reclaims it) and the item is retried; after
+            # inbox_max_attempts claims it is dead-lettered instead. An item failing with a retryable
+            # error (connection problem, timeout, 429/5xx) is re-queued after inbox_retry_backoff_ms,
+            # doubling per attempt; other errors dead-letter it at once.
+            "inbox_lease_ms": 300000,
+            "inbox_max_attempts": 3,
+            "inbox_retry_backoff_ms": 2000,
+            # Request `"stream": true` from the Responses API: partial text shows up in the session
+            # timeline as it arrives and function calls start as soon as their arguments are complete.
+            "stream": False,
+            # Max side-effect-free function calls of one round that run concurrently (1 = sequential).
+            "parallel_tool_calls": 4,
+            # Shared keep-alive HTTP transport (provider + control plane + tools): connections kept per
+            # host, and retries for connection failures / dropped idle connections.
+            "http_pool_maxsize": 8,
+            "http_retries": 1,
+            # Continue the provider-side conversation across chat items (previous_response_id) instead
+            # of re-sending the dialogue window; falls back to a full rebuild when the chain is stale.
+            "chain_responses": True,
+            "response_chain_max_age_s": 21600,
+            # Per-request token budget for the Responses tool loop, split between instructions/policy
+            # docs, notes+memory, dialogue (filled newest-first) and tool outputs. Override the split
+            # with context_shares, e.g. {"dialogue": 0.5, "tool_output": 0.25}.
+            "context_budget_tokens": 24000,
+            "context_shares": {},
+            # Rolling session summary: once more than summary_keep_messages user/assistant turns exist,
+            # older ones are folded (in batches of summary_batch_messages, in the background) into a
+            # stored per-session summary that replaces them in the prompt. With summary_use_model the
+            # configured model writes the summary; otherwise (or on failure) it is extractive.
+            "summarize_sessions": True,
+            "summary_keep_messages": 40,
+            "summary_batch_messages": 12,
+            "summary_max_tokens": 800,
+            "summary_use_model": True,
+            # Stored chat history retention (per session / all sessions), applied by a periodic
+            # background compaction rather than on every insert.
+            "chat_keep_per_session": 400,
+            "chat_keep_total": 4000,
+            # Audit log retention (0 = no limit). Expired rows are appended to
+            # audit_archive/audit-YYYY-MM-DD.jsonl.gz under the user root first when audit_archive is set.
+            "audit_keep_days": 14,
+            "audit_keep_rows": 200000,
+            "audit_archive": True,
+            # Tool actions/results recorded in the timeline and audit log keep strings (and number
+            # arrays) of blob_min_chars or more in a content-addressed blob store, capped at
+            # blob_store_max_mb, and store a reference instead (0 disables).
+            "blob_min_chars": 4096,
+            "blob_store_max_mb": 256,
+            # Offer only the tool groups / device_api action families a request looks like it needs
+            # (plus a request_tools escape hatch); the set grows if the model asks for more.
+            "tool_selection": True,
+            # Send the model a structural digest of large tool results (directory aggregates, parsed
+            # USB descriptors, top-k tensor values, output tail + error lines); the timeline keeps the
+            # full result.
+            "tool_summaries": True,
+            # Within one item, repeat side-effect-free calls with identical arguments (and unchanged
+            # files) reuse the earlier result; once the same calls repeat for tool_loop_repeats rounds
+            # in a row, the loop stops and the model is asked for its final answer (0 disables).
+            "memoize_tool_calls": True,
+            "tool_loop_repeats": 3,
         }
 
     def _fs_root_dir(self) -> Path:
@@ -415,7 +542,7 @@ class BrainRuntime:
         if not pid:
             return ""
         try:
-            resp = requests.get(f"http://127.0.0.1:8765/permissions/{pid}", timeout=3)
+            resp = transport.get(f"http://127.0.0.1:8765/permissions/{pid}", timeout=3)
             if resp.status_code != 200:
                 return ""
             body = resp.json() if resp.content else {}
@@ -463,32 +590,91 @@ class BrainRuntime:
             for key, value in patch.items():
                 if key in self._default_config():
                     self._config[key] = value
+            self._config_version += 1
             self._save_config()
             cfg = dict(self._config)
+        self._apply_transport_config()
+        self._apply_storage_config()
         self._emit_log("brain_config_updated", {"keys": list(patch.keys())})
         return cfg
 
+    def _apply_transport_config(self) -> None:
+        try:
+            pool_maxsize = max(1, min(int(self._config.get("http_pool_maxsize", 8) or 8), 32))
+            retries = max(0, min(int(self._config.get("http_retries", 1) or 0), 5))
+        except Exception:
+            return
+        transport.shared().configure(pool_maxsize=pool_maxsize, retries=retries)
+
+    def _apply_storage_config(self) -> None:
+        try:
+            per_session = max(50, min(int(self._config.get("chat_keep_per_session", 400) or 400), 100000))
+            total = max(per_session, min(int(self._config.get("chat_keep_total", 4000) or 4000), 1000000))
+        except Exception:
+            return
+        setter = getattr(self._storage, "set_chat_retention", None)
+        if callable(setter):
+            setter(per_session, total)
+        setter = getattr(self._storage, "set_audit_retention", None)
+        if callable(setter):
+            with contextlib.suppress(Exception):
+                setter(
+                    max(0, int(self._config.get("audit_keep_days", 14) or 0)),
+                    max(0, int(self._config.get("audit_keep_rows", 200000) or 0)),
+                    self._user_dir / "audit_archive" if self._config.get("audit_archive", True) else None,
+                )
+        blobs = getattr(self._storage, "blobs", None)
+        if blobs is not None:
+            with contextlib.suppress(Exception):
+                blobs.max_bytes = max(16, int(self._config.get("blob_store_max_mb", 256) or 256)) * 1024 * 1024
+
+    def _externalize_blobs(self, value: Any) -> Any:
+        """value with large fields moved to the blob store (unchanged without one, or on failure)."""
+        blobs = getattr(self._storage, "blobs", None)
+        try:
+            min_chars = int(self._config.get("blob_min_chars", 4096) or 0)
+        except Exception:
+            min_chars = 0
+        if blobs is None or min_chars <= 0:
+            return value
+        try:
+            return blobs.externalize(value, min_chars=min_chars)
+        except Exception:
+            return value
+
+    def _worker_count(self) -> int:
+        try:
+            n = int(self._config.get("worker_threads", 2) or 2)
+        except Exception:
+            n = 2
+        return max(1, min(n, 8))
+
     def start(self) -> Dict:
         with self._lock:
-            if self._thread and self._thread.is_alive():
+            if any(t.is_alive() for t in self._threads):
                 return {"status": "already_running"}
             self._stop.clear()
-            self._thread = threading.Thread(target=self._run_loop, daemon=True)
-            self._thread.start()
+            self._threads = []
+            for idx in range(self._worker_count()):
+                t = threading.Thread(target=self._run_loop, name=f"brain-worker-{idx}", daemon=True)
+                self._threads.append(t)
+                t.start()
             self._config["enabled"] = True
             self._save_config()
-        self._emit_log("brain_started", {})
+            workers = len(self._threads)
+        self._emit_log("brain_started", {"workers": workers})
         return {"status": "started"}
 
     def stop(self) -> Dict:
-        thread = None
         with self._lock:
             self._config["enabled"] = False
             self._save_config()
             self._stop.set()
-            thread = self._thread
-        if thread and thread.is_alive():
-            thread.join(timeout=2.0)
+            threads = list(self._threads)
+        self._scheduler.wake()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join(timeout=2.0)
         self._emit_log("brain_stopped", {})
         return {"status": "stopped"}
 
@@ -500,24 +686,195 @@ class BrainRuntime:
             "meta": meta or {},
             "created_at": int(time.time() * 1000),
         }
-        with self._lock:
-            self._queue.append(item)
+        self._enqueue(item)
         self._emit_log("brain_inbox_chat", {"id": item["id"]})
         return item
 
-    def enqueue_event(self, name: str, payload: Optional[Dict] = None) -> Dict:
+    def enqueue_event(self, name: str, payload: Optional[Dict] = None, delay_ms: int = 0) -> Dict:
+        now_ms = int(time.time() * 1000)
         item = {
-            "id": f"event_{int(time.time() * 1000)}",
+            "id": f"event_{now_ms}",
             "kind": "event",
             "name": name or "unnamed_event",
             "payload": payload or {},
-            "created_at": int(time.time() * 1000),
+            "created_at": now_ms,
         }
-        with self._lock:
-            self._queue.append(item)
+        if delay_ms and int(delay_ms) > 0:
+            # Deferred events wait in the scheduler's timer heap (and survive restarts via the inbox).
+            item["not_before"] = now_ms + int(delay_ms)
+        self._enqueue(item)
         self._emit_log("brain_inbox_event", {"id": item["id"], "name": item["name"]})
         return item
 
+    def _durable_inbox(self) -> bool:
+        return hasattr(self._storage, "add_inbox_item")
+
+    def _item_priority(self, item: Dict) -> int:
+        # Resuming a paused chat item goes ahead of newer work queued in the same session.
+        if str(item.get("kind") or "") == "event" and str(item.get("name") or "") == "permission.resolved":
+            return 10
+        return 0
+
+    def _enqueue(self, item: Dict) -> None:
+        lane = self._lane_for_item(item)
+        priority = self._item_priority(item)
+        if self._durable_inbox():
+            try:
+                item["inbox_seq"] = self._storage.add_inbox_item(
+                    str(item.get("id") or ""),
+                    lane,
+                    str(item.get("kind") or ""),
+                    json.dumps(item, ensure_ascii=True),
+                    priority=priority,
+                )
+            except Exception as ex:
+                # Still process the item; it just won't survive a restart.
+                self._emit_log("brain_inbox_persist_failed", {"id": item.get("id"), "error": str(ex)})
+        self._scheduler.put(lane, item, priority, delay_s=self._item_delay_s(item))
+
+    def _item_delay_s(self, item: Dict) -> float:
+        not_before = int(item.get("not_before") or 0)
+        if not_before <= 0:
+            return 0.0
+        return max(0.0, (not_before - time.time() * 1000) / 1000.0)
+
+    def _restore_inbox(self) -> None:
+        """Re-queue durable inbox items (and paused permission waits) left by a previous worker process."""
+        if not self._durable_inbox():
+            return
+        try:
+            rows = self._storage.list_inbox_items(["queued", "leased", "paused"])
+        except Exception as ex:
+            self._emit_log("brain_inbox_restore_failed", {"error": str(ex)})
+            return
+        max_attempts = max(1, int(self._config.get("inbox_max_attempts", 3) or 3))
+        restored = {"queued": 0, "paused": 0, "dead": 0}
+        for row in rows:
+            seq = int(row.get("seq") or 0)
+            try:
+                item = json.loads(row.get("item") or "{}")
+            except Exception:
+                item = None
+            if not isinstance(item, dict):
+                with contextlib.suppress(Exception):
+                    self._storage.fail_inbox_item(seq, "corrupt_item")
+                restored["dead"] += 1
+                continue
+            status = str(row.get("status") or "")
+            if status == "paused":
+                pid = str(row.get("permission_id") or "").strip()
+                if pid:
+                    with self._lock:
+                        self._awaiting_permissions[pid] = item
+                    restored["paused"] += 1
+                continue
+            # Nothing has been claimed by this process yet, so leased rows belong to a dead worker.
+            if int(row.get("attempts") or 0) >= max_attempts:
+                with contextlib.suppress(Exception):
+                    self._storage.fail_inbox_item(seq, "max_attempts_exceeded")
+                restored["dead"] += 1
+                continue
+            if status == "leased":
+                with contextlib.suppress(Exception):
+                    self._storage.fail_inbox_item(seq, "worker_restarted", retry=True)
+            item["inbox_seq"] = seq
+            lane = str(row.get("session_id") or "").strip() or self._lane_for_item(item)
+            self._scheduler.put(lane, item, int(row.get("priority") or 0), delay_s=self._item_delay_s(item))
+            restored["queued"] += 1
+        if any(restored.values()):
+            self._emit_log("brain_inbox_restored", restored)
+
+    def _claim_inbox_item(self, item: Dict) -> bool:
+        seq = item.get("inbox_seq")
+        if seq is None:
+            item["attempts"] = int(item.get("attempts") or 0) + 1
+            return True
+        lease_ms = max(10000, int(self._config.get("inbox_lease_ms", 300000) or 300000))
+        try:
+            row = self._storage.claim_inbox_item(int(seq), self._inbox_owner, lease_ms)
+        except Exception as ex:
+            self._emit_log("brain_inbox_claim_failed", {"id": item.get("id"), "error": str(ex)})
+            return True
+        if row is None:
+            return False
+        item["attempts"] = int(row.get("attempts") or 1)
+        return True
+
+    def _renew_inbox_lease(self, item: Dict) -> None:
+        seq = item.get("inbox_seq")
+        if seq is None or not self._durable_inbox():
+            return
+        lease_ms = max(10000, int(self._config.get("inbox_lease_ms", 300000) or 300000))
+        with contextlib.suppress(Exception):
+            self._storage.renew_inbox_lease(int(seq), self._inbox_owner, lease_ms)
+
+    def _finish_inbox_item(self, item: Dict, error: str = "") -> None:
+        seq = item.get("inbox_seq")
+        if seq is None or not self._durable_inbox():
+            return
+        with contextlib.suppress(Exception):
+            if error:
+                # The failure has been surfaced in the chat timeline; don't replay the item.
+                self._storage.fail_inbox_item(int(seq), error)
+            else:
+                self._storage.complete_inbox_item(int(seq))
+
+    def _retry_inbox_item(self, lane: str, item: Dict, ex: Exception) -> bool:
+        """
+        Re-queue an item that failed with a retryable error, with exponential backoff, unless it has
+        used up inbox_max_attempts. Returns False when the failure is final.
+        """
+        attempts = max(1, int(item.get("attempts") or 1))
+        max_attempts = max(1, int(self._config.get("inbox_max_attempts", 3) or 3))
+        if attempts >= max_attempts or not transport.is_retryable_error(ex):
+            return False
+        backoff_ms = max(0, int(self._config.get("inbox_retry_backoff_ms", 2000) or 0))
+        delay_ms = min(backoff_ms * (2 ** (attempts - 1)), 300000)
+        seq = item.get("inbox_seq")
+        if seq is not None and self._durable_inbox():
+            try:
+                self._storage.fail_inbox_item(int(seq), str(ex) or "brain_item_failed", retry=True)
+            except Exception:
+                return False
+        item["not_before"] = int(time.time() * 1000) + delay_ms
+        self._scheduler.put(lane, item, self._item_priority(item), delay_s=delay_ms / 1000.0)
+        self._emit_log(
+            "brain_item_retry",
+            {"id": item.get("id"), "attempt": attempts, "delay_ms": delay_ms, "error": str(ex)},
+        )
+        return True
+
+    def _pause_for_permission(self, permission_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._awaiting_permissions[permission_id] = state
+        if not self._durable_inbox():
+            return
+        item = state.get("item") if isinstance(state.get("item"), dict) else {}
+        try:
+            self._storage.add_inbox_item(
+                str(item.get("id") or ""),
+                str(state.get("session_id") or "default"),
+                str(item.get("kind") or "chat"),
+                json.dumps(state, ensure_ascii=True),
+                status="paused",
+                permission_id=permission_id,
+            )
+        except Exception as ex:
+            self._emit_log("brain_inbox_persist_failed", {"id": item.get("id"), "error": str(ex)})
+
+    def _take_paused_item(self, permission_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._awaiting_permissions.pop(permission_id, None)
+        if self._durable_inbox():
+            try:
+                row = self._storage.take_paused_inbox_item(permission_id)
+                if state is None and row:
+                    stored = json.loads(row.get("item") or "{}")
+                    state = stored if isinstance(stored, dict) else None
+            except Exception:
+                pass
+        return state
+
     def debug_post_comment(
         self,
         *,
@@ -549,84 +906,181 @@ class BrainRuntime:
         try:
             if hasattr(self._storage, "list_chat_messages"):
                 rows = self._storage.list_chat_messages("default", limit=limit)
-                out: List[Dict] = []
-                for r in rows:
-                    meta = {}
-                    raw_meta = r.get("meta")
-                    if isinstance(raw_meta, str) and raw_meta.strip():
-                        try:
-                            meta = json.loads(raw_meta)
-                        except Exception:
-                            meta = {}
-                    out.append(
-                        {
-                            "ts": r.get("created_at"),
-                            "role": r.get("role"),
-                            "text": r.get("text"),
-                            "meta": meta,
-                        }
-                    )
+                out: List[Dict] = [
+                    {"ts": r.get("created_at"), "role": r.get("role"), "text": r.get("text"), "meta": chat_meta(r)}
+                    for r in rows
+                ]
                 return out[-limit:]
         except Exception:
             pass
         with self._lock:
             return list(self._messages)[-limit:]
 
-    def list_messages_for_session(self, *, session_id: str, limit: int = 200) -> List[Dict]:
+    def poll_messages(
+        self, *, session_id: str, since_id: int = 0, limit: int = 200, wait_ms: int = 0, draft_rev: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Messages of a session recorded after since_id, plus the cursor (last id) to pass next time.
+
+        The streaming draft (no id) is appended only when its rev differs from draft_rev; the page's
+        draft_rev is passed back with the cursor. With wait_ms and nothing new, blocks (at most 30s)
+        until a message is recorded or the draft changes, so clients can long-poll instead of
+        re-reading the whole history.
+        """
+        sid = (session_id or "default").strip() or "default"
+        since_id = max(0, int(since_id or 0))
+        draft_rev = max(0, int(draft_rev or 0))
+        wait_s = max(0, min(int(wait_ms or 0), 30000)) / 1000.0 if since_id else 0.0
+        deadline = time.monotonic() + wait_s
+        while True:
+            version = self._message_version(sid)
+            messages = self._stored_messages_for_session(session_id=sid, limit=limit, since_id=since_id)
+            with self._lock:
+                draft = dict(self._stream_drafts.get(sid) or {})
+            rev = int(draft.get("rev") or 0)
+            if draft.get("text") and rev != draft_rev:
+                messages.append(self._draft_message(sid, draft))
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0 or not self._wait_for_messages(sid, version, remaining):
+                break
+        cursor = max([int(m.get("id") or 0) for m in messages] + [since_id])
+        return {"messages": messages, "cursor": cursor, "draft_rev": rev}
+
+    def _message_version(self, session_id: str) -> int:
+        with self._message_cond:
+            return self._message_versions.get(session_id, 0)
+
+    def _wait_for_messages(self, session_id: str, version: int, timeout_s: float) -> bool:
+        with self._message_cond:
+            return self._message_cond.wait_for(
+                lambda: self._message_versions.get(session_id, 0) != version, timeout=timeout_s
+            )
+
+    def _notify_messages(self, session_id: str) -> None:
+        with self._message_cond:
+            self._message_versions[session_id] = self._message_versions.get(session_id, 0) + 1
+            self._message_cond.notify_all()
+            watchers = list(self._message_watchers)
+        for watcher in watchers:
+            try:
+                watcher(session_id)
+            except Exception:
+                pass
+
+    def add_message_watcher(self, watcher: Callable[[str], None]) -> None:
+        """Call watcher(session_id) whenever a session records a message or its draft changes."""
+        with self._message_cond:
+            self._message_watchers.append(watcher)
+
+    def remove_message_watcher(self, watcher: Callable[[str], None]) -> None:
+        with self._message_cond:
+            if watcher in self._message_watchers:
+                self._message_watchers.remove(watcher)
+
+    def list_messages_for_session(self, *, session_id: str, limit: int = 200, since_id: int = 0) -> List[Dict]:
+        sid = (session_id or "default").strip() or "default"
+        out = self._stored_messages_for_session(session_id=sid, limit=limit, since_id=since_id)
+        with self._lock:
+            draft = self._stream_drafts.get(sid)
+            draft = dict(draft) if draft else None
+        if draft and draft.get("text"):
+            out.append(self._draft_message(sid, draft))
+        return out
+
+    def _draft_message(self, session_id: str, draft: Dict[str, Any]) -> Dict[str, Any]:
+        # In-progress streamed reply; replaced by the recorded message once the round completes.
+        return {
+            "ts": draft.get("ts"),
+            "role": "assistant",
+            "text": draft.get("text"),
+            "meta": {"item_id": draft.get("item_id"), "session_id": session_id, "actor": "agent", "streaming": True},
+        }
+
+    def _stored_messages_for_session(
+        self,
+        *,
+        session_id: str,
+        limit: int = 200,
+        since_id: int = 0,
+        roles: Optional[tuple] = None,
+        oldest_first: bool = False,
+    ) -> List[Dict]:
         sid = (session_id or "default").strip() or "default"
         limit = max(1, min(int(limit or 200), 500))
+        since_id = max(0, int(since_id or 0))
         try:
             if hasattr(self._storage, "list_chat_messages"):
-                rows = self._storage.list_chat_messages(sid, limit=limit)
-                out: List[Dict] = []
-                for r in rows:
-                    meta = {}
-                    raw_meta = r.get("meta")
-                    if isinstance(raw_meta, str) and raw_meta.strip():
-                        try:
-                            meta = json.loads(raw_meta)
-                        except Exception:
-                            meta = {}
-                    out.append(
-                        {
-                            "ts": r.get("created_at"),
-                            "role": r.get("role"),
-                            "text": r.get("text"),
-                            "meta": meta,
-                        }
-                    )
-                return out
+                rows = self._storage.list_chat_messages(
+                    sid, limit=limit, since_id=since_id, roles=roles, oldest_first=oldest_first
+                )
+                return [
+                    {
+                        "id": r.get("id"),
+                        "ts": r.get("created_at"),
+                        "role": r.get("role"),
+                        "text": r.get("text"),
+                        "meta": chat_meta(r),
+                    }
+                    for r in rows
+                ]
         except Exception:
             pass
         # Fallback to in-memory filter.
         with self._lock:
             items = list(self._messages)
         out: List[Dict] = []
-        for msg in reversed(items):
-            if len(out) >= limit:
-                break
+        for msg in items:
             meta = msg.get("meta") if isinstance(msg.get("meta"), dict) else {}
-            if str((meta or {}).get("session_id") or "default") != sid:
+            if str((meta or {}).get("session_id") or "default") != sid or int(msg.get("id") or 0) <= since_id:
+                continue
+            if roles is not None and msg.get("role") not in roles:
                 continue
             out.append(msg)
-        return list(reversed(out))
+        # Cursor reads continue from since_id; otherwise return the latest messages.
+        return out[:limit] if since_id or oldest_first else out[-limit:]
 
-    def list_sessions(self, limit: int = 50) -> List[Dict]:
+    def list_sessions(self, limit: int = 50, before_id: int = 0) -> List[Dict]:
         try:
             if hasattr(self._storage, "list_chat_sessions"):
-                return self._storage.list_chat_sessions(limit=limit)
+                return self._storage.list_chat_sessions(limit=limit, before_id=before_id)
         except Exception:
             pass
         return []
 
+    def session_page(self, limit: int = 50, before_id: int = 0) -> Dict:
+        """{"sessions", "next_before_id"}; next_before_id is None on the last page."""
+        sessions = self.list_sessions(limit=limit, before_id=before_id)
+        full = len(sessions) >= max(1, min(int(limit or 50), 200))
+        next_before = sessions[-1].get("last_id") if sessions and full else None
+        return {"sessions": sessions, "next_before_id": next_before}
+
+    def search_history(self, query: str, **kwargs: Any) -> Dict:
+        """Storage.search_history, or {"error": ...} when unsupported or the arguments are invalid."""
+        if not hasattr(self._storage, "search_history"):
+            return {"error": "search_unavailable", "results": []}
+        try:
+            return self._storage.search_history(query, **kwargs)
+        except ValueError as ex:
+            return {"error": "invalid_request", "detail": str(ex), "results": []}
+
     def status(self) -> Dict:
+        inbox: Dict[str, int] = {}
+        if self._durable_inbox():
+            with contextlib.suppress(Exception):
+                inbox = self._storage.inbox_counts()
         with self._lock:
-            running = self._thread is not None and self._thread.is_alive()
+            workers = sum(1 for t in self._threads if t.is_alive())
             return {
-                "running": running,
+                "running": workers > 0,
                 "enabled": bool(self._config.get("enabled")),
-                "busy": self._busy,
-                "queue_size": len(self._queue),
+                "busy": bool(self._in_flight),
+                "queue_size": self._scheduler.size(),
+                "deferred": self._scheduler.deferred(),
+                "queue_wait": self._scheduler.stats(),
+                "workers": workers,
+                "active_sessions": self._scheduler.active_sessions(),
+                "awaiting_permissions": len(self._awaiting_permissions),
+                "inbox": inbox,
                 "last_error": self._last_error,
                 "last_processed_at": self._last_processed_at,
                 "model": self._config.get("model", ""),
@@ -639,25 +1093,32 @@ class BrainRuntime:
             self.start()
 
     def _run_loop(self) -> None:
+        worker = threading.current_thread().name
         while not self._stop.is_set():
-            item = None
-            with self._lock:
-                if self._queue:
-                    item = self._queue.popleft()
-            if not item:
-                sleep_ms = int(self._config.get("idle_sleep_ms", 800) or 800)
-                time.sleep(max(0.1, sleep_ms / 1000.0))
+            # Blocks until an item is enqueued (or a deferred one is due); stop() wakes it early.
+            taken = self._scheduler.take(timeout=30.0)
+            if not taken:
+                continue
+            lane, item = taken
+            if not self._claim_inbox_item(item):
+                # Already leased by another consumer (or no longer queued).
+                self._scheduler.done(lane)
                 continue
             with self._lock:
-                self._busy = True
+                self._in_flight[worker] = str(item.get("id") or "")
                 self._last_error = ""
             try:
                 self._process_item(item)
+                self._finish_inbox_item(item)
                 with self._lock:
                     self._last_processed_at = int(time.time() * 1000)
+                self._schedule_compaction(self._session_id_for_item(item))
             except Exception as ex:
                 with self._lock:
                     self._last_error = str(ex)
+                if self._retry_inbox_item(lane, item, ex):
+                    continue
+                self._finish_inbox_item(item, error=str(ex) or "brain_item_failed")
                 # Surface failures into the chat timeline so the UI isn't stuck "waiting forever".
                 # Avoid including any secrets; `str(ex)` should be safe (requests errors include URL/status).
                 try:
@@ -676,7 +1137,8 @@ class BrainRuntime:
                 self._emit_log("brain_item_failed", {"id": item.get("id"), "error": str(ex)})
             finally:
                 with self._lock:
-                    self._busy = False
+                    self._in_flight.pop(worker, None)
+                self._scheduler.done(lane)
 
     def _record_message(self, role: str, text: str, meta: Optional[Dict] = None) -> None:
         meta = dict(meta or {})
@@ -697,40 +1159,200 @@ class BrainRuntime:
             "text": text,
             "meta": meta,
         }
-        with self._lock:
-            self._messages.append(entry)
+        sid = str(meta.get("session_id") or "default").strip() or "default"
+        message_id = None
         try:
             if hasattr(self._storage, "add_chat_message"):
-                sid = str(meta.get("session_id") or "default").strip() or "default"
-                self._storage.add_chat_message(sid, role, text, json.dumps(meta, ensure_ascii=True))
+                message_id = self._storage.add_chat_message(sid, role, text, meta)
         except Exception:
             pass
+        with self._lock:
+            # Without storage ids, number in-memory entries so since_id cursors still work.
+            self._message_seq = max(self._message_seq + 1, int(message_id or 0))
+            entry["id"] = int(message_id or self._message_seq)
+            self._messages.append(entry)
+        self._notify_messages(sid)
 
     def _session_id_for_item(self, item: Dict) -> str:
         meta = item.get("meta") if isinstance(item.get("meta"), dict) else {}
         sid = str((meta or {}).get("session_id") or "").strip()
         return sid or "default"
 
-    def _list_dialogue(self, *, session_id: str, limit: int = 24) -> List[Dict[str, str]]:
-        # Return only user/assistant messages for the given session_id.
+    def _lane_for_item(self, item: Dict) -> str:
+        """
+        Scheduler lane (session) an inbox item belongs to.
+
+        permission.resolved events resume a paused chat item, so they must run in that chat's lane to
+        stay ordered with the session's other messages.
+        """
+        if str(item.get("kind") or "") == "event" and str(item.get("name") or "") == "permission.resolved":
+            payload = item.get("payload") if isinstance(item.get("payload"), dict) else {}
+            pid = str(payload.get("permission_id") or payload.get("id") or "").strip()
+            # Paused items are added/taken by worker threads; read the entry under the same lock.
+            with self._lock:
+                state = self._awaiting_permissions.get(pid) if pid else None
+            if state:
+                return str(state.get("session_id") or "default").strip() or "default"
+        return self._session_id_for_item(item)
+
+    def _list_dialogue(
+        self, *, session_id: str, limit: int = 24, since_id: int = 0, oldest_first: bool = False
+    ) -> List[Dict[str, str]]:
+        # The last `limit` user/assistant messages of the session, or with since_id/oldest_first the
+        # first `limit` after since_id (tool rows are filtered in the query).
         limit = max(1, min(int(limit or 24), 120))
-        msgs = self.list_messages_for_session(session_id=session_id, limit=max(limit, 1))
+        msgs = self._stored_messages_for_session(
+            session_id=session_id, limit=limit, since_id=since_id, roles=("user", "assistant"), oldest_first=oldest_first
+        )
         out: List[Dict[str, Any]] = []
         for msg in msgs[-limit:]:
             role = str(msg.get("role") or "")
-            if role not in {"user", "assistant"}:
-                continue
             text = str(msg.get("text") or "")
             if not text.strip():
                 continue
             meta = msg.get("meta") if isinstance(msg.get("meta"), dict) else {}
-            out.append({"role": role, "text": text, "meta": meta})
+            out.append({"id": msg.get("id"), "role": role, "text": text, "meta": meta})
         return out
 
+    def _session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if not hasattr(self._storage, "get_chat_summary"):
+            return None
+        try:
+            row = self._storage.get_chat_summary(session_id)
+        except Exception:
+            return None
+        if not row or not str(row.get("summary") or "").strip():
+            return None
+        return row
+
+    def _schedule_compaction(self, session_id: str) -> None:
+        """Queue a background rolling-summary update for the session (at most one pending per session)."""
+        if not self._config.get("summarize_sessions", True) or not hasattr(self._storage, "set_chat_summary"):
+            return
+        with self._lock:
+            if session_id in self._compaction_pending:
+                return
+            self._compaction_pending.add(session_id)
+            if self._compactor is None:
+                self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="brain-compact")
+            compactor = self._compactor
+        compactor.submit(self._run_compaction, session_id)
+
+    def _run_compaction(self, session_id: str) -> None:
+        try:
+            self._compact_session(session_id)
+        except Exception as ex:
+            self._emit_log("brain_summary_failed", {"session_id": session_id, "error": str(ex)[:200]})
+        finally:
+            with self._lock:
+                self._compaction_pending.discard(session_id)
+
+    def _compact_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fold user/assistant turns that aged out of the recent window into the session's rolling summary.
+
+        Turns are read forward from the stored summary's through_id one page at a time, each page
+        folded into the summary in turn, so a backlog larger than a page is caught up instead of
+        dropping out of context. Each update costs one page of turns plus the previous summary.
+        """
+        cfg = self.get_config()
+        keep = max(4, int(cfg.get("summary_keep_messages") or 40))
+        batch = max(1, int(cfg.get("summary_batch_messages") or 12))
+        recent = self._list_dialogue(session_id=session_id, limit=keep)
+        if len(recent) < keep:
+            return None
+        # Everything older than the recent window has aged out.
+        boundary = min(int(m.get("id") or 0) for m in recent)
+        row = self._session_summary(session_id) or {}
+        through_id = int(row.get("through_id") or 0)
+        previous = str(row.get("summary") or "")
+        folded = int(row.get("folded") or 0)
+        max_tokens = max(100, int(cfg.get("summary_max_tokens") or 800))
+        count = token_estimator(str(cfg.get("model") or ""))
+        info = None
+        while True:
+            page = self._list_dialogue(session_id=session_id, limit=120, since_id=through_id, oldest_first=True)
+            aged = [m for m in page if int(m.get("id") or 0) < boundary]
+            if len(aged) < batch:
+                return info
+            summary = ""
+            source = "extractive"
+            if cfg.get("summary_use_model", True):
+                try:
+                    summary = self._summarize_with_model(previous, aged, cfg, max_tokens=max_tokens)
+                    source = "model"
+                except Exception as ex:
+                    self._emit_log("brain_summary_model_failed", {"session_id": session_id, "error": str(ex)[:200]})
+                    summary = ""
+            if not summary.strip():
+                summary = self._extractive_summary(previous, aged)
+                source = "extractive"
+            summary = clip_to_tokens(summary.strip(), max_tokens, count)
+            through_id = max(int(m.get("id") or 0) for m in aged)
+            folded += len(aged)
+            previous = summary
+            self._storage.set_chat_summary(session_id, summary, through_id, folded)
+            info = {"session_id": session_id, "through_id": through_id, "folded": folded, "source": source, "tokens": count(summary)}
+            self._emit_log("brain_summary_updated", info)
+
+    def _extractive_summary(self, previous: str, turns: List[Dict[str, Any]]) -> str:
+        # Fallback without a model: keep the gist of each turn as a bullet.
+        lines = [previous.strip()] if previous.strip() else []
+        for msg in turns:
+            text = " ".join(str(msg.get("text") or "").split())
+            if len(text) > 240:
+                text = text[:237] + "..."
+            lines.append(f"- {msg.get('role')}: {text}")
+        return "\n".join(lines)
+
+    def _summarize_with_model(self, previous: str, turns: List[Dict[str, Any]], cfg: Dict, *, max_tokens: int) -> str:
+        model = str(cfg.get("model") or "").strip()
+        provider_url = str(cfg.get("provider_url") or "").strip()
+        key_name = str(cfg.get("api_key_credential") or "").strip()
+        api_key = self._get_api_key(key_name) if key_name else ""
+        if not model or not provider_url or not api_key:
+            return ""
+        transcript = "\n".join(
+            f"{m.get('role')}: {clip_to_tokens(str(m.get('text') or ''), 600, heuristic_token_count)}" for m in turns
+        )
+        instructions = (
+            "You maintain a rolling summary of a chat between a user and an on-device agent. "
+            "Merge the new turns into the previous summary. Keep facts, decisions, user preferences, file paths, "
+            "device state and unfinished tasks; drop chit-chat. Write plain bullet points, at most "
+            f"about {int(max_tokens * 0.75)} words. Output only the summary."
+        )
+        prompt = "Previous summary:\n" + (previous.strip() or "(none)") + "\n\nNew turns:\n" + transcript
+        if provider_url.rstrip("/").endswith("/responses"):
+            body: Dict[str, Any] = {"model": model, "instructions": instructions, "input": [{"role": "user", "content": prompt}]}
+        else:
+            body = {
+                "model": model,
+                "temperature": 0.0,
+                "messages": [{"role": "system", "content": instructions}, {"role": "user", "content": prompt}],
+            }
+        resp = transport.post(
+            provider_url,
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            data=json.dumps(body),
+            timeout=30,
+        )
+        resp.raise_for_status()
+        payload = resp.json()
+        content = payload.get("output_text") or (((payload.get("choices") or [{}])[0]).get("message") or {}).get("content")
+        if isinstance(content, str):
+            return content
+        parts: List[str] = []
+        for out_item in payload.get("output") or []:
+            if isinstance(out_item, dict) and out_item.get("type") == "message":
+                for part in out_item.get("content") or []:
+                    if isinstance(part, dict) and part.get("type") == "output_text":
+                        parts.append(str(part.get("text") or ""))
+        return "\n".join(parts)
+
     def _get_persistent_memory(self) -> str:
         # Stored on the Kotlin control-plane (LocalHttpServer) as a small text blob.
         try:
-            resp = requests.get("http://127.0.0.1:8765/brain/memory", timeout=2)
+            resp = transport.get("http://127.0.0.1:8765/brain/memory", timeout=2)
             if not resp.ok:
                 return ""
             payload = resp.json() if resp.headers.get("Content-Type", "").startswith("application/json") else {}
@@ -767,13 +1389,14 @@ class BrainRuntime:
                 notes["favorite_color"] = val
                 changed["favorite_color"] = val
 
-        if notes:
-            self._session_notes[session_id] = notes
+        with self._lock:
+            if notes:
+                self._session_notes[session_id] = notes
 
-        # Prevent unbounded growth.
-        if len(self._session_notes) > 50:
-            for k in list(self._session_notes.keys())[:10]:
-                self._session_notes.pop(k, None)
+            # Prevent unbounded growth.
+            if len(self._session_notes) > 50:
+                for k in list(self._session_notes.keys())[:10]:
+                    self._session_notes.pop(k, None)
         return changed
 
     def _process_item(self, item: Dict) -> None:
@@ -785,7 +1408,7 @@ class BrainRuntime:
                 pid = str(payload.get("permission_id") or payload.get("id") or "").strip()
                 status = str(payload.get("status") or "").strip()
                 tool = str(payload.get("tool") or "").strip()
-                state = self._awaiting_permissions.pop(pid, None) if pid else None
+                state = self._take_paused_item(pid) if pid else None
                 if not state:
                     self._emit_log("permission_resolved_ignored", {"permission_id": pid, "status": status})
                     return
@@ -1040,6 +1663,26 @@ class BrainRuntime:
                     "required": ["content"],
                 },
             },
+            {
+                "type": "function",
+                "name": "search_history",
+                "description": (
+                    "Full-text search of past chat messages (including tool calls/results) and the audit log. "
+                    "All words must match; end a word with * for a prefix match. Matches are wrapped in ** in snippets."
+                ),
+                "parameters": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {
+                        "query": {"type": "string"},
+                        "scope": {"type": "string", "enum": ["chat", "audit", "all"]},
+                        "current_session": {"type": "boolean", "description": "Only this chat session (chat results)."},
+                        "days": {"type": "number", "description": "Only the last N days (0 = any time)."},
+                        "limit": {"type": "integer"},
+                    },
+                    "required": ["query", "scope", "current_session", "days", "limit"],
+                },
+            },
             {
                 "type": "function",
                 "name": "run_python",
@@ -1182,14 +1825,237 @@ class BrainRuntime:
             },
         ]
 
+    def _set_stream_draft(self, session_id: str, item_id: Any, text: str) -> None:
+        with self._lock:
+            if text:
+                self._draft_rev += 1
+                self._stream_drafts[session_id] = {
+                    "item_id": item_id,
+                    "text": text,
+                    "ts": int(time.time() * 1000),
+                    "rev": self._draft_rev,
+                }
+            elif self._stream_drafts.pop(session_id, None) is None:
+                return
+        self._notify_messages(session_id)
+
+    def _prompt_assembly(self, cfg: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """
+        Static parts of a Responses request: tool schemas (+ their JSON and token count) and the
+        system prompt / policy docs with token counts. Cached per config version and doc signature;
+        checking the key costs two stat() calls.
+        """
+        agents = self._read_user_root_doc("AGENTS.md")
+        tools_doc = self._read_user_root_doc("TOOLS.md")
+        with self._lock:
+            version = self._config_version
+        key = (version, model, agents.get("sig"), agents.get("sha256"), tools_doc.get("sig"), tools_doc.get("sha256"))
+
+        def _build() -> Dict[str, Any]:
+            count = token_estimator(model)
+            tools = self._responses_tools()
+            tools_json = json.dumps(tools)
+            tool_json = {str(t.get("name") or ""): json.dumps(t) for t in tools}
+            system_prompt = str(cfg.get("system_prompt") or "")
+            policy_blob = self._user_root_policy_blob()
+            instructions = (system_prompt + "\n\n" + policy_blob).strip() if policy_blob else system_prompt
+            return {
+                "tools": tools,
+                "tools_json": tools_json,
+                "tools_tokens": count(tools_json),
+                "tool_json": tool_json,
+                "tool_tokens": {name: count(js) for name, js in tool_json.items()},
+                "system_prompt": system_prompt,
+                "system_prompt_tokens": count(system_prompt),
+                "policy_blob": policy_blob,
+                "policy_tokens": count(policy_blob),
+                "instructions": instructions,
+                "instructions_json": json.dumps(instructions),
+            }
+
+        return self._prompt_cache.get(key, _build)
+
+    def _encode_tools(self, assembly: Dict[str, Any], tools: List[Dict[str, Any]], count) -> tuple[str, int]:
+        """JSON and token estimate of a tool list, reusing the assembly's per-schema fragments."""
+        originals = {str(t.get("name") or ""): t for t in assembly["tools"]}
+        parts: List[str] = []
+        tokens = 0
+        for tool in tools:
+            name = str(tool.get("name") or "")
+            if originals.get(name) is tool:
+                parts.append(assembly["tool_json"][name])
+                tokens += assembly["tool_tokens"][name]
+            else:
+                js = json.dumps(tool)
+                parts.append(js)
+                tokens += count(js)
+        return "[" + ", ".join(parts) + "]", tokens
+
+    def _note_tool_usage(self, session_id: str, name: str, args: Dict[str, Any]) -> None:
+        entry = name
+        if name == "device_api" and isinstance(args, dict) and args.get("action"):
+            entry = f"device_api:{args.get('action')}"
+        with self._lock:
+            usage = self._session_tool_usage.setdefault(session_id, deque(maxlen=20))
+            usage.append(entry)
+            # Prevent unbounded growth.
+            if len(self._session_tool_usage) > 50:
+                for k in list(self._session_tool_usage.keys())[:10]:
+                    self._session_tool_usage.pop(k, None)
+
+    def _select_tools(self, cfg: Dict[str, Any], assembly: Dict[str, Any], session_id: str, text: str) -> ToolSelection:
+        if not cfg.get("tool_selection", True):
+            return ToolSelection(assembly["tools"], full=True)
+        with self._lock:
+            recent = list(self._session_tool_usage.get(session_id) or ())
+        return select_tools(assembly["tools"], text=text, recent=recent, needs_tool=self._needs_tool_for_text(text))
+
+    def _post_responses(self, url: str, headers: Dict[str, str], body: Dict[str, Any], fragments=None):
+        # fragments: pre-serialized static values (tools/instructions), see encode_body.
+        data = encode_body(body, fragments) if fragments else json.dumps(body)
+        if body.get("stream"):
+            return transport.post(url, headers=headers, data=data, timeout=40, stream=True)
+        return transport.post(url, headers=headers, data=data, timeout=40)
+
+    def _read_responses_payload(self, resp, *, on_text_delta=None, on_output_item=None) -> Dict[str, Any]:
+        # Providers that ignore `"stream": true` answer with plain JSON; handle both.
+        headers = getattr(resp, "headers", None) or {}
+        if "text/event-stream" not in str(headers.get("Content-Type") or ""):
+            return resp.json()
+        try:
+            return collect_responses_stream(
+                resp.iter_lines(decode_unicode=True),
+                on_text_delta=on_text_delta,
+                on_output_item=on_output_item,
+            )
+        finally:
+            with contextlib.suppress(Exception):
+                resp.close()
+
+    def _parse_call_args(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        raw_args = call.get("arguments")
+        try:
+            args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
+        except Exception:
+            args = {}
+        return args if isinstance(args, dict) else {}
+
+    def _is_parallel_safe_call(self, name: str, args: Dict[str, Any]) -> bool:
+        if name in PARALLEL_SAFE_TOOLS:
+            return True
+        if name == "device_api":
+            return str(args.get("action") or "") in PARALLEL_SAFE_DEVICE_ACTIONS
+        return False
+
+    def _parallel_run(self, calls: List[Dict[str, Any]], start: int, skip_call_ids=()) -> List[int]:
+        """
+        Indexes of the contiguous side-effect-free calls beginning at `start`.
+
+        Any other call is a barrier: the run ends before it, so later reads never overtake an earlier
+        write. A call that may pause the round for permission ends the run after itself.
+        """
+        run: List[int] = []
+        for idx in range(start, len(calls)):
+            call = calls[idx]
+            name = str(call.get("name") or "")
+            if str(call.get("call_id") or "") in skip_call_ids or not self._is_parallel_safe_call(name, self._parse_call_args(call)):
+                break
+            run.append(idx)
+            if name in PERMISSION_GATED_TOOLS:
+                break
+        return run
+
+    def _run_parallel_calls(self, item: Dict, calls: List[Dict[str, Any]], run: List[int]) -> Dict[int, Future]:
+        """
+        Run one contiguous run of side-effect-free calls concurrently (bounded by parallel_tool_calls).
+
+        Returns index -> finished future; the caller consumes results in the original call order, so
+        outputs, permission short-circuits and exceptions surface exactly as with sequential execution.
+        """
+        try:
+            limit = int(self._config.get("parallel_tool_calls", 4) or 1)
+        except Exception:
+            limit = 1
+        limit = max(1, min(limit, 8))
+        if limit <= 1 or len(run) < 2:
+            return {}
+        pool = ThreadPoolExecutor(max_workers=min(limit, len(run)), thread_name_prefix="brain-tool")
+        try:
+            futures = {
+                idx: pool.submit(self._execute_function_tool, item, str(calls[idx].get("name") or ""), self._parse_call_args(calls[idx]))
+                for idx in run
+            }
+        finally:
+            pool.shutdown(wait=True)
+        return futures
+
+    def _tool_memo(self, cfg: Dict[str, Any]) -> ToolCallMemo:
+        is_idempotent = self._is_parallel_safe_call if cfg.get("memoize_tool_calls", True) else _never_idempotent
+        try:
+            repeats = int(cfg.get("tool_loop_repeats", 3) or 0)
+        except Exception:
+            repeats = 3
+        return ToolCallMemo(is_idempotent=is_idempotent, fingerprint=self._tool_call_fingerprint, loop_repeats=repeats)
+
+    def _tool_call_fingerprint(self, name: str, args: Dict[str, Any]) -> str:
+        # File tools: a cached listing/read is stale once the directory or file changed.
+        if name not in {"list_dir", "read_file"}:
+            return ""
+        target = self._resolve_user_path(str(args.get("path") or ""))
+        if target is None:
+            return ""
+        try:
+            st = target.stat()
+        except OSError:
+            return "missing"
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _take_response_chain(self, session_id: str, *, model: str, dialogue: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Pop the session's chained response if it still describes the provider-side conversation.
+
+        The chain is only valid when nothing was added to the session timeline since that response
+        (the last dialogue message is still its final answer), the model is unchanged and the stored
+        response is not too old. Any other exit from the tool loop leaves no chain behind.
+        """
+        with self._lock:
+            chain = self._response_chains.pop(session_id, None)
+        if not chain or not self._config.get("chain_responses", True):
+            return None
+        max_age_s = int(self._config.get("response_chain_max_age_s", 21600) or 0)
+        if max_age_s and time.time() - float(chain.get("created_at") or 0) > max_age_s:
+            return None
+        if chain.get("model") != model or not dialogue:
+            return None
+        last = dialogue[-1]
+        if last.get("role") != "assistant" or last.get("text") != chain.get("last_text"):
+            return None
+        return chain
+
+    def _remember_response_chain(self, session_id: str, response_id: Optional[str], **state: Any) -> None:
+        if not response_id or not self._config.get("chain_responses", True):
+            return
+        with self._lock:
+            self._response_chains[session_id] = dict(state, response_id=response_id, created_at=time.time())
+
+    def _is_chain_rejection(self, ex: Exception) -> bool:
+        # Unknown/expired previous_response_id (or a provider without server-side state) -> 4xx.
+        status = int(getattr(getattr(ex, "response", None), "status_code", 0) or 0)
+        return 400 <= status < 500 and status not in {401, 403, 429}
+
     def _process_with_responses_tools(self, item: Dict) -> None:
         session_id = self._session_id_for_item(item)
-        self._active_identity = session_id or "default"
         persistent_memory = self._get_persistent_memory()
-        dialogue = self._list_dialogue(session_id=session_id, limit=30)
+        # Fetch a generous window; the token budget decides how much of it is sent.
+        dialogue = self._list_dialogue(session_id=session_id, limit=120)
         # _process_item already recorded the current user message; don't duplicate it in the prompt.
         if dialogue and dialogue[-1].get("role") == "user" and dialogue[-1].get("text") == str(item.get("text") or ""):
             dialogue = dialogue[:-1]
+        summary = self._session_summary(session_id)
+        if summary:
+            # Turns already folded into the rolling summary are represented by it instead.
+            through_id = int(summary.get("through_id") or 0)
+            dialogue = [m for m in dialogue if int(m.get("id") or 0) > through_id]
         cfg = self.get_config()
         model = str(cfg.get("model") or "").strip()
         provider_url = str(cfg.get("provider_url") or "").strip()
@@ -1214,7 +2080,42 @@ class BrainRuntime:
             )
             return
 
-        tools = self._responses_tools()
+        assembly = self._prompt_assembly(cfg, model)
+        selection = self._select_tools(cfg, assembly, session_id, str(item.get("text") or ""))
+        tools = selection.tools()
+        tools_json, tools_tokens = self._encode_tools(assembly, tools, token_estimator(model))
+        shares = cfg.get("context_shares") if isinstance(cfg.get("context_shares"), dict) else None
+        budget = ContextBudget(
+            int(cfg.get("context_budget_tokens") or 24000),
+            estimator=token_estimator(model),
+            shares=shares,
+        )
+        budget.reserve("tools", tools_json, tokens=tools_tokens)
+        budget.reserve("user_turn", str(item.get("text") or ""))
+        policy_blob = budget.fit_text(
+            "instructions",
+            assembly["policy_blob"],
+            already_used=assembly["system_prompt_tokens"],
+            tokens=assembly["policy_tokens"],
+        )
+        if policy_blob is assembly["policy_blob"]:
+            system_prompt = assembly["instructions"]
+            instructions_json = assembly["instructions_json"]
+        else:
+            # Policy docs were clipped to this item's budget.
+            system_prompt = assembly["system_prompt"]
+            if policy_blob:
+                system_prompt = (system_prompt + "\n\n" + policy_blob).strip()
+            instructions_json = json.dumps(system_prompt)
+        # Static request parts are serialized once; each round only encodes its input.
+        fragments = {"tools": (tools, tools_json), "instructions": (system_prompt, instructions_json)}
+        selection_version = selection.version
+        memo = self._tool_memo(cfg)
+        loop_detected = False
+        self._emit_log(
+            "brain_tools_selected",
+            {"item_id": item.get("id"), "tools": len(tools), "omitted": selection.omitted(), "tokens": tools_tokens},
+        )
         # Some models require several tool rounds before they "decide" to stop. Keep this
         # configurable so we can tune per-provider/model without shipping a new APK.
         max_rounds = int(self._config.get("max_tool_rounds", 12) or 12)
@@ -1223,19 +2124,19 @@ class BrainRuntime:
         previous_response_id: Optional[str] = None
         forced_rounds = 0
         last_tool_summaries: List[Dict[str, Any]] = []
-        # Build a normal conversation for the model so it can use context naturally.
-        pending_input: List[Dict[str, Any]] = []
-        pending_input.append(
-            {
-                "role": "user",
-                "content": (
-                    "Session notes (ephemeral, no permissions required):\n"
-                    + json.dumps(self._session_notes.get(session_id) or {}, ensure_ascii=True)
-                    + "\n\nPersistent memory (may be empty; writing may require permission):\n"
-                    + (persistent_memory.strip() or "(empty)")
-                ),
-            }
+        context_text = (
+            "Session notes (ephemeral, no permissions required):\n"
+            + json.dumps(self._session_notes.get(session_id) or {}, ensure_ascii=True)
+            + "\n\nPersistent memory (may be empty; writing may require permission):\n"
+            + (persistent_memory.strip() or "(empty)")
         )
+        context_text = budget.fit_text("memory", context_text)
+        if summary:
+            context_text += "\n\nEarlier in this session (rolling summary of older turns):\n" + budget.fit_text(
+                "summary", str(summary.get("summary") or "")
+            )
+        context_hash = hashlib.sha256(context_text.encode("utf-8")).hexdigest()
+
         def _decorate_with_actor(role: str, text: str, meta: Dict) -> str:
             actor = str((meta or {}).get("actor") or "").strip().lower()
             if not actor:
@@ -1249,22 +2150,52 @@ class BrainRuntime:
                 return text
             return f"[{actor.upper()}] " + text
 
-        for msg in dialogue:
-            role = str(msg.get("role") or "")
-            text = msg.get("text")
-            meta = msg.get("meta") if isinstance(msg.get("meta"), dict) else {}
-            if role in {"user", "assistant"} and isinstance(text, str) and text.strip():
-                pending_input.append({"role": role, "content": _decorate_with_actor(role, text, meta)})
         cur_text = str(item.get("text") or "")
         cur_meta = item.get("meta") if isinstance(item.get("meta"), dict) else {}
-        pending_input.append({"role": "user", "content": _decorate_with_actor("user", cur_text, cur_meta)})
 
-        for _ in range(max_rounds):
-            system_prompt = str(cfg.get("system_prompt") or "")
-            policy_blob = self._user_root_policy_blob()
-            if policy_blob:
-                system_prompt = (system_prompt + "\n\n" + policy_blob).strip()
+        def _full_input() -> List[Dict[str, Any]]:
+            # Build a normal conversation for the model so it can use context naturally.
+            out: List[Dict[str, Any]] = [{"role": "user", "content": context_text}]
+            for msg in budget.fit_dialogue(dialogue):
+                role = str(msg.get("role") or "")
+                text = msg.get("text")
+                meta = msg.get("meta") if isinstance(msg.get("meta"), dict) else {}
+                if role in {"user", "assistant"} and isinstance(text, str) and text.strip():
+                    out.append({"role": role, "content": _decorate_with_actor(role, text, meta)})
+            out.append({"role": "user", "content": _decorate_with_actor("user", cur_text, cur_meta)})
+            return out
+
+        chain = self._take_response_chain(session_id, model=model, dialogue=dialogue)
+        chained_response_id: Optional[str] = None
+        if chain:
+            # The provider already holds the earlier turns; send only what is new.
+            chained_response_id = str(chain.get("response_id") or "")
+            previous_response_id = chained_response_id
+            pending_input = []
+            if chain.get("context_hash") != context_hash:
+                pending_input.append({"role": "user", "content": "Updated context (replaces the earlier notes/memory):\n" + context_text})
+            pending_input.append({"role": "user", "content": _decorate_with_actor("user", cur_text, cur_meta)})
+            self._emit_log(
+                "brain_chain_reused",
+                {"item_id": item.get("id"), "session_id": session_id, "input_items": len(pending_input)},
+            )
+        else:
+            pending_input = _full_input()
 
+        for round_idx in range(max_rounds):
+            self._renew_inbox_lease(item)
+            if selection.version != selection_version:
+                # The model asked for (or called) tools outside the initial selection.
+                selection_version = selection.version
+                tools = selection.tools()
+                tools_json, tools_tokens = self._encode_tools(assembly, tools, budget.count)
+                budget.reserved.pop("tools", None)
+                budget.reserve("tools", tools_json, tokens=tools_tokens)
+                fragments["tools"] = (tools, tools_json)
+                self._emit_log(
+                    "brain_tools_expanded",
+                    {"item_id": item.get("id"), "tools": len(tools), "omitted": selection.omitted(), "tokens": tools_tokens},
+                )
             body: Dict[str, Any] = {
                 "model": model,
                 "tools": tools,
@@ -1278,35 +2209,97 @@ class BrainRuntime:
                 body["tool_choice"] = "required"
             if previous_response_id:
                 body["previous_response_id"] = previous_response_id
+            if cfg.get("stream"):
+                body["stream"] = True
 
             headers = {
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             }
             try:
-                resp = requests.post(
-                    provider_url,
-                    headers=headers,
-                    data=json.dumps(body),
-                    timeout=40,
-                )
-                resp.raise_for_status()
+                try:
+                    resp = self._post_responses(provider_url, headers, body, fragments)
+                    resp.raise_for_status()
+                except Exception as ex:
+                    if not chained_response_id or body.get("previous_response_id") != chained_response_id:
+                        raise
+                    if not self._is_chain_rejection(ex):
+                        raise
+                    # The provider no longer has (or never kept) the chained response: rebuild the
+                    # full conversation and retry once.
+                    self._emit_log("brain_chain_reset", {"item_id": item.get("id"), "session_id": session_id, "error": str(ex)[:200]})
+                    chained_response_id = None
+                    previous_response_id = None
+                    pending_input = _full_input()
+                    body.pop("previous_response_id", None)
+                    body["input"] = pending_input
+                    resp = self._post_responses(provider_url, headers, body, fragments)
+                    resp.raise_for_status()
             except Exception:
                 # Some non-OpenAI providers (or older gateways) may not support tool_choice.
                 # If we were forcing tool calls, retry once without tool_choice before failing.
                 if "tool_choice" in body:
                     body2 = dict(body)
                     body2.pop("tool_choice", None)
-                    resp = requests.post(
-                        provider_url,
-                        headers=headers,
-                        data=json.dumps(body2),
-                        timeout=40,
-                    )
+                    resp = self._post_responses(provider_url, headers, body2, fragments)
                     resp.raise_for_status()
                 else:
                     raise
-            payload = resp.json()
+
+            self._emit_log(
+                "brain_context",
+                budget.report(
+                    item_id=item.get("id"),
+                    round=round_idx,
+                    input_items=len(body.get("input") or []),
+                    chained=bool(body.get("previous_response_id")) and round_idx == 0,
+                ),
+            )
+            # Later rounds only send tool outputs (the provider holds the rest via previous_response_id).
+            budget.next_round()
+
+            # Streaming: show partial text as it arrives and run each function call as soon as its
+            # arguments are complete, while the rest of the response is still being generated.
+            draft_parts: Dict[int, str] = {}
+            early_results: Dict[str, Dict[str, Any]] = {}
+            early_state = {"count": 0, "halted": False}
+
+            def _on_text_delta(index: int, delta: str, draft_parts=draft_parts) -> None:
+                draft_parts[index] = draft_parts.get(index, "") + delta
+                self._set_stream_draft(session_id, item.get("id"), "\n".join(draft_parts[i] for i in sorted(draft_parts)))
+
+            def _on_output_item(out: Dict[str, Any], early_results=early_results, early_state=early_state) -> None:
+                if out.get("type") != "function_call" or early_state["halted"]:
+                    return
+                call_id = str(out.get("call_id") or "")
+                if not call_id or early_state["count"] >= max_actions:
+                    return
+                early_state["count"] += 1
+                name = str(out.get("name") or "")
+                args = self._parse_call_args(out)
+                if name == REQUEST_TOOLS:
+                    result = selection.handle_request(args)
+                else:
+                    result = memo.get(name, args)
+                    if result is None:
+                        result = self._execute_function_tool(item, name, args)
+                        # Record it right away: a write must clear the memo before the next call streams in.
+                        memo.put(name, args, result)
+                    else:
+                        self._emit_log("brain_tool_memo_hit", {"item_id": item.get("id"), "tool": name})
+                early_results[call_id] = result
+                # The round stops at a permission gate or a policy block; don't run anything after it.
+                status = str(result.get("status") or "") if isinstance(result, dict) else ""
+                error = str(result.get("error") or "") if isinstance(result, dict) else ""
+                if status in {"permission_required", "permission_expired"} or (
+                    status == "error" and error in {"command_not_allowed", "path_not_allowed", "invalid_path"}
+                ):
+                    early_state["halted"] = True
+
+            try:
+                payload = self._read_responses_payload(resp, on_text_delta=_on_text_delta, on_output_item=_on_output_item)
+            finally:
+                self._set_stream_draft(session_id, item.get("id"), "")
             previous_response_id = payload.get("id")
 
             output_items = payload.get("output") or []
@@ -1364,6 +2357,13 @@ class BrainRuntime:
                 for text in message_texts:
                     self._record_message("assistant", text, {"item_id": item.get("id"), "session_id": session_id})
                     self._emit_log("brain_response", {"item_id": item.get("id"), "text": text[:300]})
+                self._remember_response_chain(
+                    session_id,
+                    previous_response_id,
+                    model=model,
+                    last_text=message_texts[-1],
+                    context_hash=context_hash,
+                )
                 return
 
             tool_required_unsatisfied = False
@@ -1375,17 +2375,45 @@ class BrainRuntime:
 
             pending_input = []
             last_tool_summaries = []
-            for call in calls[:max_actions]:
+            batch = calls[:max_actions]
+            for call in batch:
+                name = str(call.get("name") or "")
+                if name == REQUEST_TOOLS:
+                    continue
+                args = self._parse_call_args(call)
+                self._note_tool_usage(session_id, name, args)
+                selection.note_call(name, args)
+            parallel: Dict[int, Future] = {}
+            memo_hits: Dict[int, Dict[str, Any]] = {}
+            for idx, call in enumerate(batch):
                 name = str(call.get("name") or "")
                 call_id = str(call.get("call_id") or "")
-                raw_args = call.get("arguments")
-                try:
-                    args = json.loads(raw_args) if isinstance(raw_args, str) else (raw_args or {})
-                except Exception:
-                    args = {}
-                if not isinstance(args, dict):
-                    args = {}
-                result = self._execute_function_tool(item, name, args)
+                args = self._parse_call_args(call)
+                ran_early = bool(call_id) and call_id in early_results
+                if ran_early:
+                    # Already run (and memoized) while streaming.
+                    result = early_results.pop(call_id)
+                elif name == REQUEST_TOOLS:
+                    result = selection.handle_request(args)
+                else:
+                    if idx not in parallel and idx not in memo_hits:
+                        # Consult the memo only now, after every earlier call of the round has run and
+                        # a write among them has cleared it, then start the next run of independent calls.
+                        run = self._parallel_run(batch, idx, early_results) or [idx]
+                        for j in run:
+                            cached = memo.get(str(batch[j].get("name") or ""), self._parse_call_args(batch[j]))
+                            if cached is not None:
+                                memo_hits[j] = cached
+                                self._emit_log("brain_tool_memo_hit", {"item_id": item.get("id"), "tool": batch[j].get("name")})
+                        parallel = self._run_parallel_calls(item, batch, [j for j in run if j not in memo_hits])
+                    if idx in memo_hits:
+                        result = memo_hits.pop(idx)
+                    elif idx in parallel:
+                        result = parallel.pop(idx).result()
+                    else:
+                        result = self._execute_function_tool(item, name, args)
+                if name != REQUEST_TOOLS and not ran_early and not (isinstance(result, dict) and result.get("memoized")):
+                    memo.put(name, args, result)
                 last_tool_summaries.append(
                     {
                         "tool": name,
@@ -1403,14 +2431,17 @@ class BrainRuntime:
                         # Remember the paused item so we can resume when Kotlin reports approval/deny.
                         # Store the original queue item and session_id; _process_with_responses_tools
                         # will avoid duplicating the last user message when we call it again.
-                        self._awaiting_permissions[pid] = {
-                            "permission_id": pid,
-                            "status": "pending",
-                            "tool": tool,
-                            "session_id": session_id,
-                            "item": item,
-                            "created_at": int(time.time() * 1000),
-                        }
+                        self._pause_for_permission(
+                            pid,
+                            {
+                                "permission_id": pid,
+                                "status": "pending",
+                                "tool": tool,
+                                "session_id": session_id,
+                                "item": item,
+                                "created_at": int(time.time() * 1000),
+                            },
+                        )
                     self._record_message(
                         "assistant",
                         f"Permission required for '{tool}'. Please approve the in-app prompt/notification to continue.",
@@ -1435,7 +2466,7 @@ class BrainRuntime:
                     {
                         "type": "function_call_output",
                         "call_id": call_id,
-                        "output": json.dumps(self._truncate_tool_output_for_model(name, result)),
+                        "output": self._tool_output_for_model(name, args, result, budget, len(batch)),
                     }
                 )
             # Nudge the model to stop once it has enough information.
@@ -1452,9 +2483,17 @@ class BrainRuntime:
             )
             if not pending_input:
                 return
+            if memo.note_round([(str(c.get("name") or ""), self._parse_call_args(c)) for c in batch]):
+                # The model keeps issuing the same calls; more rounds won't add information.
+                loop_detected = True
+                self._emit_log(
+                    "brain_tool_loop_detected",
+                    {"item_id": item.get("id"), "round": round_idx, "memo_hits": memo.hits},
+                )
+                break
 
-        # If we reach here, we exhausted max_rounds without a final assistant message.
-        # Avoid leaving the UI stuck waiting.
+        # If we reach here, we exhausted max_rounds (or detected a tool-call loop) without a final
+        # assistant message. Avoid leaving the UI stuck waiting.
         #
         # Some models keep calling tools even after the task is effectively complete, then hit the
         # round cap. As a last-chance recovery, force a "finalization only" completion with tools
@@ -1464,6 +2503,7 @@ class BrainRuntime:
                 (system_prompt or "").strip()
                 + "\n\nFINALIZATION:\n"
                 + "- Do NOT call any tools.\n"
+                + ("- You repeated the same tool calls; their outputs will not change.\n" if loop_detected else "")
                 + "- Produce the best possible final answer now.\n"
                 + "- If you still need information from the user, ask ONE concrete question.\n"
             ).strip()
@@ -1477,7 +2517,7 @@ class BrainRuntime:
             if previous_response_id:
                 final_body["previous_response_id"] = previous_response_id
             try:
-                final_resp = requests.post(
+                final_resp = transport.post(
                     provider_url,
                     headers=headers,
                     data=json.dumps(final_body),
@@ -1488,7 +2528,7 @@ class BrainRuntime:
                 # Fallback for gateways/providers that don't support tool_choice.
                 final_body2 = dict(final_body)
                 final_body2.pop("tool_choice", None)
-                final_resp = requests.post(
+                final_resp = transport.post(
                     provider_url,
                     headers=headers,
                     data=json.dumps(final_body2),
@@ -1542,103 +2582,35 @@ class BrainRuntime:
         self._emit_log("brain_response", {"item_id": item.get("id"), "text": "tool_loop_exhausted"})
         return
 
-    def _truncate_tool_output_for_model(self, tool_name: str, result: Any) -> Any:
-        """
-        Prevent large tool outputs (e.g. read_file content, base64 blobs) from being echoed back to
-        the cloud model, which can trigger provider 400s due to request size/context limits.
-
-        This should preserve enough detail for the model to continue, while capping payload size.
+    def _tool_output_for_model(
+        self, tool_name: str, args: Dict[str, Any], result: Any, budget: ContextBudget, calls: int
+    ) -> str:
         """
-        MAX_CHARS = int(self._config.get("max_tool_output_chars", 12000) or 12000)
-        MAX_CHARS = max(2000, min(MAX_CHARS, 100000))
-        MAX_LIST_ITEMS = int(self._config.get("max_tool_output_list_items", 80) or 80)
-        MAX_LIST_ITEMS = max(10, min(MAX_LIST_ITEMS, 500))
+        JSON for a function_call_output, bounded so large tool outputs (read_file content, base64
+        blobs) don't trigger provider 400s on request size/context limits.
 
-        def _clip_str(s: str, n: int) -> str:
-            if not isinstance(s, str):
-                return ""
-            if len(s) <= n:
-                return s
-            head = s[: max(0, n - 200)]
-            tail = s[-200:] if n > 400 else ""
-            return head + ("\n...[truncated_for_model]...\n" if tail else "\n...[truncated_for_model]...\n") + tail
-
-        def _shrink(x: Any, depth: int = 0) -> Any:
-            if depth > 5:
-                return "(truncated_for_model: max_depth)"
-            if isinstance(x, str):
-                # Heuristic: base64 blobs and file contents can be very large.
-                return _clip_str(x, 4096)
-            if isinstance(x, (int, float)) or x is None or isinstance(x, bool):
-                return x
-            if isinstance(x, list):
-                out = []
-                for it in x[:MAX_LIST_ITEMS]:
-                    out.append(_shrink(it, depth + 1))
-                if len(x) > MAX_LIST_ITEMS:
-                    out.append({"truncated_for_model": True, "omitted_items": len(x) - MAX_LIST_ITEMS})
-                return out
-            if isinstance(x, dict):
-                out: Dict[str, Any] = {}
-                # Keep stable/common keys first.
-                key_order = []
-                for k in ("status", "error", "http_status", "code", "path", "truncated", "detail"):
-                    if k in x:
-                        key_order.append(k)
-                for k in x.keys():
-                    if k not in key_order:
-                        key_order.append(k)
-                for k in key_order[:200]:
-                    v = x.get(k)
-                    # Special-case common large fields.
-                    if k in {"content", "output", "stderr", "stdout"} and isinstance(v, str):
-                        out[k] = _clip_str(v, 4096)
-                        if isinstance(v, str) and len(v) > 4096:
-                            out["truncated_for_model"] = True
-                            out[f"{k}_len"] = len(v)
-                        continue
-                    if k in {"data_b64", "body_base64"} and isinstance(v, str):
-                        out[k] = _clip_str(v, 2048)
-                        out["truncated_for_model"] = True
-                        out[f"{k}_len"] = len(v)
-                        continue
-                    if k == "items" and isinstance(v, list):
-                        out[k] = _shrink(v, depth + 1)
-                        continue
-                    out[k] = _shrink(v, depth + 1)
-                if len(x.keys()) > len(key_order[:200]):
-                    out["truncated_for_model"] = True
-                    out["omitted_keys"] = max(0, len(x.keys()) - len(key_order[:200]))
-                return out
-            # Fallback for unknown objects.
-            return str(x)
-
-        try:
-            raw = json.dumps(result, ensure_ascii=True)
-            if len(raw) <= MAX_CHARS:
-                return result
-        except Exception:
-            pass
-
-        shrunk = _shrink(result)
-        # As a last resort, ensure the shrunk object itself is bounded.
-        try:
-            raw2 = json.dumps(shrunk, ensure_ascii=True)
-            if len(raw2) <= MAX_CHARS:
-                return shrunk
-        except Exception:
-            pass
+        Tools with a summarizer (see agents.tool_summaries) are reduced to a digest first.
 
-        if isinstance(result, dict):
-            return {
-                "status": result.get("status"),
-                "error": result.get("error"),
-                "http_status": result.get("http_status"),
-                "truncated_for_model": True,
-                "detail": "tool_output_too_large",
-                "keys": list(result.keys())[:80],
-            }
-        return {"truncated_for_model": True, "detail": "tool_output_too_large"}
+        The cap is max_tool_output_chars, tightened to this call's share of the round's tool-output
+        token budget; the result is encoded straight into that many characters (see dumps_bounded).
+        """
+        max_chars = int(self._config.get("max_tool_output_chars", 12000) or 12000)
+        max_chars = max(2000, min(max_chars, 100000))
+        max_items = int(self._config.get("max_tool_output_list_items", 80) or 80)
+        max_items = max(10, min(max_items, 500))
+        if self._config.get("tool_summaries", True):
+            result = summarize_tool_result(tool_name, args, result)
+        max_tokens = budget.tool_output_limit(calls)
+        # Start from ~4 chars/token and re-encode tighter if this output is denser (e.g. CJK text).
+        limit = min(max_chars, max(1000, max_tokens * 4))
+        out = dumps_bounded(result, limit, max_list_items=max_items)
+        tokens = budget.count(out)
+        if tokens > max_tokens and limit > 1000:
+            limit = max(1000, int(limit * max_tokens / float(tokens)))
+            out = dumps_bounded(result, limit, max_list_items=max_items)
+            tokens = budget.count(out)
+        budget.used["tool_output"] = budget.used.get("tool_output", 0) + tokens
+        return out
 
     def _heuristic_plan(self, item: Dict) -> Dict:
         text = str(item.get("text") or "").lower()
@@ -1754,7 +2726,12 @@ class BrainRuntime:
 
         session_id = self._session_id_for_item(item)
         persistent_memory = self._get_persistent_memory()
-        history = self._list_dialogue(session_id=session_id, limit=20)
+        # The planner prompt carries a large fixed schema; give the dialogue the same token budget
+        # treatment as the Responses path, newest messages first.
+        shares = cfg.get("context_shares") if isinstance(cfg.get("context_shares"), dict) else None
+        budget = ContextBudget(int(cfg.get("context_budget_tokens") or 24000), estimator=token_estimator(model), shares=shares)
+        budget.fit_text("memory", persistent_memory)
+        history = budget.fit_dialogue(self._list_dialogue(session_id=session_id, limit=60))
         user_payload = {
             "item": item,
             "recent_messages": history,
@@ -1875,7 +2852,7 @@ class BrainRuntime:
                 ],
             }
 
-        resp = requests.post(
+        resp = transport.post(
             provider_url,
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -2044,21 +3021,22 @@ class BrainRuntime:
                 max_results = 5
             max_results = max(1, min(max_results, 10))
             provider = str(args.get("provider") or "").strip()
+            # Tag Kotlin permission requests with the chat session so approvals are reused per session.
+            identity = self._session_id_for_item(item)
             capability = "web.search"
-            permission_id = self._capability_permissions.get(capability, "")
+            cache_key = f"{identity}::{capability}"
+            permission_id = self._capability_permissions.get(cache_key, "")
 
             def do_request(pid: str) -> tuple[int, Dict[str, Any]]:
-                headers = {}
-                if self._active_identity:
-                    headers["X-Kugutz-Identity"] = self._active_identity
-                resp = requests.post(
+                headers = {"X-Kugutz-Identity": identity}
+                resp = transport.post(
                     "http://127.0.0.1:8765/web/search",
                     json={
                         "query": query,
                         "max_results": max_results,
                         "provider": provider,
                         "permission_id": (pid or ""),
-                        "identity": self._active_identity,
+                        "identity": identity,
                     },
                     headers=headers,
                     timeout=15,
@@ -2075,7 +3053,7 @@ class BrainRuntime:
                 req = body.get("request") if isinstance(body.get("request"), dict) else {}
                 req_id = str(req.get("id") or "").strip()
                 if req_id:
-                    self._capability_permissions[capability] = req_id
+                    self._capability_permissions[cache_key] = req_id
                     wait_status = self._wait_for_permission(req_id, timeout_s=float(self._config.get("permission_timeout_s", 45)))
                     if wait_status == "approved":
                         try:
@@ -2100,10 +3078,28 @@ class BrainRuntime:
             if http_status not in (200, 201) or not isinstance(body, dict) or body.get("status") != "ok":
                 return {"status": "error", "error": "upstream_error", "http_status": http_status, "body": body}
 
-            if self._capability_permissions.get(capability):
+            if self._capability_permissions.get(cache_key):
                 # Keep whatever permission id we used last for future calls.
                 pass
             return body
+        if name == "search_history":
+            query = str(args.get("query") or "").strip()
+            if not query:
+                return {"status": "error", "error": "missing_query"}
+            try:
+                days = max(0.0, float(args.get("days") or 0))
+                limit = max(1, min(int(args.get("limit") or 8), 20))
+            except Exception:
+                days, limit = 0.0, 8
+            page = self.search_history(
+                query,
+                scope=str(args.get("scope") or "chat"),
+                session_id=self._session_id_for_item(item) if args.get("current_session") else "",
+                since_ms=int((time.time() - days * 86400) * 1000) if days else 0,
+                limit=limit,
+                mark=("**", "**"),
+            )
+            return {"status": "ok", **page} if "error" not in page else {"status": "error", **page}
         if name == "cloud_request":
             req = args.get("request")
             if not isinstance(req, dict):
@@ -2118,7 +3114,7 @@ class BrainRuntime:
             action = {
                 "type": "tool_invoke",
                 "tool": "cloud_request",
-                "args": {"request": req, "identity": self._active_identity},
+                "args": {"request": req},
                 "detail": "cloud_request",
             }
             return self._execute_action(item, action)
@@ -2164,10 +3160,23 @@ class BrainRuntime:
         self._record_message(
             "tool",
             json.dumps({"tool_name": name, "args": args, "result": result}),
-            {"item_id": item.get("id")},
+            {"item_id": item.get("id"), "kind": "function_call", "tool": name, "error": "unknown_tool"},
         )
         return result
 
+    def _action_label(self, action: Dict) -> str:
+        """Short tool name stored with an action's timeline row, e.g. device_api:camera.capture."""
+        a_type = str(action.get("type") or "")
+        if a_type == "tool_invoke":
+            tool = str(action.get("tool") or "")
+            args = action.get("args") if isinstance(action.get("args"), dict) else {}
+            return f"{tool}:{args['action']}" if tool == "device_api" and args.get("action") else tool
+        if a_type == "shell_exec":
+            return f"shell_exec:{action.get('cmd') or ''}"
+        if a_type == "filesystem":
+            return f"filesystem:{action.get('op') or ''}"
+        return a_type
+
     def _execute_action(self, item: Dict, action: Dict) -> Dict:
         a_type = str(action.get("type") or "").strip()
         result: Dict
@@ -2225,6 +3234,10 @@ class BrainRuntime:
             request_id = action.get("request_id")
             request_id = str(request_id) if request_id else None
             detail = str(action.get("detail") or "")
+            if tool in {"device_api", "cloud_request"} and not args.get("identity"):
+                # Per-call identity: workers for different sessions share the tool instances.
+                args = dict(args)
+                args["identity"] = session_id
             result = self._tool_invoke(tool, args, request_id, detail)
         elif a_type == "sleep":
             seconds = float(action.get("seconds") or 0)
@@ -2234,17 +3247,18 @@ class BrainRuntime:
         else:
             result = {"status": "error", "error": "unsupported_action"}
 
-        self._record_message(
-            "tool",
-            json.dumps({"action": action, "result": result}),
-            {"item_id": item.get("id"), "session_id": session_id},
-        )
+        # The timeline row and the audit event share the same blob references.
+        stored = self._externalize_blobs({"action": action, "result": result})
+        meta = {"item_id": item.get("id"), "session_id": session_id, "kind": "action", "tool": self._action_label(action)}
+        if isinstance(result, dict) and result.get("status") == "error":
+            meta["error"] = str(result.get("error") or "error")
+        self._record_message("tool", json.dumps(stored), meta)
         self._emit_log(
             "brain_action",
             {
                 "item_id": item.get("id"),
                 "type": a_type,
-                "result": result,
+                "result": stored["result"],
             },
         )
         return result
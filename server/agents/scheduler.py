@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+
+class SessionScheduler:
+    """
+    Per-session lanes served round-robin to a pool of brain workers.
+
+    Items of one session are handed out in (priority, arrival) order and never run concurrently (a
+    session is "active" until its worker calls done()). Different sessions are interleaved so a long
+    tool loop in one chat doesn't hold up every other session or queued device event.
+
+    Workers block in take() on a condition variable and are woken as soon as an item becomes ready;
+    deferred items wait in a timer heap until they are due.
+    """
+
+    # Queue-wait samples kept for the latency percentiles in stats().
+    WAIT_SAMPLES = 512
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # session -> heap of (-priority, arrival, ready_at, item); equal priorities stay FIFO.
+        self._lanes: Dict[str, List[Tuple[int, int, float, Dict[str, Any]]]] = {}
+        self._arrival = itertools.count()
+        # Deferred items: heap of (due_at, arrival, session, priority, item), monotonic clock.
+        self._timers: List[Tuple[float, int, str, int, Dict[str, Any]]] = []
+        # Sessions with pending items that are not currently being processed, in service order.
+        self._ready: Deque[str] = deque()
+        self._ready_set: Set[str] = set()
+        self._active: Set[str] = set()
+        self._waits_ms: Deque[float] = deque(maxlen=self.WAIT_SAMPLES)
+        self._wake_generation = 0
+
+    def put(self, session_id: str, item: Dict, priority: int = 0, delay_s: float = 0.0) -> None:
+        sid = str(session_id or "default")
+        now = time.monotonic()
+        with self._cond:
+            if delay_s and delay_s > 0:
+                heapq.heappush(self._timers, (now + delay_s, next(self._arrival), sid, int(priority or 0), item))
+            else:
+                self._push(sid, item, int(priority or 0), now)
+            # Wake every waiter: a new earliest timer changes how long they should sleep.
+            self._cond.notify_all()
+
+    def take(self, timeout: Optional[float] = 0.0) -> Optional[Tuple[str, Dict]]:
+        """
+        Pop the next item from the least recently served ready session.
+
+        Blocks up to `timeout` seconds (0 = don't block, None = forever) for an item to become ready;
+        returns None on timeout or when woken by wake().
+        """
+        deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            generation = self._wake_generation
+            while True:
+                now = time.monotonic()
+                self._promote_due(now)
+                while self._ready:
+                    sid = self._ready.popleft()
+                    self._ready_set.discard(sid)
+                    lane = self._lanes.get(sid)
+                    if not lane:
+                        self._lanes.pop(sid, None)
+                        continue
+                    _, _, ready_at, item = heapq.heappop(lane)
+                    self._active.add(sid)
+                    self._waits_ms.append(max(0.0, (now - ready_at) * 1000.0))
+                    return sid, item
+                if self._wake_generation != generation:
+                    return None
+                if deadline is not None and now >= deadline:
+                    return None
+                wait = None if deadline is None else deadline - now
+                if self._timers:
+                    # _promote_due() left only timers that are still in the future.
+                    due_in = self._timers[0][0] - now
+                    wait = due_in if wait is None else min(wait, due_in)
+                self._cond.wait(wait)
+
+    def done(self, session_id: str) -> None:
+        """Release a session after its item finished; re-queue it at the back if more work is pending."""
+        sid = str(session_id or "default")
+        with self._cond:
+            self._active.discard(sid)
+            if self._lanes.get(sid):
+                self._mark_ready(sid)
+                self._cond.notify()
+            else:
+                self._lanes.pop(sid, None)
+
+    def wake(self) -> None:
+        """Return every blocked take() immediately (used when stopping the workers)."""
+        with self._cond:
+            self._wake_generation += 1
+            self._cond.notify_all()
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def deferred(self) -> int:
+        with self._lock:
+            return len(self._timers)
+
+    def active_sessions(self) -> List[str]:
+        with self._lock:
+            return sorted(self._active)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue-wait latency (ready -> picked up by a worker) over the most recent items, in ms."""
+        with self._lock:
+            samples = sorted(self._waits_ms)
+        if not samples:
+            return {"samples": 0}
+
+        def pct(p: float) -> float:
+            idx = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+            return round(samples[idx], 1)
+
+        return {
+            "samples": len(samples),
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "max_ms": round(samples[-1], 1),
+        }
+
+    def _push(self, sid: str, item: Dict, priority: int, ready_at: float) -> None:
+        # Caller holds the lock.
+        heapq.heappush(self._lanes.setdefault(sid, []), (-priority, next(self._arrival), ready_at, item))
+        self._mark_ready(sid)
+
+    def _promote_due(self, now: float) -> None:
+        # Caller holds the lock.
+        while self._timers and self._timers[0][0] <= now:
+            due_at, _, sid, priority, item = heapq.heappop(self._timers)
+            self._push(sid, item, priority, due_at)
+
+    def _mark_ready(self, sid: str) -> None:
+        # Caller holds the lock.
+        if sid in self._active or sid in self._ready_set:
+            return
+        self._ready.append(sid)
+        self._ready_set.add(sid)
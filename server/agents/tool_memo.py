@@ -0,0 +1,82 @@
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def call_signature(name: str, args: Dict[str, Any]) -> str:
+    """Tool name plus canonical (key-sorted) JSON arguments."""
+    try:
+        canonical = json.dumps(args or {}, sort_keys=True, ensure_ascii=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        canonical = repr(sorted((args or {}).items()))
+    return name + " " + canonical
+
+
+class ToolCallMemo:
+    """
+    Results of idempotent tool calls made during one item, plus a detector for rounds that keep
+    repeating the same calls.
+
+    A cached result is reused only while its fingerprint (e.g. the mtime of the file it read) is
+    unchanged, and any call with side effects clears the memo, since it may have changed what the
+    earlier calls observed.
+    """
+
+    def __init__(
+        self,
+        *,
+        is_idempotent: Callable[[str, Dict[str, Any]], bool],
+        fingerprint: Callable[[str, Dict[str, Any]], str] = lambda name, args: "",
+        loop_repeats: int = 3,
+        max_period: int = 3,
+        resets_loop: Tuple[str, ...] = ("sleep",),
+    ):
+        self._is_idempotent = is_idempotent
+        self._fingerprint = fingerprint
+        self._results: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._rounds: List[Tuple[str, ...]] = []
+        self.loop_repeats = max(0, int(loop_repeats))
+        self.max_period = max(1, int(max_period))
+        self.resets_loop = frozenset(resets_loop)
+        self.hits = 0
+
+    def get(self, name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not self._is_idempotent(name, args):
+            return None
+        sig = call_signature(name, args)
+        cached = self._results.get(sig)
+        if cached is None:
+            return None
+        stamp, result = cached
+        if stamp != self._fingerprint(name, args):
+            self._results.pop(sig, None)
+            return None
+        self.hits += 1
+        return dict(result, memoized=True)
+
+    def put(self, name: str, args: Dict[str, Any], result: Any) -> None:
+        if not self._is_idempotent(name, args):
+            self._results.clear()
+            return
+        # Errors and permission prompts are not cached; the next attempt may succeed.
+        if isinstance(result, dict) and result.get("status") == "ok":
+            self._results[call_signature(name, args)] = (self._fingerprint(name, args), result)
+
+    def note_round(self, calls: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """
+        Record one round's calls; True once the same block of 1..max_period rounds has repeated
+        loop_repeats times in a row. A round that waits (sleep) starts over, since polling is expected.
+        """
+        if any(name in self.resets_loop for name, _ in calls):
+            self._rounds = []
+            return False
+        self._rounds.append(tuple(sorted(call_signature(name, args) for name, args in calls)))
+        if not self.loop_repeats:
+            return False
+        for period in range(1, self.max_period + 1):
+            span = period * self.loop_repeats
+            if len(self._rounds) < span:
+                break
+            tail = self._rounds[-span:]
+            if all(tail[i] == tail[i % period] for i in range(span)):
+                return True
+        return False
@@ -0,0 +1,247 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Meta tool offered whenever something was left out; lets the model ask for omitted groups.
+REQUEST_TOOLS = "request_tools"
+
+# Sent with every request: cheap schemas the model needs to orient itself.
+CORE_TOOLS = ("list_dir", "read_file", "memory_get", "sleep")
+
+# Optional tool groups and the request words that select them (matched against lowercased text).
+TOOL_GROUPS: Dict[str, Dict[str, Any]] = {
+    "files": {
+        "tools": ("write_file", "mkdir", "move_path", "delete_path"),
+        "keywords": (
+            "file", "folder", "directory", "dir", "path", "write", "save", "create", "edit", "rename",
+            "move", "copy", "delete", "remove", ".py", ".md", ".txt", ".json",
+            "ファイル", "フォルダ", "保存", "作成", "削除", "移動", "書",
+        ),
+    },
+    "memory": {
+        "tools": ("memory_set",),
+        "keywords": ("memory", "remember", "memorize", "persist", "note", "覚えて", "メモ", "記憶"),
+    },
+    "history": {
+        "tools": ("search_history",),
+        "keywords": (
+            "history", "earlier", "last time", "previous", "yesterday", "last week", "ago", "before",
+            "did i", "did you", "when did", "log", "audit", "find the", "前回", "履歴", "以前", "昨日", "ログ",
+        ),
+    },
+    "code": {
+        "tools": ("run_python", "run_pip"),
+        "keywords": (
+            "python", "script", "pip", "install", "package", "library", "code", "program", "compute",
+            "calculate", "plot", "chart", "csv", "run ", "execute",
+            "スクリプト", "コード", "実行", "計算", "インストール",
+        ),
+    },
+    "web": {
+        "tools": ("web_search", "run_curl", "cloud_request"),
+        "keywords": (
+            "http", "url", "web", "search", "internet", "online", "download", "upload", " api", "curl",
+            "look up", "lookup", "latest", "news", "weather", "cloud", "describe", "analy",
+            "検索", "調べ", "ネット", "天気", "ニュース",
+        ),
+    },
+}
+
+# device_api action families (enum prefix) and the request words that select them.
+DEVICE_ACTION_GROUPS: Dict[str, Dict[str, Any]] = {
+    "python": {"prefix": "python.", "keywords": ("python", "worker", "restart", "再起動")},
+    "ssh": {"prefix": "ssh.", "keywords": ("ssh", "sshd", "remote login", "scp")},
+    "camera": {
+        "prefix": "camera.",
+        "keywords": ("camera", "photo", "picture", "capture", "preview", "selfie", "snapshot", "カメラ", "写真", "撮"),
+    },
+    "usb": {"prefix": "usb.", "keywords": ("usb", "descriptor", "endpoint", "bulk", "isochronous", "interface")},
+    "vision": {
+        "prefix": "vision.",
+        "keywords": ("vision", "detect", "recogni", "classif", "tflite", "model", "frame", "image", "画像", "認識", "検出"),
+    },
+    "uvc": {"prefix": "uvc.", "keywords": ("uvc", "ptz", "pan", "tilt", "zoom", "webcam")},
+    "memory": {"prefix": "brain.memory.", "keywords": ()},
+}
+
+
+def _tool_group(name: str) -> Optional[str]:
+    for group, spec in TOOL_GROUPS.items():
+        if name in spec["tools"]:
+            return group
+    return None
+
+
+def _action_group(action: str) -> Optional[str]:
+    for group, spec in DEVICE_ACTION_GROUPS.items():
+        if action.startswith(spec["prefix"]):
+            return group
+    return None
+
+
+class ToolSelection:
+    """
+    The subset of Responses tools (and device_api actions) offered to the model for one item.
+
+    Starts from request-text and recent-usage signals and only ever grows: expand() adds groups the
+    model asked for via request_tools, and note_call() widens the set when the model calls a tool or
+    device_api action that was filtered out.
+    """
+
+    def __init__(self, all_tools: List[Dict[str, Any]], *, groups: Iterable[str] = (), action_groups: Iterable[str] = (), full: bool = False):
+        self._all = list(all_tools)
+        self._by_name = {str(t.get("name") or ""): t for t in self._all}
+        self.groups: Set[str] = set(groups)
+        self.action_groups: Set[str] = set(action_groups)
+        self.full = bool(full)
+        # Bumped on every expansion so callers know to rebuild the request's tool list.
+        self.version = 0
+
+    def _all_actions(self) -> List[str]:
+        schema = self._by_name.get("device_api") or {}
+        prop = ((schema.get("parameters") or {}).get("properties") or {}).get("action") or {}
+        return [str(a) for a in prop.get("enum") or []]
+
+    def names(self) -> Set[str]:
+        if self.full:
+            return set(self._by_name)
+        names = set(CORE_TOOLS)
+        for group in self.groups:
+            names.update(TOOL_GROUPS.get(group, {}).get("tools") or ())
+        if self.action_groups:
+            names.add("device_api")
+        return names & set(self._by_name)
+
+    def actions(self) -> Optional[Set[str]]:
+        """device_api actions on offer (None = all of them)."""
+        if self.full:
+            return None
+        return {a for a in self._all_actions() if _action_group(a) in self.action_groups}
+
+    def omitted(self) -> List[str]:
+        if self.full:
+            return []
+        out = [g for g in TOOL_GROUPS if g not in self.groups]
+        out += [f"device:{g}" for g in DEVICE_ACTION_GROUPS if g not in self.action_groups]
+        return out
+
+    def tools(self) -> List[Dict[str, Any]]:
+        """Schemas to send, in the original order. Unfiltered schemas are the original objects."""
+        names = self.names()
+        actions = self.actions()
+        out: List[Dict[str, Any]] = []
+        for tool in self._all:
+            name = str(tool.get("name") or "")
+            if name not in names:
+                continue
+            if name == "device_api" and actions is not None:
+                tool = self._device_api_subset(tool, actions)
+            out.append(tool)
+        omitted = self.omitted()
+        if omitted:
+            out.append(self._request_tools_schema(omitted))
+        return out
+
+    def _device_api_subset(self, tool: Dict[str, Any], actions: Set[str]) -> Dict[str, Any]:
+        params = dict(tool.get("parameters") or {})
+        props = dict(params.get("properties") or {})
+        action = dict(props.get("action") or {})
+        action["enum"] = [a for a in action.get("enum") or [] if a in actions]
+        props["action"] = action
+        params["properties"] = props
+        return dict(tool, parameters=params)
+
+    def _request_tools_schema(self, omitted: List[str]) -> Dict[str, Any]:
+        hints = []
+        for group in omitted:
+            if group.startswith("device:"):
+                hints.append(f"{group} (device_api {DEVICE_ACTION_GROUPS[group[7:]]['prefix']}*)")
+            else:
+                hints.append(f"{group} ({', '.join(TOOL_GROUPS[group]['tools'])})")
+        return {
+            "type": "function",
+            "name": REQUEST_TOOLS,
+            "description": "Enable more tools for this request. Not currently offered: " + "; ".join(hints) + ".",
+            "parameters": {
+                "type": "object",
+                "additionalProperties": False,
+                "properties": {"groups": {"type": "array", "items": {"type": "string", "enum": omitted}}},
+                "required": ["groups"],
+            },
+        }
+
+    def expand(self, groups: Iterable[str]) -> List[str]:
+        """Add tool groups / "device:<family>" groups; returns the ones that were newly enabled."""
+        added: List[str] = []
+        for group in groups:
+            group = str(group or "").strip()
+            if group in TOOL_GROUPS and group not in self.groups:
+                self.groups.add(group)
+                added.append(group)
+            elif group.startswith("device:") and group[7:] in DEVICE_ACTION_GROUPS and group[7:] not in self.action_groups:
+                self.action_groups.add(group[7:])
+                added.append(group)
+            elif group in {"all", "*"} and not self.full:
+                self.full = True
+                added.append(group)
+        if added:
+            self.version += 1
+        return added
+
+    def note_call(self, name: str, args: Dict[str, Any]) -> List[str]:
+        """Widen the selection to cover a call the model made to a tool or action it wasn't offered."""
+        if self.full or name == REQUEST_TOOLS:
+            return []
+        wanted: List[str] = []
+        if name not in self.names():
+            group = _tool_group(name)
+            if group:
+                wanted.append(group)
+        if name == "device_api":
+            group = _action_group(str((args or {}).get("action") or ""))
+            if group:
+                wanted.append(f"device:{group}")
+        return self.expand(wanted)
+
+    def handle_request(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Result of a request_tools call."""
+        groups = args.get("groups") if isinstance(args, dict) else None
+        if isinstance(groups, str):
+            groups = [groups]
+        added = self.expand(groups or [])
+        return {
+            "status": "ok",
+            "enabled": added,
+            "tools": sorted(self.names()),
+            "note": "The requested tools are available from the next step; call them now.",
+        }
+
+
+def select_tools(
+    all_tools: List[Dict[str, Any]],
+    *,
+    text: str,
+    recent: Iterable[str] = (),
+    needs_tool: bool = False,
+) -> ToolSelection:
+    """
+    Pick tool groups for a request from its text and the session's recently used tools.
+
+    `recent` holds tool names and "device_api:<action>" entries. When the request clearly needs a
+    tool (`needs_tool`) but no group matched, the full set is offered rather than guessing.
+    """
+    t = (text or "").lower()
+    groups = {g for g, spec in TOOL_GROUPS.items() if any(k in t for k in spec["keywords"])}
+    action_groups = {g for g, spec in DEVICE_ACTION_GROUPS.items() if any(k in t for k in spec["keywords"])}
+    if "memory" in groups:
+        action_groups.add("memory")
+    for entry in recent:
+        name, _, action = str(entry or "").partition(":")
+        group = _tool_group(name)
+        if group:
+            groups.add(group)
+        if name == "device_api" and action:
+            agroup = _action_group(action)
+            if agroup:
+                action_groups.add(agroup)
+    if needs_tool and not groups and not action_groups:
+        return ToolSelection(all_tools, full=True)
+    return ToolSelection(all_tools, groups=groups, action_groups=action_groups)
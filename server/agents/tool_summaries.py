@@ -0,0 +1,215 @@
+import base64
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# summarizer(args, result) -> digest sent to the model instead of the full result.
+ToolSummarizer = Callable[[Dict[str, Any], Any], Any]
+
+# list_dir: listings up to this many entries go to the model as-is; longer ones keep this many
+# entries plus aggregates.
+LIST_DIR_KEEP = 40
+LIST_DIR_TOP = 5
+# vision.run: output tensors with more values than this are reduced to top-k values and stats.
+TENSOR_KEEP = 16
+TENSOR_TOP_K = 5
+# run_python / run_pip / run_curl: longer output becomes a tail plus the lines that look like errors.
+SHELL_OUTPUT_KEEP = 2000
+SHELL_TAIL_LINES = 40
+SHELL_TAIL_CHARS = 1500
+SHELL_ERROR_LINES = 20
+_ERROR_LINE = re.compile(r"Traceback|Error\b|Exception\b|\berror\b|\bfatal\b|\bFAILED\b|^E\s", re.IGNORECASE)
+
+_USB_TRANSFER_TYPES = ("control", "isochronous", "bulk", "interrupt")
+
+
+def _summarize_list_dir(args: Dict[str, Any], result: Any) -> Any:
+    entries = result.get("entries") if isinstance(result, dict) else None
+    if not isinstance(entries, list) or len(entries) <= LIST_DIR_KEEP:
+        return result
+    entries = [e for e in entries if isinstance(e, dict)]
+    files = [e for e in entries if e.get("type") != "dir"]
+    by_ext: Dict[str, Dict[str, int]] = {}
+    for e in files:
+        name = str(e.get("name") or "")
+        ext = name.rsplit(".", 1)[-1].lower() if "." in name.lstrip(".") else ""
+        agg = by_ext.setdefault(ext or "(none)", {"count": 0, "bytes": 0})
+        agg["count"] += 1
+        agg["bytes"] += int(e.get("size") or 0)
+    top_ext = sorted(by_ext.items(), key=lambda kv: (-kv[1]["count"], kv[0]))[:10]
+    largest = sorted(files, key=lambda e: int(e.get("size") or 0), reverse=True)[:LIST_DIR_TOP]
+    newest = sorted(entries, key=lambda e: int(e.get("mtime") or 0), reverse=True)[:LIST_DIR_TOP]
+    out = {k: v for k, v in result.items() if k != "entries"}
+    out["summary"] = {
+        "entries": len(entries),
+        "dirs": len(entries) - len(files),
+        "files": len(files),
+        "total_bytes": sum(int(e.get("size") or 0) for e in files),
+        "by_extension": dict(top_ext),
+        "largest": [{"name": e.get("name"), "size": e.get("size")} for e in largest],
+        "newest": [{"name": e.get("name"), "mtime": e.get("mtime")} for e in newest],
+    }
+    out["entries"] = entries[:LIST_DIR_KEEP]
+    out["omitted_entries"] = len(entries) - LIST_DIR_KEEP
+    return out
+
+
+def parse_usb_descriptors(raw: bytes) -> Dict[str, Any]:
+    """Walk a raw USB descriptor blob into device -> configurations -> interfaces -> endpoints."""
+    tree: Dict[str, Any] = {"device": None, "configurations": []}
+    config: Optional[Dict[str, Any]] = None
+    intf: Optional[Dict[str, Any]] = None
+    i = 0
+    while i + 2 <= len(raw):
+        dlen, dtype = raw[i], raw[i + 1]
+        if dlen < 2 or i + dlen > len(raw):
+            tree["malformed_at"] = i
+            break
+        d = raw[i : i + dlen]
+        if dtype == 0x01 and dlen >= 18:
+            tree["device"] = {
+                "usb": f"{d[3]:x}.{d[2]:02x}",
+                "class": d[4],
+                "subclass": d[5],
+                "protocol": d[6],
+                "vendor_id": f"0x{d[8] | (d[9] << 8):04x}",
+                "product_id": f"0x{d[10] | (d[11] << 8):04x}",
+                "num_configurations": d[17],
+            }
+        elif dtype == 0x02 and dlen >= 9:
+            config = {
+                "value": d[5],
+                "num_interfaces": d[4],
+                "attributes": f"0x{d[7]:02x}",
+                "max_power_ma": d[8] * 2,
+                "interfaces": [],
+            }
+            tree["configurations"].append(config)
+            intf = None
+        elif dtype == 0x0B and dlen >= 8 and config is not None:
+            config.setdefault("interface_associations", []).append(
+                {"first_interface": d[2], "count": d[3], "class": d[4], "subclass": d[5]}
+            )
+        elif dtype == 0x04 and dlen >= 9 and config is not None:
+            intf = {
+                "number": d[2],
+                "alt": d[3],
+                "class": d[5],
+                "subclass": d[6],
+                "protocol": d[7],
+                "endpoints": [],
+            }
+            config["interfaces"].append(intf)
+        elif dtype == 0x05 and dlen >= 7 and intf is not None:
+            intf["endpoints"].append(
+                {
+                    "address": f"0x{d[2]:02x}",
+                    "direction": "in" if d[2] & 0x80 else "out",
+                    "type": _USB_TRANSFER_TYPES[d[3] & 0x03],
+                    "max_packet_size": (d[4] | (d[5] << 8)) & 0x7FF,
+                    "interval": d[6],
+                }
+            )
+        elif intf is not None:
+            # Class-specific (e.g. UVC 0x24/0x25) descriptors: count by (type, subtype).
+            key = f"0x{dtype:02x}/0x{d[2]:02x}" if dlen >= 3 else f"0x{dtype:02x}"
+            counts = intf.setdefault("class_specific", {})
+            counts[key] = counts.get(key, 0) + 1
+        i += dlen
+    return tree
+
+
+def _summarize_usb_raw_descriptors(args: Dict[str, Any], result: Any) -> Any:
+    body = result.get("body") if isinstance(result, dict) else None
+    data_b64 = body.get("data_b64") if isinstance(body, dict) else None
+    if not isinstance(data_b64, str) or not data_b64:
+        return result
+    raw = base64.b64decode(data_b64.encode("ascii"), validate=False)
+    digest = {k: v for k, v in body.items() if k != "data_b64"}
+    digest["data_b64_len"] = len(data_b64)
+    digest["descriptors"] = parse_usb_descriptors(raw)
+    return dict(result, body=digest)
+
+
+def _summarize_tensor(output: Dict[str, Any]) -> Dict[str, Any]:
+    values = output.get("value")
+    if not isinstance(values, list) or len(values) <= TENSOR_KEEP:
+        return output
+    nums = [(i, v) for i, v in enumerate(values) if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    out = {k: v for k, v in output.items() if k != "value"}
+    out["count"] = len(values)
+    if nums:
+        out["min"] = min(v for _, v in nums)
+        out["max"] = max(v for _, v in nums)
+        out["mean"] = round(sum(v for _, v in nums) / len(nums), 6)
+        top = sorted(nums, key=lambda iv: iv[1], reverse=True)[:TENSOR_TOP_K]
+        out["top_k"] = [{"index": i, "value": v} for i, v in top]
+    return out
+
+
+def _summarize_vision_run(args: Dict[str, Any], result: Any) -> Any:
+    body = result.get("body") if isinstance(result, dict) else None
+    outputs = body.get("outputs") if isinstance(body, dict) else None
+    if not isinstance(outputs, list):
+        return result
+    digest = dict(body, outputs=[_summarize_tensor(o) if isinstance(o, dict) else o for o in outputs])
+    return dict(result, body=digest)
+
+
+def _summarize_shell_output(args: Dict[str, Any], result: Any) -> Any:
+    output = result.get("output") if isinstance(result, dict) else None
+    if not isinstance(output, str) or len(output) <= SHELL_OUTPUT_KEEP:
+        return result
+    lines = output.splitlines()
+    tail = "\n".join(lines[-SHELL_TAIL_LINES:])[-SHELL_TAIL_CHARS:]
+    errors: List[str] = []
+    for line in lines[:-SHELL_TAIL_LINES]:
+        line = line.strip()
+        if line and _ERROR_LINE.search(line) and line not in errors:
+            errors.append(line[:300])
+            if len(errors) >= SHELL_ERROR_LINES:
+                break
+    out = {k: v for k, v in result.items() if k != "output"}
+    out["output_len"] = len(output)
+    out["output_lines"] = len(lines)
+    if errors:
+        out["error_lines"] = errors
+    out["output_tail"] = tail
+    return out
+
+
+_summarizers: Dict[str, ToolSummarizer] = {
+    "list_dir": _summarize_list_dir,
+    "run_python": _summarize_shell_output,
+    "run_pip": _summarize_shell_output,
+    "run_curl": _summarize_shell_output,
+    "shell_exec": _summarize_shell_output,
+    "device_api:usb.raw_descriptors": _summarize_usb_raw_descriptors,
+    "device_api:vision.run": _summarize_vision_run,
+}
+_summarizers_lock = threading.Lock()
+
+
+def register_tool_summarizer(key: str, summarizer: ToolSummarizer) -> None:
+    """Summarize results of `key`: a function tool name, or "device_api:<action>"."""
+    with _summarizers_lock:
+        _summarizers[key] = summarizer
+
+
+def summarize_tool_result(name: str, args: Dict[str, Any], result: Any) -> Any:
+    """
+    Compact digest of a tool result for the model; returns `result` itself when there is no
+    summarizer for the tool, the result is small enough, or summarizing fails. The timeline keeps
+    the full result either way.
+    """
+    key = name
+    if name == "device_api" and isinstance(args, dict) and args.get("action"):
+        key = f"device_api:{args.get('action')}"
+    with _summarizers_lock:
+        summarizer = _summarizers.get(key)
+    if summarizer is None or not isinstance(result, dict) or result.get("status") != "ok":
+        return result
+    try:
+        return summarizer(args, result)
+    except Exception:
+        return result
@@ -1,6 +1,6 @@
 """Local HTTP service scaffold for Kugutz."""
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
@@ -17,7 +17,6 @@ import socket
 import shutil
 from typing import Dict
 from pathlib import Path
-import contextlib
 import io
 import runpy
 import shlex
@@ -26,8 +25,12 @@ import urllib.request
 import urllib.error
 
 from agents.runtime import BrainRuntime
+from log_broadcast import LogBroadcaster
+from storage.audit import AuditWriter
+from storage.blobs import blob_response
 from storage.db import Storage
 from tools.router import ToolRouter
+from tools.shell import captured_output
 
 app = FastAPI()
 app.add_middleware(
@@ -38,7 +41,9 @@ app.add_middleware(
     allow_credentials=False,
 )
 
-LOG_QUEUE: asyncio.Queue = asyncio.Queue()
+# Every /logs/stream client gets every event (bounded per-client queues, replay for Last-Event-ID).
+LOG_BROADCASTER = LogBroadcaster(replay_size=1000, queue_size=500)
+LOG_HEARTBEAT_S = 15.0
 base_dir = Path(__file__).parent.parent
 legacy_data_dir = Path(__file__).parent / "data"
 protected_dir = base_dir / "protected"
@@ -54,6 +59,8 @@ if legacy_data_dir.exists():
             pass
 data_dir = protected_dir
 storage = Storage(data_dir / "app.db")
+# Audit rows are group-committed off the caller's thread (program output, brain actions, ...).
+audit_writer = AuditWriter(storage)
 tool_router = ToolRouter(data_dir)
 user_dir = base_dir / "user"
 user_dir.mkdir(parents=True, exist_ok=True)
@@ -88,8 +95,9 @@ def _now_ms() -> int:
 
 
 async def _log(event: str, data: Dict):
-    await LOG_QUEUE.put({"event": event, "data": data, "ts": _now_ms()})
-    storage.add_audit(event, json.dumps(data))
+    LOG_BROADCASTER.publish(event, data)
+    # Never wait for the audit writer on the event loop; a backlogged writer drops (and counts) instead.
+    audit_writer.write(event, data, block=False)
 
 
 @app.middleware("http")
@@ -104,11 +112,9 @@ async def add_ui_cache_headers(request, call_next):
 
 
 def _emit_log(event: str, data: Dict):
-    try:
-        LOG_QUEUE.put_nowait({"event": event, "data": data, "ts": _now_ms()})
-    except asyncio.QueueFull:
-        pass
-    storage.add_audit(event, json.dumps(data))
+    # Safe from any thread (program output readers, brain workers).
+    LOG_BROADCASTER.publish(event, data)
+    audit_writer.write(event, data)
 
 
 def _start_ui_watcher():
@@ -438,7 +444,7 @@ def _shell_exec_impl(cmd: str, raw_args: str, cwd: str) -> Dict:
     output = io.StringIO()
     exit_code = 0
 
-    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+    with captured_output(output):
         try:
             if cmd == "pip":
                 # Heuristic guardrail:
@@ -610,6 +616,7 @@ async def shutdown():
         return {"status": "no_server"}
     server.should_exit = True
     server.force_exit = True
+    await asyncio.to_thread(audit_writer.flush)
     try:
         loop = asyncio.get_running_loop()
         loop.call_soon(lambda: setattr(server, "should_exit", True))
@@ -752,19 +759,68 @@ async def tool_invoke(tool_name: str, payload: Dict):
 
 
 @app.get("/logs/stream")
-async def logs_stream():
+async def logs_stream(request: Request, events: str = "", program_id: str = "", last_event_id: str = ""):
+    # EventSource reconnects send Last-Event-ID; plain clients can pass ?last_event_id=.
+    raw_last = (request.headers.get("last-event-id") or last_event_id or "").strip()
+    try:
+        last_id = int(raw_last) if raw_last else None
+    except ValueError:
+        last_id = None
+    sub = LOG_BROADCASTER.subscribe(
+        last_event_id=last_id,
+        events=[e.strip() for e in events.split(",") if e.strip()],
+        program_id=program_id.strip(),
+    )
+
     async def event_generator():
-        while True:
-            item = await LOG_QUEUE.get()
-            data = json.dumps(item)
-            yield f"data: {data}\n\n"
+        try:
+            while True:
+                batch = await sub.next_batch(LOG_HEARTBEAT_S)
+                if not batch:
+                    yield ": heartbeat\n\n"
+                    continue
+                for item in batch:
+                    prefix = f"id: {item['id']}\n" if item.get("id") else ""
+                    yield f"{prefix}data: {json.dumps(item)}\n\n"
+        finally:
+            LOG_BROADCASTER.unsubscribe(sub)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
 @app.get("/audit/recent")
 async def audit_recent(limit: int = 50):
-    return {"events": storage.get_audit(limit)}
+    await asyncio.to_thread(audit_writer.flush)
+    return {"events": await asyncio.to_thread(storage.get_audit, limit)}
+
+
+@app.get("/audit/stats")
+async def audit_stats():
+    await asyncio.to_thread(audit_writer.flush)
+    stats = await asyncio.to_thread(storage.audit_stats)
+    stats["writer"] = {
+        "written": audit_writer.written,
+        "failed": audit_writer.failed,
+        "dropped": audit_writer.dropped,
+    }
+    return stats
+
+
+@app.post("/audit/vacuum")
+async def audit_vacuum():
+    # Explicit maintenance: also converts a pre-auto_vacuum database (a full VACUUM that blocks writes).
+    pages = await asyncio.to_thread(storage.incremental_vacuum, convert=True)
+    return {"vacuumed_pages": pages}
+
+
+@app.get("/audit/{audit_id}/payload")
+async def audit_payload(audit_id: int):
+    # Full payload of an event whose inline data was truncated ({"truncated": true, ...}).
+    await asyncio.to_thread(audit_writer.flush)
+    data = await asyncio.to_thread(storage.get_audit_payload, audit_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="not_found")
+    return {"id": audit_id, "data": data}
 
 
 @app.get("/brain/status")
@@ -820,19 +876,118 @@ async def brain_inbox_event(payload: Dict):
     body = payload.get("payload") if isinstance(payload.get("payload"), dict) else {}
     if not name.strip():
         raise HTTPException(status_code=400, detail="missing_name")
-    return BRAIN_RUNTIME.enqueue_event(name=name, payload=body)
+    try:
+        delay_ms = int(payload.get("delay_ms") or 0)
+    except (TypeError, ValueError):
+        delay_ms = 0
+    return BRAIN_RUNTIME.enqueue_event(name=name, payload=body, delay_ms=delay_ms)
 
 
 @app.get("/brain/messages")
-async def brain_messages(limit: int = 50, session_id: str = ""):
+async def brain_messages(limit: int = 50, session_id: str = "", since_id: int = 0, wait_ms: int = 0, draft_rev: int = 0):
     sid = (session_id or "").strip()
-    if sid:
-        return {"messages": BRAIN_RUNTIME.list_messages_for_session(session_id=sid, limit=limit)}
+    if sid or since_id:
+        # Long polls block in a worker thread, not on the event loop.
+        return await asyncio.to_thread(
+            BRAIN_RUNTIME.poll_messages,
+            session_id=sid or "default",
+            since_id=since_id,
+            limit=limit,
+            wait_ms=wait_ms,
+            draft_rev=draft_rev,
+        )
     return {"messages": BRAIN_RUNTIME.list_messages(limit=limit)}
 
+
+@app.get("/brain/messages/stream")
+async def brain_messages_stream(session_id: str = "default", since_id: int = 0, limit: int = 200):
+    sid = (session_id or "").strip() or "default"
+
+    async def event_generator():
+        # Wait on the event loop for the runtime's change notification; each read is a short,
+        # non-blocking poll, so an idle stream does not hold a default-executor thread.
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def on_message(changed_sid: str) -> None:
+            if changed_sid == sid and not loop.is_closed():
+                loop.call_soon_threadsafe(changed.set)
+
+        BRAIN_RUNTIME.add_message_watcher(on_message)
+        try:
+            cursor = max(0, int(since_id or 0))
+            draft_rev = 0
+            first = not cursor
+            while True:
+                changed.clear()
+                # An unchanged streaming draft is not resent. The first page without since_id is the
+                # current history; after that only what is new.
+                page = await asyncio.to_thread(
+                    BRAIN_RUNTIME.poll_messages,
+                    session_id=sid,
+                    since_id=cursor,
+                    limit=limit,
+                    draft_rev=draft_rev,
+                )
+                draft_rev = page["draft_rev"]
+                if page["messages"] or first:
+                    first = False
+                    cursor = page["cursor"]
+                    yield f"data: {json.dumps(page)}\n\n"
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            BRAIN_RUNTIME.remove_message_watcher(on_message)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@app.get("/brain/search")
+async def brain_search(
+    q: str = "",
+    scope: str = "chat",
+    session_id: str = "",
+    since: int = 0,
+    until: int = 0,
+    limit: int = 20,
+    offset: int = 0,
+    order: str = "rank",
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="missing_query")
+    if scope != "chat":
+        await asyncio.to_thread(audit_writer.flush)
+    page = await asyncio.to_thread(
+        BRAIN_RUNTIME.search_history,
+        q,
+        scope=scope,
+        session_id=session_id,
+        since_ms=since,
+        until_ms=until,
+        limit=limit,
+        offset=offset,
+        order=order,
+    )
+    if page.get("error"):
+        raise HTTPException(status_code=400, detail=page["error"])
+    return page
+
+
+@app.get("/brain/blobs/{digest}")
+async def brain_blob(digest: str, request: Request):
+    # Large tool results/captures referenced from messages and audit rows as {"$blob": digest, ...}.
+    status, headers, body = await asyncio.to_thread(
+        blob_response, storage.blobs, digest, request.headers.get("range", "")
+    )
+    # Streamed from the file in chunks (iterated in the threadpool), not loaded into memory.
+    return StreamingResponse(body, status_code=status, headers=headers, media_type=headers.pop("Content-Type", None))
+
+
 @app.get("/brain/sessions")
-async def brain_sessions(limit: int = 50):
-    return {"sessions": BRAIN_RUNTIME.list_sessions(limit=limit)}
+async def brain_sessions(limit: int = 50, before_id: int = 0):
+    return BRAIN_RUNTIME.session_page(limit=limit, before_id=before_id)
 
 
 def _require_permission(tool: str, permission_id: str) -> Dict:
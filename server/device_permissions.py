@@ -1,10 +1,9 @@
-import json
 import os
 import time
-import urllib.error
-import urllib.request
 from typing import Any, Dict, Optional
 
+import transport
+
 
 BASE_URL = "http://127.0.0.1:8765"
 _IDENTITY = (os.environ.get("KUGUTZ_IDENTITY") or os.environ.get("KUGUTZ_SESSION_ID") or "").strip() or "default"
@@ -21,28 +20,16 @@ def _request_json(
     body: Optional[Dict[str, Any]] = None,
     identity: str = "",
 ) -> Dict[str, Any]:
-    data = None
-    headers = {"Accept": "application/json"}
-    if body is not None:
-        data = json.dumps(body).encode("utf-8")
-        headers["Content-Type"] = "application/json"
+    headers: Dict[str, str] = {}
     if identity:
         headers["X-Kugutz-Identity"] = identity
-    req = urllib.request.Request(BASE_URL + path, data=data, method=method, headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=12) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-            parsed = json.loads(raw) if raw else {}
-            return {"status": "ok", "http_status": int(resp.status), "body": parsed}
-    except urllib.error.HTTPError as ex:
-        raw = ex.read().decode("utf-8", errors="replace")
-        try:
-            parsed = json.loads(raw) if raw else {}
-        except Exception:
-            parsed = {"raw": raw}
-        return {"status": "http_error", "http_status": int(ex.code), "body": parsed}
+        code, parsed = transport.shared().request_json(method, BASE_URL + path, body, headers=headers, timeout_s=12)
     except Exception as ex:
         return {"status": "error", "error": str(ex)}
+    if code >= 400:
+        return {"status": "http_error", "http_status": code, "body": parsed}
+    return {"status": "ok", "http_status": code, "body": parsed}
 
 
 def request(tool: str, detail: str = "", scope: str = "session", identity: str = "") -> Dict[str, Any]:
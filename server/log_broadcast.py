@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class LogSubscriber:
+    """
+    One /logs/stream client: a bounded queue of matching events plus the loop to wake.
+
+    When the queue is full, consecutive program_output lines of the same program/stream are merged
+    into the queued event; anything else pushes out the oldest event. Dropped events are reported
+    once, as a log_dropped event, ahead of the next delivered one.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, *, maxsize: int, events: Iterable[str] = (), program_id: str = ""):
+        self._loop = loop
+        self._maxsize = max(1, int(maxsize))
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+        self._exact = {e for e in events if e and not e.endswith("*")}
+        self._prefixes = tuple(e[:-1] for e in events if e.endswith("*"))
+        self._program_id = str(program_id or "")
+        self.dropped = 0
+        self.coalesced = 0
+
+    def matches(self, item: Dict[str, Any]) -> bool:
+        event = str(item.get("event") or "")
+        if self._exact or self._prefixes:
+            if event not in self._exact and not any(event.startswith(p) for p in self._prefixes):
+                return False
+        if self._program_id:
+            data = item.get("data") if isinstance(item.get("data"), dict) else {}
+            return event.startswith("program_") and str(data.get("id") or "") == self._program_id
+        return True
+
+    def offer(self, item: Dict[str, Any]) -> None:
+        """Queue an event (any thread)."""
+        with self._lock:
+            if len(self._queue) < self._maxsize:
+                self._queue.append(item)
+            elif not self._coalesce(item):
+                self._queue.popleft()
+                self.dropped += 1
+                self._queue.append(item)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The subscriber's loop is gone; it will be unsubscribed.
+            pass
+
+    def _coalesce(self, item: Dict[str, Any]) -> bool:
+        last = self._queue[-1]
+        if item.get("event") != "program_output" or last.get("event") != "program_output":
+            return False
+        a, b = last.get("data") or {}, item.get("data") or {}
+        if a.get("id") != b.get("id") or a.get("stream") != b.get("stream"):
+            return False
+        # Queued events may be shared with the replay buffer; replace rather than mutate.
+        line = f"{a.get('line', '')}\n{b.get('line', '')}"
+        self._queue[-1] = dict(item, data=dict(b, line=line, lines=int(a.get("lines") or 1) + 1))
+        self.coalesced += 1
+        return True
+
+    def drain(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._queue)
+            self._queue.clear()
+            dropped, self.dropped = self.dropped, 0
+            self._ready.clear()
+        if dropped:
+            items.insert(0, {"event": "log_dropped", "data": {"dropped": dropped}, "ts": _now_ms()})
+        return items
+
+    async def next_batch(self, timeout_s: float) -> List[Dict[str, Any]]:
+        """Queued events, waiting up to timeout_s for the first one (an empty list means heartbeat time)."""
+        items = self.drain()
+        if items:
+            return items
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            return []
+        return self.drain()
+
+
+class LogBroadcaster:
+    """
+    Fans every published log event out to all /logs/stream subscribers.
+
+    Events get increasing ids and the last replay_size of them are kept, so a reconnecting client
+    (Last-Event-ID) catches up on what it missed. publish() is thread-safe and never blocks: each
+    subscriber has its own bounded queue, so a slow or stalled client only loses its own events.
+    """
+
+    def __init__(self, *, replay_size: int = 1000, queue_size: int = 500):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._replay: Deque[Dict[str, Any]] = deque(maxlen=max(1, int(replay_size)))
+        self._subscribers: List[LogSubscriber] = []
+        self.queue_size = max(1, int(queue_size))
+
+    def publish(self, event: str, data: Dict) -> Dict[str, Any]:
+        with self._lock:
+            self._seq += 1
+            item = {"id": self._seq, "event": event, "data": data, "ts": _now_ms()}
+            self._replay.append(item)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.matches(item):
+                sub.offer(item)
+        return item
+
+    def subscribe(
+        self,
+        *,
+        last_event_id: Optional[int] = None,
+        events: Iterable[str] = (),
+        program_id: str = "",
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> LogSubscriber:
+        sub = LogSubscriber(loop or asyncio.get_running_loop(), maxsize=self.queue_size, events=events, program_id=program_id)
+        with self._lock:
+            self._subscribers.append(sub)
+            if last_event_id is not None:
+                # An id from before a restart (ahead of ours) replays the whole buffer.
+                since = last_event_id if last_event_id <= self._seq else 0
+                for item in self._replay:
+                    if item["id"] > since and sub.matches(item):
+                        sub.offer(item)
+        return sub
+
+    def unsubscribe(self, sub: LogSubscriber) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "last_id": self._seq, "buffered": len(self._replay)}
@@ -0,0 +1,117 @@
+import atexit
+import json
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+# audit_log.data is kept small; bigger payloads move to audit_payloads (capped at PAYLOAD_MAX_CHARS).
+INLINE_MAX_CHARS = 16384
+PAYLOAD_MAX_CHARS = 1_000_000
+PREVIEW_CHARS = 2048
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def split_payload(data: str, *, inline_max: int = INLINE_MAX_CHARS, payload_max: int = PAYLOAD_MAX_CHARS) -> Tuple[str, Optional[str]]:
+    """(inline data, out-of-line payload or None) for one audit row."""
+    if len(data) <= inline_max:
+        return data, None
+    preview = {"truncated": True, "chars": len(data), "preview": data[:PREVIEW_CHARS]}
+    if len(data) > payload_max:
+        preview["payload_chars"] = payload_max
+        data = data[:payload_max]
+    return json.dumps(preview), data
+
+
+class AuditWriter:
+    """
+    Background group-commit writer for audit events.
+
+    write() only serializes and queues the event; a writer thread commits everything queued in one
+    transaction every flush_ms, or as soon as max_batch rows are waiting. A caller that gets more
+    than max_pending rows ahead of the writer waits for it to catch up instead of growing the queue;
+    with block=False (callers on an event loop) the event is dropped and counted in `dropped` instead.
+    close() (also run at exit) flushes what is left.
+    """
+
+    def __init__(self, storage, *, flush_ms: int = 250, max_batch: int = 200, max_pending: int = 5000):
+        self._storage = storage
+        self._flush_s = max(1, int(flush_ms)) / 1000.0
+        self._max_batch = max(1, int(max_batch))
+        self._max_pending = max(self._max_batch, int(max_pending))
+        self._pending: List[Tuple[str, str, int, Optional[str]]] = []
+        self._cond = threading.Condition()
+        # Serializes commits between the writer thread and explicit flush() calls.
+        self._commit_lock = threading.Lock()
+        self._closed = False
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, event: str, data: Any, *, block: bool = True) -> None:
+        raw = data if isinstance(data, str) else json.dumps(data)
+        inline, payload = split_payload(raw)
+        row = (event, inline, _now_ms(), payload)
+        with self._cond:
+            if self._closed:
+                self._storage.add_audit_batch([row])
+                return
+            if not block and len(self._pending) >= self._max_pending:
+                self.dropped += 1
+                self._cond.notify_all()
+                return
+            while len(self._pending) >= self._max_pending and not self._closed:
+                self._cond.notify_all()
+                self._cond.wait(timeout=self._flush_s)
+            self._pending.append(row)
+            # Wake the writer to start a batch window, or to commit a full batch right away.
+            if len(self._pending) == 1 or len(self._pending) >= self._max_batch:
+                self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Commit everything queued so far (e.g. before reading the audit log)."""
+        with self._commit_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+                self._cond.notify_all()
+            self._commit(rows)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Give the batch a chance to fill up.
+                deadline = time.monotonic() + self._flush_s
+                while len(self._pending) < self._max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+            self.flush()
+
+    def _commit(self, rows: List[Tuple[str, str, int, Optional[str]]]) -> None:
+        if not rows:
+            return
+        try:
+            self._storage.add_audit_batch(rows)
+            self.written += len(rows)
+        except Exception:
+            # Audit logging must never take the caller down; count and move on.
+            self.failed += len(rows)
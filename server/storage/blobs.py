@@ -0,0 +1,260 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+# Strings (and number arrays, by JSON length) at least this long are moved out of line.
+MIN_BLOB_CHARS = 4096
+PREVIEW_CHARS = 200
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Chunk size when streaming a blob to an HTTP client.
+STREAM_CHUNK = 64 * 1024
+# Key of a reference that replaces an externalized value: {"$blob": "<sha256>", ...}.
+BLOB_KEY = "$blob"
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and isinstance(value.get(BLOB_KEY), str)
+
+
+def guess_content_type(head: bytes) -> str:
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:1] in (b"{", b"["):
+        return "application/json"
+    try:
+        head.decode("utf-8")
+        return "text/plain; charset=utf-8"
+    except UnicodeDecodeError:
+        return "application/octet-stream"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end exclusive) for a single-range `Range: bytes=...` header, or None to send it all.
+
+    A syntactically invalid range (e.g. last < first) is ignored, as RFC 9110 asks. Raises
+    ValueError when a valid range cannot be satisfied (HTTP 416).
+    """
+    m = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header or "")
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if not m.group(1):
+        # Suffix range: the last N bytes.
+        n = int(m.group(2))
+        if n == 0:
+            raise ValueError("unsatisfiable")
+        return max(0, size - n), size
+    start = int(m.group(1))
+    if m.group(2) and int(m.group(2)) < start:
+        return None
+    end = min(size, int(m.group(2)) + 1) if m.group(2) else size
+    if start >= size:
+        raise ValueError("unsatisfiable")
+    return start, end
+
+
+def _iter_file(f: BinaryIO, remaining: int) -> Iterator[bytes]:
+    with f:
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def blob_response(store: "BlobStore", digest: str, range_header: str = "") -> Tuple[int, dict, Iterable[bytes]]:
+    """
+    (status, headers, body chunks) of a GET for a blob, honouring a single-range Range header.
+
+    The body is read from the file as it is sent; headers include Content-Length. The file is
+    opened here, so an eviction after this call cannot cut the response short.
+    """
+    path = store.path(digest)
+    try:
+        f = open(path, "rb") if path is not None else None
+    except OSError:
+        f = None
+    if f is None:
+        body = json.dumps({"error": "not_found"}).encode("utf-8")
+        return 404, {"Content-Type": "application/json", "Content-Length": str(len(body))}, [body]
+    size = os.fstat(f.fileno()).st_size
+    head = f.read(512)
+    headers = {
+        "Content-Type": guess_content_type(head),
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{digest}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    try:
+        span = parse_range(range_header, size)
+    except ValueError:
+        f.close()
+        return 416, {"Content-Range": f"bytes */{size}", "Content-Length": "0"}, []
+    status, (start, end) = (200, (0, size)) if span is None else (206, span)
+    if span is not None:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    f.seek(start)
+    return status, headers, _iter_file(f, end - start)
+
+
+class BlobStore:
+    """
+    Content-addressed files (root/<sha[:2]>/<sha256>) for large tool results and captures.
+
+    Equal content is stored once. put() and get touch a blob's mtime; once the store grows past
+    max_bytes the least recently used blobs are deleted (down to 90% of the cap), so a reference to
+    an old blob may no longer resolve.
+    """
+
+    def __init__(self, root: Path, *, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    def _path(self, digest: str) -> Path:
+        if not _DIGEST.match(digest or ""):
+            raise ValueError("invalid blob digest")
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            if path.exists():
+                os.utime(path)
+                return digest
+            if self._total is None:
+                self._total = self._scan_total()
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{digest}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict(keep=path)
+        return digest
+
+    def path(self, digest: str) -> Optional[Path]:
+        """The blob's file (marking it recently used), or None if unknown or evicted."""
+        try:
+            path = self._path(digest)
+            os.utime(path)
+            return path
+        except (ValueError, OSError):
+            return None
+
+    def read(self, digest: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        path = self.path(digest)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(max(0, end - start))
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            return {"bytes": self._total, "max_bytes": self.max_bytes}
+
+    def _files(self) -> List[Tuple[float, int, Path]]:
+        out = []
+        for path in self.root.glob("??/*"):
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self, keep: Path) -> None:
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._total = total
+
+    def externalize(self, value: Any, *, min_chars: int = MIN_BLOB_CHARS) -> Any:
+        """
+        Copy of a JSON-like value with large strings and number arrays replaced by references.
+
+        A reference keeps the size and a short preview. Strings under a *base64/*b64 key are stored
+        decoded (so a capture is kept as the image itself) and marked "encoding": "base64".
+        """
+        return self._externalize(value, "", max(1, int(min_chars)))
+
+    def _externalize(self, value: Any, key: str, min_chars: int) -> Any:
+        if isinstance(value, str):
+            if len(value) < min_chars:
+                return value
+            ref = {BLOB_KEY: "", "chars": len(value), "preview": value[:PREVIEW_CHARS]}
+            data = None
+            if key.lower().endswith(("base64", "b64")):
+                try:
+                    data = base64.b64decode(value, validate=True)
+                    ref["encoding"] = "base64"
+                    del ref["preview"]
+                except (binascii.Error, ValueError):
+                    data = None
+            if data is None:
+                data = value.encode("utf-8")
+            ref[BLOB_KEY] = self.put(data)
+            ref["bytes"] = len(data)
+            return ref
+        if isinstance(value, dict):
+            return {k: self._externalize(v, str(k), min_chars) for k, v in value.items()}
+        if isinstance(value, list):
+            if value and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+                raw = json.dumps(value)
+                if len(raw) >= min_chars:
+                    data = raw.encode("utf-8")
+                    return {BLOB_KEY: self.put(data), "bytes": len(data), "items": len(value), "encoding": "json"}
+                return value
+            return [self._externalize(v, key, min_chars) for v in value]
+        return value
+
+    def resolve(self, value: Any) -> Any:
+        """Inverse of externalize(); references to evicted blobs are left in place with "missing": true."""
+        if is_blob_ref(value):
+            data = self.read(value[BLOB_KEY])
+            if data is None:
+                return dict(value, missing=True)
+            encoding = value.get("encoding")
+            if encoding == "base64":
+                return base64.b64encode(data).decode("ascii")
+            if encoding == "json":
+                return json.loads(data)
+            return data.decode("utf-8")
+        if isinstance(value, dict):
+            return {k: self.resolve(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(v) for v in value]
+        return value
@@ -1,8 +1,66 @@
+import atexit
+import gzip
+import json
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import time
 
+from .blobs import BlobStore
+
+# Connection tuning. WAL lets readers run alongside the single writer; synchronous=NORMAL is durable
+# across app crashes in WAL mode (only an OS crash can lose the last commits).
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 8192
+MMAP_SIZE_BYTES = 64 * 1024 * 1024
+# Per-connection prepared statement cache (sqlite3's LRU keyed by SQL text).
+CACHED_STATEMENTS = 256
+# Most queued write jobs the writer commits in one transaction.
+WRITE_BATCH_MAX = 64
+# Chat history retention. Inserts do not trim; a compaction job is queued after CHAT_COMPACT_EVERY
+# inserts or, on the next insert, once CHAT_COMPACT_INTERVAL_MS has passed since the last one.
+CHAT_KEEP_PER_SESSION = 400
+CHAT_KEEP_TOTAL = 4000
+CHAT_COMPACT_EVERY = 64
+CHAT_COMPACT_INTERVAL_MS = 5000
+# chat_sessions keeps the start of the last message, and of the session's first user message as its title.
+SESSION_PREVIEW_CHARS = 160
+SESSION_TITLE_CHARS = 80
+# Audit retention: rows older than AUDIT_KEEP_DAYS or beyond the newest AUDIT_KEEP_ROWS are exported
+# (when an archive dir is set) and deleted by a background pass, started after AUDIT_PRUNE_EVERY
+# inserts or on the first insert AUDIT_PRUNE_INTERVAL_MS after the last pass (so also right after
+# start). Deletes go AUDIT_DELETE_BATCH ids per write job; freed pages are then returned to the
+# filesystem VACUUM_PAGES at a time.
+AUDIT_KEEP_DAYS = 14
+AUDIT_KEEP_ROWS = 200000
+AUDIT_PRUNE_EVERY = 2000
+AUDIT_PRUNE_INTERVAL_MS = 10 * 60 * 1000
+AUDIT_DELETE_BATCH = 2000
+VACUUM_PAGES = 256
+# meta keys kept in their own chat_messages columns (read without decoding JSON, and indexable);
+# the rest of a message's meta stays JSON in chat_messages.meta.
+CHAT_META_COLUMNS = ("actor", "item_id", "kind", "tool", "error")
+# History search: most results per page, and words of context in each snippet.
+SEARCH_MAX_LIMIT = 100
+SNIPPET_TOKENS = 16
+# Schema history. PRAGMA user_version is the number of steps a database has applied; startup runs
+# the remaining ones in one transaction and skips all DDL when none are left. Steps are only ever
+# appended. Databases created before versioning start at 0 with most tables already present, so
+# every step must tolerate objects that already exist.
+SCHEMA_STEPS = (
+    "_schema_base",
+    "_schema_chat_sessions",
+    "_schema_search_index",
+    "_schema_chat_meta_columns",
+    "_schema_lookup_indexes",
+)
+SCHEMA_VERSION = len(SCHEMA_STEPS)
+# Rows an online backfill rewrites per write job, so other writes interleave with it.
+BACKFILL_BATCH = 500
+
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -10,19 +68,282 @@ def _now_ms() -> int:
 def _row_factory(cursor, row):
     return {desc[0]: row[idx] for idx, desc in enumerate(cursor.description)}
 
+def split_chat_meta(meta: Any) -> Tuple[Dict[str, Optional[str]], str]:
+    """(typed column values, JSON of the remaining keys or "") for a message meta dict or JSON string."""
+    if isinstance(meta, str):
+        try:
+            meta = json.loads(meta) if meta.strip() else {}
+        except Exception:
+            meta = {}
+    rest = dict(meta) if isinstance(meta, dict) else {}
+    # session_id has had its own column from the start.
+    rest.pop("session_id", None)
+    columns: Dict[str, Optional[str]] = {}
+    for key in CHAT_META_COLUMNS:
+        value = rest.pop(key, None)
+        columns[key] = None if value is None or value == "" else str(value)
+    return columns, json.dumps(rest, ensure_ascii=True) if rest else ""
+
+def chat_meta(row: Dict) -> Dict[str, Any]:
+    """A stored message's meta: its typed columns plus the remaining JSON, decoded only if there is any."""
+    raw = row.get("meta")
+    meta: Dict[str, Any] = {}
+    if raw and raw != "{}":
+        try:
+            decoded = json.loads(raw)
+            meta = decoded if isinstance(decoded, dict) else {}
+        except Exception:
+            meta = {}
+    for key in CHAT_META_COLUMNS:
+        if row.get(key) is not None:
+            meta[key] = row[key]
+    if row.get("session_id"):
+        meta["session_id"] = row["session_id"]
+    return meta
+
+def _legacy_meta_sql(key: str) -> str:
+    """
+    SQL for a typed key still inside the meta JSON of a row the chat_meta_columns backfill has not
+    reached yet (id in its pending (cursor, until_id] range, passed as two parameters); NULL otherwise.
+    """
+    return (
+        f"(CASE WHEN id > ? AND id <= ? AND {key} IS NULL AND json_valid(meta) "
+        f"THEN json_extract(meta, '$.{key}') END)"
+    )
+
+def _search_terms(text: str) -> List[Tuple[str, bool]]:
+    """(word, is_prefix) pairs of a plain-text query; a trailing * asks for prefix matching."""
+    terms = []
+    for word in str(text or "").split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append((word, prefix))
+    return terms
+
+def _fts_query(terms: List[Tuple[str, bool]]) -> str:
+    # Every word is quoted, so user input can never be parsed as FTS5 operators or column filters.
+    return " ".join('"' + word.replace('"', '""') + '"' + ("*" if prefix else "") for word, prefix in terms)
+
+def _excerpt(text: str, terms: List[Tuple[str, bool]], mark: Tuple[str, str], width: int = 120) -> str:
+    """Snippet for the LIKE fallback: text around the first match, with every match marked."""
+    text = text or ""
+    lower = text.lower()
+    hits = [i for i in (lower.find(w.lower()) for w, _ in terms) if i >= 0]
+    start = max(0, min(hits) - width // 3) if hits else 0
+    out = text[start:start + width]
+    for word, _ in terms:
+        idx, parts, low = 0, [], out.lower()
+        w = word.lower()
+        while w:
+            j = low.find(w, idx)
+            if j < 0:
+                break
+            parts.append(out[idx:j] + mark[0] + out[j:j + len(w)] + mark[1])
+            idx = j + len(w)
+        out = "".join(parts) + out[idx:]
+    return ("…" if start > 0 else "") + out + ("…" if start + width < len(text) else "")
+
 
 class Storage:
+    """
+    SQLite-backed app state, shared by the brain thread, program readers and HTTP handlers.
+
+    Reads use a per-thread connection that stays open. Writes are queued to one writer thread that
+    owns the only write connection: it commits whatever jobs are waiting in a single transaction
+    (each job in its own savepoint, so one failing job does not undo the others) and hands every
+    caller its own result or exception.
+    """
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self._encryption_mode = "sqlite"
+        self._local = threading.local()
+        self._write_queue: "queue.Queue[Optional[Tuple[Callable[[sqlite3.Connection], Any], Future, bool]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._writer_ready = threading.Event()
+        self._writer_lock = threading.Lock()
+        self._closed = False
+        self._chat_keep_per_session = CHAT_KEEP_PER_SESSION
+        self._chat_keep_total = CHAT_KEEP_TOTAL
+        # Sessions with inserts since the last chat compaction, and when it ran.
+        self._chat_lock = threading.Lock()
+        self._chat_dirty: set[str] = set()
+        self._chat_inserts = 0
+        self._chat_compacted_at = time.monotonic()
+        self._blobs: Optional[BlobStore] = None
+        self._fts = False
+        self._backfill_thread: Optional[threading.Thread] = None
+        self._audit_lock = threading.Lock()
+        self._audit_keep_days = AUDIT_KEEP_DAYS
+        self._audit_keep_rows = AUDIT_KEEP_ROWS
+        self._audit_archive_dir: Optional[Path] = None
+        self._audit_inserts = 0
+        self._audit_pruned_at = time.monotonic() - AUDIT_PRUNE_INTERVAL_MS / 1000.0
+        self._audit_thread: Optional[threading.Thread] = None
         self._init_db()
+        atexit.register(self.close)
 
-    def _connect(self):
-        conn = sqlite3.connect(self.db_path)
+    def _open(self, *, readonly: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
         conn.row_factory = _row_factory
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
         return conn
 
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's read connection (autocommit, query_only), opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open(readonly=True)
+            self._local.conn = conn
+        return conn
+
+    def release_connection(self) -> None:
+        """Close this thread's read connection; the next read on the thread opens a new one."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(conn) on the writer connection inside a transaction and return its result."""
+        return self._submit(fn).result()
+
+    def _submit(self, fn: Callable[[sqlite3.Connection], Any], *, transaction: bool = True) -> Future:
+        """
+        Queue fn(conn) for the writer without waiting; the future holds its result.
+
+        With transaction=False fn runs alone, outside any transaction (e.g. for VACUUM).
+        """
+        if threading.current_thread() is self._writer:
+            done: Future = Future()
+            done.set_result(fn(self._writer_conn))
+            return done
+        with self._writer_lock:
+            if not self._closed:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._writer_loop, name="storage-writer", daemon=True)
+                    self._writer.start()
+                    self._writer_ready.wait()
+                done = Future()
+                self._write_queue.put((fn, done, transaction))
+                return done
+        done = Future()
+        try:
+            done.set_result(self._write_direct(fn, transaction=transaction))
+        except Exception as exc:
+            done.set_exception(exc)
+        return done
+
+    def _write_direct(self, fn: Callable[[sqlite3.Connection], Any], *, transaction: bool = True) -> Any:
+        conn = self._open()
+        try:
+            if not transaction:
+                return fn(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+        finally:
+            conn.close()
+
+    def _writer_loop(self) -> None:
+        self._writer_conn = self._open()
+        # Takes effect on a new database (before its first table); an existing one keeps its mode
+        # until the next VACUUM (see incremental_vacuum).
+        self._writer_conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._writer_conn.execute("PRAGMA journal_mode=WAL")
+        self._writer_ready.set()
+        stopping = False
+        while not stopping:
+            job = self._write_queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < WRITE_BATCH_MAX and batch[-1][2]:
+                try:
+                    job = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            alone = batch.pop() if not batch[-1][2] else None
+            if batch:
+                self._commit_batch(self._writer_conn, batch)
+            if alone is not None:
+                fn, done, _ = alone
+                try:
+                    done.set_result(fn(self._writer_conn))
+                except Exception as exc:
+                    done.set_exception(exc)
+        self._writer_conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch) -> None:
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, _, _ in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((fn(conn), None))
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO job")
+                    outcomes.append((None, exc))
+                conn.execute("RELEASE job")
+            conn.execute("COMMIT")
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, done, _ in batch:
+                done.set_exception(exc)
+            return
+        for (_, done, _), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                done.set_exception(error)
+            else:
+                done.set_result(result)
+
+    def close(self) -> None:
+        """Finish queued writes and stop the writer; later writes open a connection per call."""
+        with self._writer_lock:
+            if self._closed:
+                return
+            self._closed = True
+            writer = self._writer
+        # Background passes stop at their next batch; what is left resumes on the next start.
+        for thread in (self._backfill_thread, self._audit_thread):
+            if thread is not None:
+                thread.join(timeout=5.0)
+        if writer is not None:
+            self._write_queue.put(None)
+            writer.join(timeout=10.0)
+
+    @property
+    def blobs(self) -> BlobStore:
+        """Content-addressed store next to the database for values too large to keep in rows."""
+        if self._blobs is None:
+            self._blobs = BlobStore(self.db_path.parent / "blobs")
+        return self._blobs
+
     def encryption_status(self) -> Dict[str, object]:
         return {
             "encrypted": False,
@@ -30,11 +351,33 @@ class Storage:
         }
 
     def _init_db(self):
-        with self._connect() as conn:
-            self._create_schema(conn)
+        conn = self._connect()
+        if conn.execute("PRAGMA user_version").fetchone()["user_version"] < SCHEMA_VERSION:
+            self._write(self._migrate)
+        self._fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chat_messages_fts'").fetchone() is not None
+        if conn.execute("SELECT 1 FROM schema_backfills LIMIT 1").fetchone() is not None:
+            self._start_backfills()
+
+    def _migrate(self, conn) -> int:
+        """Apply the schema steps this database has not seen yet; returns the new user_version."""
+        version = conn.execute("PRAGMA user_version").fetchone()["user_version"]
+        # Row-by-row rewrites a step leaves to run in the background (see run_backfills).
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_backfills (
+                name TEXT PRIMARY KEY,
+                cursor INTEGER DEFAULT 0,
+                until_id INTEGER
+            )
+            """
+        )
+        for step in SCHEMA_STEPS[version:]:
+            getattr(self, step)(conn.cursor())
+        version = max(version, SCHEMA_VERSION)
+        conn.execute(f"PRAGMA user_version = {version}")
+        return version
 
-    def _create_schema(self, conn):
-        cur = conn.cursor()
+    def _schema_base(self, cur) -> None:
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS permissions (
@@ -89,6 +432,15 @@ class Storage:
             )
             """
         )
+        # Full payloads of audit events too large to keep inline; audit_log.data holds a preview.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS audit_payloads (
+                audit_id INTEGER PRIMARY KEY,
+                data TEXT
+            )
+            """
+        )
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS settings (
@@ -114,14 +466,204 @@ class Storage:
             """
         )
         cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages(session_id, id)")
+        # Rolling per-session summary of chat turns that aged out of the prompt window. through_id is
+        # the last chat_messages.id folded into the summary.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT,
+                through_id INTEGER DEFAULT 0,
+                folded INTEGER DEFAULT 0,
+                updated_at INTEGER
+            )
+            """
+        )
+        # Durable brain inbox. Queued/leased items survive python worker restarts; items paused on a
+        # permission prompt are kept (status='paused') until Kotlin reports the approval/denial.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS brain_inbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id TEXT,
+                session_id TEXT,
+                kind TEXT,
+                item TEXT,
+                priority INTEGER DEFAULT 0,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at INTEGER,
+                permission_id TEXT,
+                last_error TEXT,
+                created_at INTEGER,
+                updated_at INTEGER
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_brain_inbox_status ON brain_inbox(status, priority, seq)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_brain_inbox_permission ON brain_inbox(permission_id)")
+
+    def _schema_chat_sessions(self, cur) -> None:
+        # One row per chat session, kept in step with chat_messages by every insert and compaction so
+        # listing sessions never aggregates the message table. last_id orders sessions by recency.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                count INTEGER DEFAULT 0,
+                last_id INTEGER,
+                last_created_at INTEGER,
+                last_role TEXT,
+                last_preview TEXT,
+                title TEXT
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_last ON chat_sessions(last_id)")
+        if cur.execute("SELECT 1 FROM chat_sessions LIMIT 1").fetchone() is None:
+            # First start with this table: build it from the existing history (a no-op on a new db).
+            cur.execute(
+                """
+                INSERT INTO chat_sessions (session_id, count, last_id, last_created_at, last_role, last_preview, title)
+                SELECT s.session_id, s.n, m.id, m.created_at, m.role, substr(m.text, 1, ?),
+                    (SELECT substr(f.text, 1, ?) FROM chat_messages f
+                     WHERE f.session_id = s.session_id AND f.role = 'user' ORDER BY f.id LIMIT 1)
+                FROM (SELECT session_id, COUNT(*) AS n, MAX(id) AS last_id FROM chat_messages GROUP BY session_id) s
+                JOIN chat_messages m ON m.id = s.last_id
+                """,
+                (SESSION_PREVIEW_CHARS, SESSION_TITLE_CHARS),
+            )
+
+    def _schema_search_index(self, cur) -> None:
+        self._create_search_index(cur)
+
+    def _schema_chat_meta_columns(self, cur) -> None:
+        """Typed columns for the hot meta keys; rows written before them are filled in by a backfill."""
+        existing = {r["name"] for r in cur.execute("PRAGMA table_info(chat_messages)").fetchall()}
+        missing = [c for c in CHAT_META_COLUMNS if c not in existing]
+        for column in missing:
+            cur.execute(f"ALTER TABLE chat_messages ADD COLUMN {column} TEXT")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_item ON chat_messages(item_id)")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_messages_error ON chat_messages(session_id, id) WHERE error IS NOT NULL"
+        )
+        until_id = cur.execute("SELECT MAX(id) AS id FROM chat_messages").fetchone()["id"]
+        if missing and until_id:
+            cur.execute(
+                "INSERT OR IGNORE INTO schema_backfills (name, cursor, until_id) VALUES ('chat_meta_columns', 0, ?)",
+                (until_id,),
+            )
+
+    def _schema_lookup_indexes(self, cur) -> None:
+        # Pending permission prompts, and audit events by time (search filters, retention).
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_permissions_status ON permissions(status, created_at)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_created ON audit_log(created_at, event)")
+
+    def _backfill_chat_meta_columns(self, conn, cursor: int, until_id: int) -> int:
+        """
+        Move the typed keys out of the meta JSON of rows stored before the columns existed.
+
+        Until a row is rewritten chat_meta() still finds its keys in the JSON; only the SQL filters
+        on the new columns miss it.
+        """
+        rows = conn.execute(
+            "SELECT id, meta FROM chat_messages WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (cursor, until_id, BACKFILL_BATCH),
+        ).fetchall()
+        updates = []
+        for row in rows:
+            columns, rest = split_chat_meta(row["meta"] or "")
+            updates.append((*(columns[c] for c in CHAT_META_COLUMNS), rest, row["id"]))
+        assignments = ", ".join(f"{c} = ?" for c in CHAT_META_COLUMNS)
+        conn.executemany(f"UPDATE chat_messages SET {assignments}, meta = ? WHERE id = ?", updates)
+        return rows[-1]["id"] if len(rows) == BACKFILL_BATCH else until_id
+
+    def _backfill_step(self, conn) -> bool:
+        """Run one batch of the first pending backfill; False once none are left."""
+        job = conn.execute("SELECT name, cursor, until_id FROM schema_backfills ORDER BY name LIMIT 1").fetchone()
+        if job is None:
+            return False
+        until_id = int(job["until_id"] or 0)
+        cursor = getattr(self, f"_backfill_{job['name']}")(conn, int(job["cursor"] or 0), until_id)
+        if cursor >= until_id:
+            conn.execute("DELETE FROM schema_backfills WHERE name = ?", (job["name"],))
+        else:
+            conn.execute("UPDATE schema_backfills SET cursor = ? WHERE name = ?", (cursor, job["name"]))
+        return True
+
+    def run_backfills(self) -> None:
+        """Run pending backfills to completion, one batch per write job."""
+        while not self._closed and self._write(self._backfill_step):
+            pass
+
+    def _start_backfills(self) -> None:
+        # Progress is committed per batch, so a backfill cut short by close() resumes on the next start.
+        self._backfill_thread = threading.Thread(target=self.run_backfills, name="storage-backfill", daemon=True)
+        self._backfill_thread.start()
+
+    def _create_search_index(self, cur) -> bool:
+        """
+        FTS5 indexes over chat_messages.text and audit_log.event/data, kept in sync by triggers.
+
+        They are external-content tables (the text lives only in the source rows). Returns False on
+        sqlite builds without FTS5; search_history then falls back to LIKE scans.
+        """
+        existing = {
+            r["name"]
+            for r in cur.execute("SELECT name FROM sqlite_master WHERE name IN ('chat_messages_fts', 'audit_fts')").fetchall()
+        }
+        try:
+            cur.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5(text, content='chat_messages', content_rowid='id')"
+            )
+            cur.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts USING fts5(event, data, content='audit_log', content_rowid='id')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        for table, fts, cols in (("chat_messages", "chat_messages_fts", ("text",)), ("audit_log", "audit_fts", ("event", "data"))):
+            names = ", ".join(cols)
+            new = ", ".join(f"new.{c}" for c in cols)
+            old = ", ".join(f"old.{c}" for c in cols)
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new});
+                END
+                """
+            )
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old});
+                END
+                """
+            )
+            # Only updates of the indexed columns re-index a row (not e.g. the chat meta backfill).
+            cur.execute(f"DROP TRIGGER IF EXISTS {table}_fts_au")
+            cur.execute(
+                f"""
+                CREATE TRIGGER {table}_fts_au AFTER UPDATE OF {names} ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old});
+                    INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new});
+                END
+                """
+            )
+            if fts not in existing:
+                # Index whatever history predates the index.
+                cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        return True
 
     def create_permission_request(self, tool: str, detail: str, scope: str, expires_at: int | None) -> str:
         request_id = f"p_{_now_ms()}"
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 "INSERT INTO permissions (id, tool, detail, status, scope, expires_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
                 (request_id, tool, detail, "pending", scope, expires_at, _now_ms()),
             )
+
+        self._write(_op)
         return request_id
 
     def get_permission_request(self, request_id: str) -> Optional[Dict]:
@@ -136,97 +678,663 @@ class Storage:
             return [dict(r) for r in cur.fetchall()]
 
     def update_permission_status(self, request_id: str, status: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 "UPDATE permissions SET status = ? WHERE id = ?",
                 (status, request_id),
             )
 
+        self._write(_op)
+
     def mark_permission_used(self, request_id: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 "UPDATE permissions SET status = ? WHERE id = ?",
                 ("used", request_id),
             )
 
+        self._write(_op)
+
     def add_audit(self, event: str, data: str) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                "INSERT INTO audit_log (event, data, created_at) VALUES (?, ?, ?)",
-                (event, data, _now_ms()),
+        self.add_audit_batch([(event, data, _now_ms(), None)])
+
+    def add_audit_batch(self, rows: Iterable[Tuple[str, str, int, Optional[str]]]) -> None:
+        """Insert (event, data, created_at, full_payload) rows in one transaction; see storage.audit."""
+        rows = list(rows)
+        def _op(conn):
+            for event, data, created_at, payload in rows:
+                cur = conn.execute(
+                    "INSERT INTO audit_log (event, data, created_at) VALUES (?, ?, ?)",
+                    (event, data, created_at),
+                )
+                if payload is not None:
+                    conn.execute(
+                        "INSERT INTO audit_payloads (audit_id, data) VALUES (?, ?)",
+                        (cur.lastrowid, payload),
+                    )
+            return len(rows)
+
+        self._note_audit_insert(self._write(_op))
+
+    def set_audit_retention(self, keep_days: int, keep_rows: int, archive_dir: Optional[Path] = None) -> None:
+        """
+        Age (days) and row count the audit log is trimmed to (0 = no limit); applied by the next prune.
+
+        With archive_dir, expired rows are first appended to audit-YYYY-MM-DD.jsonl.gz files there.
+        """
+        with self._audit_lock:
+            self._audit_keep_days = max(0, int(keep_days))
+            self._audit_keep_rows = max(0, int(keep_rows))
+            self._audit_archive_dir = Path(archive_dir) if archive_dir else None
+            self._audit_inserts = AUDIT_PRUNE_EVERY
+
+    def _note_audit_insert(self, count: int) -> None:
+        with self._audit_lock:
+            self._audit_inserts += count
+            due = self._audit_inserts >= AUDIT_PRUNE_EVERY or (
+                time.monotonic() - self._audit_pruned_at >= AUDIT_PRUNE_INTERVAL_MS / 1000.0
             )
+            running = self._audit_thread is not None and self._audit_thread.is_alive()
+            if not due or running or self._closed:
+                return
+            self._audit_inserts = 0
+            self._audit_pruned_at = time.monotonic()
+            self._audit_thread = threading.Thread(target=self._prune_audit_quietly, name="storage-audit-prune", daemon=True)
+            self._audit_thread.start()
+
+    def _prune_audit_quietly(self) -> None:
+        try:
+            self.prune_audit()
+        except Exception:
+            # Retention is housekeeping; a failed pass (e.g. a full disk while exporting) keeps the
+            # rows and is retried by the next one.
+            pass
+
+    def prune_audit(self) -> Dict[str, int]:
+        """
+        Apply audit retention now: export the expired rows (if archiving), delete them, and return
+        the freed pages to the filesystem. Returns the rows exported and deleted and pages released.
+        """
+        with self._audit_lock:
+            keep_days, keep_rows, archive_dir = self._audit_keep_days, self._audit_keep_rows, self._audit_archive_dir
+        conn = self._connect()
+        # Ids grow with time, so the expired rows are everything up to one id.
+        through = 0
+        if keep_days:
+            row = conn.execute(
+                "SELECT MAX(id) AS id FROM audit_log WHERE created_at < ?", (_now_ms() - keep_days * 86400000,)
+            ).fetchone()
+            through = int(row["id"] or 0)
+        if keep_rows:
+            row = conn.execute("SELECT id FROM audit_log ORDER BY id DESC LIMIT 1 OFFSET ?", (keep_rows,)).fetchone()
+            through = max(through, int(row["id"]) if row else 0)
+        exported = deleted = 0
+        if through:
+            if archive_dir is not None:
+                exported = self._export_audit(archive_dir, through)
+            deleted = self._delete_audit(through)
+        return {"exported": exported, "deleted": deleted, "vacuumed_pages": self.incremental_vacuum()}
+
+    def _export_audit(self, archive_dir: Path, through: int) -> int:
+        """Append audit rows up to `through` (not exported before) to per-day gzip JSONL files."""
+        start = int(self.get_setting("audit_exported_through") or 0)
+        if through <= start:
+            return 0
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        cur = self._connect().execute(
+            """
+            SELECT a.id, a.event, a.data, a.created_at, p.data AS payload
+            FROM audit_log a LEFT JOIN audit_payloads p ON p.audit_id = a.id
+            WHERE a.id > ? AND a.id <= ?
+            ORDER BY a.id
+            """,
+            (start, through),
+        )
+        exported, day, out = 0, "", None
+        try:
+            # Rows are streamed, one day file open at a time; appending adds a gzip member, which
+            # gzip readers concatenate.
+            for row in cur:
+                row_day = time.strftime("%Y-%m-%d", time.gmtime((row["created_at"] or 0) / 1000))
+                if row_day != day:
+                    if out is not None:
+                        out.close()
+                    day, out = row_day, gzip.open(archive_dir / f"audit-{row_day}.jsonl.gz", "at", encoding="utf-8")
+                if row["payload"] is None:
+                    del row["payload"]
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                exported += 1
+        finally:
+            if out is not None:
+                out.close()
+        self.set_setting("audit_exported_through", str(through))
+        return exported
+
+    def _delete_audit(self, through: int) -> int:
+        first = self._connect().execute("SELECT MIN(id) AS id FROM audit_log").fetchone()["id"]
+        lo = int(first) if first is not None else through + 1
+        deleted = 0
+        while lo <= through and not self._closed:
+            hi = min(through, lo + AUDIT_DELETE_BATCH - 1)
+
+            def _op(conn, lo=lo, hi=hi):
+                conn.execute("DELETE FROM audit_payloads WHERE audit_id BETWEEN ? AND ?", (lo, hi))
+                return conn.execute("DELETE FROM audit_log WHERE id BETWEEN ? AND ?", (lo, hi)).rowcount
+
+            deleted += self._write(_op)
+            lo = hi + 1
+        return deleted
+
+    def incremental_vacuum(self, *, convert: bool = False) -> int:
+        """
+        Release free pages to the filesystem, VACUUM_PAGES per write job; returns the pages released.
+
+        A database created before auto_vacuum=INCREMENTAL was set needs one full VACUUM, which
+        rewrites the whole file and holds the writer (every chat, inbox and audit write) until it is
+        done. It only runs when asked for with convert=True (POST /audit/vacuum); otherwise such a
+        database is left alone and its free pages are reused by later inserts.
+        """
+        mode = self._connect().execute("PRAGMA auto_vacuum").fetchone()["auto_vacuum"]
+        if mode != 2:
+            if not convert or not self._connect().execute("PRAGMA freelist_count").fetchone()["freelist_count"]:
+                return 0
+            before = self._connect().execute("PRAGMA page_count").fetchone()["page_count"]
+
+            def _convert(conn):
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+
+            self._submit(_convert, transaction=False).result()
+            return max(0, before - self._connect().execute("PRAGMA page_count").fetchone()["page_count"])
+
+        def _op(conn):
+            free = conn.execute("PRAGMA freelist_count").fetchone()["freelist_count"]
+            if not free:
+                return 0
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+            return free - conn.execute("PRAGMA freelist_count").fetchone()["freelist_count"]
+
+        released = 0
+        while not self._closed:
+            pages = self._write(_op)
+            if pages <= 0:
+                break
+            released += pages
+        return released
+
+    def audit_stats(self) -> Dict[str, Any]:
+        """Audit rows and stored bytes (inline data plus full payloads) per event type, and database size."""
+        conn = self._connect()
+        events = [
+            dict(r)
+            for r in conn.execute(
+                """
+                SELECT a.event, COUNT(*) AS count,
+                    SUM(LENGTH(CAST(a.data AS BLOB))) + COALESCE(SUM(LENGTH(CAST(p.data AS BLOB))), 0) AS bytes,
+                    MIN(a.created_at) AS oldest, MAX(a.created_at) AS newest
+                FROM audit_log a LEFT JOIN audit_payloads p ON p.audit_id = a.id
+                GROUP BY a.event
+                ORDER BY bytes DESC
+                """
+            ).fetchall()
+        ]
+        page_size = conn.execute("PRAGMA page_size").fetchone()["page_size"]
+        page_count = conn.execute("PRAGMA page_count").fetchone()["page_count"]
+        free = conn.execute("PRAGMA freelist_count").fetchone()["freelist_count"]
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()["auto_vacuum"]
+        with self._audit_lock:
+            keep_days, keep_rows, archive_dir = self._audit_keep_days, self._audit_keep_rows, self._audit_archive_dir
+        archived = list(archive_dir.glob("audit-*.jsonl.gz")) if archive_dir is not None and archive_dir.exists() else []
+        return {
+            "events": events,
+            "rows": sum(e["count"] for e in events),
+            "bytes": sum(e["bytes"] or 0 for e in events),
+            "db_bytes": page_size * page_count,
+            "free_bytes": page_size * free,
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(mode, str(mode)),
+            "keep_days": keep_days,
+            "keep_rows": keep_rows,
+            "archive": {
+                "dir": str(archive_dir) if archive_dir is not None else None,
+                "files": len(archived),
+                "bytes": sum(f.stat().st_size for f in archived),
+            },
+        }
 
     def get_audit(self, limit: int = 50) -> List[Dict]:
         with self._connect() as conn:
             cur = conn.execute(
-                "SELECT event, data, created_at FROM audit_log ORDER BY id DESC LIMIT ?",
+                "SELECT id, event, data, created_at FROM audit_log ORDER BY id DESC LIMIT ?",
                 (limit,),
             )
             return [dict(r) for r in cur.fetchall()]
 
-    def add_chat_message(self, session_id: str, role: str, text: str, meta_json: str) -> None:
-        sid = (session_id or "default").strip() or "default"
+    def search_history(
+        self,
+        query: str,
+        *,
+        scope: str = "chat",
+        session_id: str = "",
+        since_ms: int = 0,
+        until_ms: int = 0,
+        limit: int = 20,
+        offset: int = 0,
+        order: str = "rank",
+        mark: Tuple[str, str] = ("<mark>", "</mark>"),
+    ) -> Dict:
+        """
+        Full-text search over chat history ("chat"), the audit log ("audit") or both ("all").
+
+        Every word of `query` must match (word* matches a prefix). session_id only narrows chat
+        results; since_ms/until_ms bound created_at (until is exclusive). Results are ordered by
+        relevance, or newest first with order="recent", and carry a snippet with the matches wrapped in
+        `mark`. next_offset is None on the last page.
+        """
+        if scope not in ("chat", "audit", "all"):
+            raise ValueError(f"unknown search scope: {scope}")
+        limit = max(1, min(int(limit or 20), SEARCH_MAX_LIMIT))
+        offset = max(0, int(offset or 0))
+        terms = _search_terms(query)
+        if not terms:
+            return {"results": [], "next_offset": None}
+        filters = {"session_id": session_id, "since_ms": int(since_ms or 0), "until_ms": int(until_ms or 0)}
+        recent = order == "recent"
+        scopes = ("chat", "audit") if scope == "all" else (scope,)
+        # One scope pages in SQL; for both, each side returns enough rows to merge and slice.
+        window = (limit + 1, offset) if len(scopes) == 1 else (offset + limit + 1, 0)
+        results: List[Dict] = []
         with self._connect() as conn:
-            conn.execute(
-                "INSERT INTO chat_messages (session_id, role, text, meta, created_at) VALUES (?, ?, ?, ?, ?)",
-                (sid, role, text, meta_json, _now_ms()),
-            )
-            # Keep DB bounded. This is per-session and also global, to prevent unbounded growth.
-            conn.execute(
+            for source in scopes:
+                results.extend(self._search(conn, source, terms, filters, recent, mark, *window))
+        if len(scopes) > 1:
+            results.sort(key=lambda r: (-r["created_at"], -r["id"]) if recent else (r["rank"], -r["created_at"]))
+            results = results[offset:]
+        more = len(results) > limit
+        return {"results": results[:limit], "next_offset": offset + limit if more else None}
+
+    def _search(self, conn, source, terms, filters, recent, mark, limit, offset) -> List[Dict]:
+        table, fts = ("chat_messages", "chat_messages_fts") if source == "chat" else ("audit_log", "audit_fts")
+        cols = "t.id, t.session_id, t.role, t.created_at" if source == "chat" else "t.id, t.event, t.created_at"
+        where, params = [], []
+        if source == "chat" and filters["session_id"]:
+            where.append("t.session_id = ?")
+            params.append(filters["session_id"])
+        if filters["since_ms"]:
+            where.append("t.created_at >= ?")
+            params.append(filters["since_ms"])
+        if filters["until_ms"]:
+            where.append("t.created_at < ?")
+            params.append(filters["until_ms"])
+        if self._fts:
+            column = 0 if source == "chat" else -1
+            sql = f"""
+                SELECT {cols}, snippet({fts}, {column}, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet, bm25({fts}) AS rank
+                FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+                WHERE {fts} MATCH ? {"".join(" AND " + w for w in where)}
+                ORDER BY {"t.id DESC" if recent else "rank"}
+                LIMIT ? OFFSET ?
+            """
+            rows = conn.execute(sql, (*mark, _fts_query(terms), *params, limit, offset)).fetchall()
+        else:
+            text_expr = "t.text" if source == "chat" else "(t.event || ' ' || t.data)"
+            for word, _ in terms:
+                where.append(f"{text_expr} LIKE ? ESCAPE '\\'")
+                params.append("%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+            sql = f"""
+                SELECT {cols}, {text_expr} AS body, 0.0 AS rank
+                FROM {table} t
+                WHERE {" AND ".join(where)}
+                ORDER BY t.id DESC
+                LIMIT ? OFFSET ?
+            """
+            rows = conn.execute(sql, (*params, limit, offset)).fetchall()
+            for r in rows:
+                r["snippet"] = _excerpt(r.pop("body"), terms, mark)
+        for r in rows:
+            r["source"] = source
+        return rows
+
+    def get_audit_payload(self, audit_id: int) -> Optional[str]:
+        with self._connect() as conn:
+            cur = conn.execute("SELECT data FROM audit_payloads WHERE audit_id = ?", (int(audit_id),))
+            row = cur.fetchone()
+            return row["data"] if row else None
+
+    def add_chat_message(self, session_id: str, role: str, text: str, meta: Any) -> int:
+        """Store a message; meta (a dict or JSON string) is split into typed columns and the JSON rest."""
+        sid = (session_id or "default").strip() or "default"
+        text = text or ""
+        columns, rest = split_chat_meta(meta)
+        def _op(conn):
+            now = _now_ms()
+            cur = conn.execute(
                 """
-                DELETE FROM chat_messages
-                WHERE id NOT IN (
-                    SELECT id FROM chat_messages
-                    WHERE session_id = ?
-                    ORDER BY id DESC
-                    LIMIT 400
-                ) AND session_id = ?
+                INSERT INTO chat_messages (session_id, role, text, meta, created_at, actor, item_id, kind, tool, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (sid, sid),
+                (sid, role, text, rest, now, *(columns[c] for c in CHAT_META_COLUMNS)),
             )
+            message_id = int(cur.lastrowid or 0)
+            title = text[:SESSION_TITLE_CHARS] if role == "user" else None
             conn.execute(
                 """
-                DELETE FROM chat_messages
-                WHERE id NOT IN (
-                    SELECT id FROM chat_messages
-                    ORDER BY id DESC
-                    LIMIT 4000
-                )
-                """
+                INSERT INTO chat_sessions (session_id, count, last_id, last_created_at, last_role, last_preview, title)
+                VALUES (?, 1, ?, ?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    count = count + 1,
+                    last_id = excluded.last_id,
+                    last_created_at = excluded.last_created_at,
+                    last_role = excluded.last_role,
+                    last_preview = excluded.last_preview,
+                    title = COALESCE(title, excluded.title)
+                """,
+                (sid, message_id, now, role, text[:SESSION_PREVIEW_CHARS], title),
+            )
+            return message_id
+
+        message_id = self._write(_op)
+        self._note_chat_insert(sid)
+        return message_id
+
+    def set_chat_retention(self, per_session: int, total: int) -> None:
+        """Messages kept per session and overall; applied by the next compaction."""
+        with self._chat_lock:
+            self._chat_keep_per_session = max(1, int(per_session))
+            self._chat_keep_total = max(self._chat_keep_per_session, int(total))
+            self._chat_inserts = CHAT_COMPACT_EVERY
+
+    def _note_chat_insert(self, sid: str) -> None:
+        with self._chat_lock:
+            self._chat_dirty.add(sid)
+            self._chat_inserts += 1
+            due = self._chat_inserts >= CHAT_COMPACT_EVERY or (
+                time.monotonic() - self._chat_compacted_at >= CHAT_COMPACT_INTERVAL_MS / 1000.0
             )
+            if not due:
+                return
+            sessions, self._chat_dirty = self._chat_dirty, set()
+            self._chat_inserts = 0
+            self._chat_compacted_at = time.monotonic()
+            keep = (self._chat_keep_per_session, self._chat_keep_total)
+        # Runs on the writer in the background (grouped with whatever writes are queued).
+        self._submit(lambda conn: self._compact_chat(conn, sessions, *keep))
 
-    def list_chat_messages(self, session_id: str, limit: int = 200) -> List[Dict]:
+    def compact_chat(self, sessions: Optional[Iterable[str]] = None) -> int:
+        """Apply chat retention now (to `sessions`, or every session); returns the rows deleted."""
+        with self._chat_lock:
+            keep = (self._chat_keep_per_session, self._chat_keep_total)
+            if sessions is None:
+                self._chat_dirty = set()
+                self._chat_inserts = 0
+        if sessions is None:
+            rows = self._connect().execute("SELECT session_id FROM chat_sessions").fetchall()
+            sessions = [r["session_id"] for r in rows]
+        sessions = list(sessions)
+        return self._write(lambda conn: self._compact_chat(conn, sessions, *keep))
+
+    def _compact_chat(self, conn, sessions: Iterable[str], keep_per_session: int, keep_total: int) -> int:
+        # The id of the Nth newest row is a watermark: everything older in that scope goes, via an
+        # index range delete, instead of a NOT IN over the rows being kept.
+        deleted = 0
+        for sid in sessions:
+            row = conn.execute(
+                "SELECT id FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (sid, keep_per_session - 1),
+            ).fetchone()
+            if row:
+                cur = conn.execute("DELETE FROM chat_messages WHERE session_id = ? AND id < ?", (sid, row["id"]))
+                if cur.rowcount > 0:
+                    conn.execute("UPDATE chat_sessions SET count = count - ? WHERE session_id = ?", (cur.rowcount, sid))
+                    deleted += cur.rowcount
+        row = conn.execute("SELECT id FROM chat_messages ORDER BY id DESC LIMIT 1 OFFSET ?", (keep_total - 1,)).fetchone()
+        if row:
+            # Only the rows about to go are grouped, so this stays proportional to what is deleted.
+            gone = conn.execute(
+                "SELECT session_id, COUNT(*) AS n FROM chat_messages WHERE id < ? GROUP BY session_id",
+                (row["id"],),
+            ).fetchall()
+            cur = conn.execute("DELETE FROM chat_messages WHERE id < ?", (row["id"],))
+            deleted += cur.rowcount
+            conn.executemany(
+                "UPDATE chat_sessions SET count = count - ? WHERE session_id = ?",
+                [(g["n"], g["session_id"]) for g in gone],
+            )
+            conn.execute("DELETE FROM chat_sessions WHERE count <= 0")
+        return deleted
+
+    def list_chat_messages(
+        self,
+        session_id: str,
+        limit: int = 200,
+        since_id: int = 0,
+        *,
+        roles: Optional[Iterable[str]] = None,
+        item_id: str = "",
+        errors_only: bool = False,
+        oldest_first: bool = False,
+    ) -> List[Dict]:
+        """
+        The session's last `limit` messages, oldest first; with since_id (or oldest_first, which also
+        pages from the start when since_id is 0), the first `limit` after it.
+
+        roles, item_id and errors_only filter in SQL. Rows carry the typed meta columns next to the
+        remaining meta JSON; use chat_meta(row) for the merged dict. While the chat_meta_columns
+        backfill is pending, rows it has not reached yet are matched through their meta JSON.
+        """
         sid = (session_id or "default").strip() or "default"
         limit = max(1, min(int(limit or 200), 1000))
+        since_id = max(0, int(since_id or 0))
+        forward = bool(since_id or oldest_first)
+        where, params = ["session_id = ?"], [sid]
+        if since_id:
+            where.append("id > ?")
+            params.append(since_id)
+        if roles is not None:
+            roles = list(roles)
+            where.append(f"role IN ({','.join('?' for _ in roles) or 'NULL'})")
+            params.extend(roles)
         with self._connect() as conn:
+            pending = None
+            if item_id or errors_only:
+                pending = conn.execute(
+                    "SELECT cursor, until_id FROM schema_backfills WHERE name = 'chat_meta_columns'"
+                ).fetchone()
+            if item_id:
+                if pending:
+                    where.append(f"(item_id = ? OR CAST({_legacy_meta_sql('item_id')} AS TEXT) = ?)")
+                    params.extend([item_id, pending["cursor"], pending["until_id"], item_id])
+                else:
+                    where.append("item_id = ?")
+                    params.append(item_id)
+            if errors_only:
+                if pending:
+                    where.append(f"(error IS NOT NULL OR NULLIF({_legacy_meta_sql('error')}, '') IS NOT NULL)")
+                    params.extend([pending["cursor"], pending["until_id"]])
+                else:
+                    where.append("error IS NOT NULL")
             cur = conn.execute(
-                """
-                SELECT role, text, meta, created_at
+                f"""
+                SELECT id, session_id, role, text, meta, created_at, actor, item_id, kind, tool, error
                 FROM chat_messages
-                WHERE session_id = ?
-                ORDER BY id DESC
+                WHERE {" AND ".join(where)}
+                ORDER BY id {"ASC" if forward else "DESC"}
                 LIMIT ?
                 """,
-                (sid, limit),
+                (*params, limit),
             )
             rows = [dict(r) for r in cur.fetchall()]
-        return list(reversed(rows))
+        return rows if forward else list(reversed(rows))
+
+    def get_chat_summary(self, session_id: str) -> Optional[Dict]:
+        sid = (session_id or "default").strip() or "default"
+        with self._connect() as conn:
+            cur = conn.execute(
+                "SELECT session_id, summary, through_id, folded, updated_at FROM chat_summaries WHERE session_id = ?",
+                (sid,),
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+    def set_chat_summary(self, session_id: str, summary: str, through_id: int, folded: int) -> None:
+        sid = (session_id or "default").strip() or "default"
+        def _op(conn):
+            conn.execute(
+                """
+                INSERT INTO chat_summaries (session_id, summary, through_id, folded, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    through_id = excluded.through_id,
+                    folded = excluded.folded,
+                    updated_at = excluded.updated_at
+                """,
+                (sid, summary, int(through_id), int(folded), _now_ms()),
+            )
+
+        self._write(_op)
 
-    def list_chat_sessions(self, limit: int = 50) -> List[Dict]:
+    def list_chat_sessions(self, limit: int = 50, before_id: int = 0) -> List[Dict]:
+        """
+        Sessions, most recently active first.
+
+        Each row has session_id, count, last_id, last_created_at, last_role, last_preview and title
+        (the start of the first user message). Pass the last row's last_id as before_id for the next page.
+        """
         limit = max(1, min(int(limit or 50), 200))
+        before_id = max(0, int(before_id or 0))
         with self._connect() as conn:
             cur = conn.execute(
                 """
-                SELECT session_id, COUNT(*) AS count, MAX(created_at) AS last_created_at
-                FROM chat_messages
-                GROUP BY session_id
-                ORDER BY last_created_at DESC
+                SELECT session_id, count, last_id, last_created_at, last_role, last_preview, title
+                FROM chat_sessions
+                WHERE last_id < ?
+                ORDER BY last_id DESC
                 LIMIT ?
                 """,
-                (limit,),
+                (before_id or 2**63 - 1, limit),
+            )
+            return [dict(r) for r in cur.fetchall()]
+
+    def add_inbox_item(
+        self,
+        item_id: str,
+        session_id: str,
+        kind: str,
+        item_json: str,
+        *,
+        priority: int = 0,
+        status: str = "queued",
+        permission_id: str = "",
+    ) -> int:
+        now = _now_ms()
+        def _op(conn):
+            cur = conn.execute(
+                """
+                INSERT INTO brain_inbox
+                    (item_id, session_id, kind, item, priority, status, attempts, permission_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+                """,
+                (item_id, session_id, kind, item_json, int(priority), status, permission_id, now, now),
+            )
+            return int(cur.lastrowid)
+
+        return self._write(_op)
+
+    def claim_inbox_item(self, seq: int, owner: str, lease_ms: int) -> Optional[Dict]:
+        """
+        Atomically lease a queued item (or one whose lease expired) to `owner`.
+
+        Returns the claimed row, or None if another consumer holds it or it is no longer queued.
+        """
+        now = _now_ms()
+        def _op(conn):
+            cur = conn.execute(
+                """
+                UPDATE brain_inbox
+                SET status = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, updated_at = ?
+                WHERE seq = ? AND (status = 'queued' OR (status = 'leased' AND lease_expires_at < ?))
+                """,
+                (owner, now + int(lease_ms), now, int(seq), now),
+            )
+            if cur.rowcount != 1:
+                return None
+            cur = conn.execute("SELECT * FROM brain_inbox WHERE seq = ?", (int(seq),))
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+        return self._write(_op)
+
+    def renew_inbox_lease(self, seq: int, owner: str, lease_ms: int) -> bool:
+        now = _now_ms()
+        def _op(conn):
+            cur = conn.execute(
+                "UPDATE brain_inbox SET lease_expires_at = ?, updated_at = ? WHERE seq = ? AND status = 'leased' AND lease_owner = ?",
+                (now + int(lease_ms), now, int(seq), owner),
+            )
+            return cur.rowcount == 1
+
+        return self._write(_op)
+
+    def complete_inbox_item(self, seq: int) -> None:
+        def _op(conn):
+            conn.execute("DELETE FROM brain_inbox WHERE seq = ? AND status = 'leased'", (int(seq),))
+
+        self._write(_op)
+
+    def fail_inbox_item(self, seq: int, error: str, *, retry: bool = False) -> None:
+        """Re-queue a leased item for another attempt, or move it to the dead-letter state."""
+        def _op(conn):
+            conn.execute(
+                """
+                UPDATE brain_inbox
+                SET status = ?, lease_owner = NULL, lease_expires_at = NULL, last_error = ?, updated_at = ?
+                WHERE seq = ?
+                """,
+                ("queued" if retry else "dead", (error or "")[:2000], _now_ms(), int(seq)),
+            )
+            # Keep the dead-letter list bounded.
+            conn.execute(
+                """
+                DELETE FROM brain_inbox
+                WHERE status = 'dead' AND seq NOT IN (
+                    SELECT seq FROM brain_inbox WHERE status = 'dead' ORDER BY seq DESC LIMIT 200
+                )
+                """
+            )
+
+        self._write(_op)
+
+    def take_paused_inbox_item(self, permission_id: str) -> Optional[Dict]:
+        """Remove and return the item paused on `permission_id`, if any."""
+        def _op(conn):
+            cur = conn.execute(
+                "SELECT * FROM brain_inbox WHERE status = 'paused' AND permission_id = ? ORDER BY seq DESC LIMIT 1",
+                (permission_id,),
+            )
+            row = cur.fetchone()
+            if not row:
+                return None
+            conn.execute("DELETE FROM brain_inbox WHERE seq = ?", (row["seq"],))
+            return dict(row)
+
+        return self._write(_op)
+
+    def list_inbox_items(self, statuses: List[str], limit: int = 1000) -> List[Dict]:
+        if not statuses:
+            return []
+        marks = ",".join("?" for _ in statuses)
+        with self._connect() as conn:
+            cur = conn.execute(
+                f"SELECT * FROM brain_inbox WHERE status IN ({marks}) ORDER BY seq LIMIT ?",
+                (*statuses, int(limit)),
             )
             return [dict(r) for r in cur.fetchall()]
 
+    def inbox_counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            cur = conn.execute("SELECT status, COUNT(*) AS count FROM brain_inbox GROUP BY status")
+            return {str(r["status"]): int(r["count"]) for r in cur.fetchall()}
+
     def get_setting(self, key: str) -> Optional[str]:
         with self._connect() as conn:
             cur = conn.execute("SELECT value FROM settings WHERE key = ?", (key,))
@@ -234,7 +1342,7 @@ class Storage:
             return row["value"] if row else None
 
     def set_setting(self, key: str, value: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 """
                 INSERT INTO settings (key, value, updated_at)
@@ -246,8 +1354,10 @@ class Storage:
                 (key, value, _now_ms()),
             )
 
+        self._write(_op)
+
     def set_credential(self, name: str, value: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 """
                 INSERT INTO credentials (name, value, updated_at)
@@ -259,6 +1369,8 @@ class Storage:
                 (name, value, _now_ms()),
             )
 
+        self._write(_op)
+
     def get_credential(self, name: str) -> Optional[Dict]:
         with self._connect() as conn:
             cur = conn.execute("SELECT * FROM credentials WHERE name = ?", (name,))
@@ -266,16 +1378,18 @@ class Storage:
             return dict(row) if row else None
 
     def delete_credential(self, name: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute("DELETE FROM credentials WHERE name = ?", (name,))
 
+        self._write(_op)
+
     def list_credentials(self) -> List[Dict]:
         with self._connect() as conn:
             cur = conn.execute("SELECT name, updated_at FROM credentials ORDER BY name")
             return [dict(r) for r in cur.fetchall()]
 
     def upsert_service(self, name: str, code_hash: str, token: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 """
                 INSERT INTO services (name, code_hash, token, created_at, updated_at)
@@ -288,6 +1402,8 @@ class Storage:
                 (name, code_hash, token, _now_ms(), _now_ms()),
             )
 
+        self._write(_op)
+
     def get_service(self, name: str) -> Optional[Dict]:
         with self._connect() as conn:
             cur = conn.execute("SELECT * FROM services WHERE name = ?", (name,))
@@ -300,7 +1416,7 @@ class Storage:
             return [dict(r) for r in cur.fetchall()]
 
     def set_service_credential(self, service_name: str, name: str, value: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute(
                 """
                 INSERT INTO service_credentials (service_name, name, value, updated_at)
@@ -312,6 +1428,8 @@ class Storage:
                 (service_name, name, value, _now_ms()),
             )
 
+        self._write(_op)
+
     def get_service_credential(self, service_name: str, name: str) -> Optional[Dict]:
         with self._connect() as conn:
             cur = conn.execute(
@@ -330,5 +1448,7 @@ class Storage:
             return [dict(r) for r in cur.fetchall()]
 
     def delete_service_credentials(self, service_name: str) -> None:
-        with self._connect() as conn:
+        def _op(conn):
             conn.execute("DELETE FROM service_credentials WHERE service_name = ?", (service_name,))
+
+        self._write(_op)
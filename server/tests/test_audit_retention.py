@@ -0,0 +1,127 @@
+import gzip
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+
+def _import_db():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage import db
+
+    return db
+
+
+DAY_MS = 86400000
+
+
+class AuditRetentionTest(unittest.TestCase):
+    def _storage(self, db, path, keep_days, keep_rows, archive_dir=None):
+        storage = db.Storage(path)
+        storage.set_audit_retention(keep_days, keep_rows, archive_dir)
+        # Only explicit prune_audit() calls in these tests.
+        storage._audit_inserts = 0
+        storage._audit_pruned_at = float("inf")
+        return storage
+
+    def test_expired_rows_are_exported_by_day_then_deleted(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            archive = Path(td) / "user" / "audit_archive"
+            storage = self._storage(db, Path(td) / "app.db", 14, 4, archive)
+            now = int(time.time() * 1000)
+            storage.add_audit_batch(
+                [("program_output", f'{{"line": {i}}}', now - 30 * DAY_MS + i, None) for i in range(2)]
+                + [("brain_action", '{"truncated": true}', now - 30 * DAY_MS + 5, '{"full": "payload"}')]
+                + [("program_output", f'{{"line": {i}}}', now - 20 * DAY_MS, None) for i in range(2)]
+                + [("brain_action", f'{{"recent": {i}}}', now, None) for i in range(5)]
+            )
+
+            self.assertEqual(storage.prune_audit()["deleted"], 6)
+            self.assertEqual([e["data"] for e in reversed(storage.get_audit(10))], [f'{{"recent": {i}}}' for i in range(1, 5)])
+            self.assertIsNone(storage.get_audit_payload(3))
+            self.assertEqual(storage.search_history("truncated", scope="audit")["results"], [])
+
+            files = sorted(archive.glob("audit-*.jsonl.gz"))
+            self.assertEqual(len(files), 3)
+            with gzip.open(files[0], "rt", encoding="utf-8") as f:
+                oldest = [json.loads(line) for line in f]
+            self.assertEqual([r["id"] for r in oldest], [1, 2, 3])
+            self.assertEqual(oldest[2]["payload"], '{"full": "payload"}')
+            self.assertNotIn("payload", oldest[0])
+
+            # Nothing is exported twice, and a later pass appends to the day file.
+            self.assertEqual(storage.prune_audit()["exported"], 0)
+            storage.add_audit("brain_action", '{"recent": 5}')
+            self.assertEqual(storage.prune_audit()["exported"], 1)
+            with gzip.open(files[-1], "rt", encoding="utf-8") as f:
+                self.assertEqual([json.loads(line)["id"] for line in f], [6, 7])
+            storage.close()
+
+    def test_freed_pages_are_released_and_stats_report_sizes(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = self._storage(db, Path(td) / "app.db", 0, 50)
+            storage.add_audit_batch([("program_output", "x" * 4000, i, None) for i in range(400)])
+            storage.add_audit_batch([("brain_action", "y" * 100, 1000, "z" * 900)])
+
+            stats = storage.audit_stats()
+            self.assertEqual(stats["auto_vacuum"], "incremental")
+            self.assertEqual([(e["event"], e["count"]) for e in stats["events"]], [("program_output", 400), ("brain_action", 1)])
+            self.assertEqual(stats["events"][1]["bytes"], 1000)
+            before = stats["db_bytes"]
+
+            result = storage.prune_audit()
+            self.assertEqual(result["deleted"], 351)
+            self.assertGreater(result["vacuumed_pages"], 0)
+            stats = storage.audit_stats()
+            self.assertEqual(stats["free_bytes"], 0)
+            self.assertLess(stats["db_bytes"], before / 2)
+            self.assertEqual(stats["rows"], 50)
+            storage.close()
+
+    def test_database_without_auto_vacuum_is_converted_only_on_request(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "app.db"
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE audit_log (id INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT, data TEXT, created_at INTEGER)")
+            conn.executemany("INSERT INTO audit_log (event, data, created_at) VALUES ('e', ?, ?)", [("x" * 4000, i) for i in range(200)])
+            conn.commit()
+            conn.close()
+
+            storage = self._storage(db, path, 0, 10)
+            self.assertEqual(storage.audit_stats()["auto_vacuum"], "none")
+            result = storage.prune_audit()
+            self.assertEqual((result["deleted"], result["vacuumed_pages"]), (190, 0))
+            # The background pass never runs the full VACUUM.
+            stats = storage.audit_stats()
+            self.assertEqual(stats["auto_vacuum"], "none")
+            self.assertGreater(stats["free_bytes"], 0)
+
+            self.assertGreater(storage.incremental_vacuum(convert=True), 0)
+            stats = storage.audit_stats()
+            self.assertEqual((stats["auto_vacuum"], stats["free_bytes"], stats["rows"]), ("incremental", 0, 10))
+            # Writes keep going through the writer afterwards.
+            storage.add_audit("e", "after")
+            self.assertEqual(storage.get_audit(1)[0]["data"], "after")
+            storage.close()
+
+    def test_inserts_start_a_background_pass(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            storage.set_audit_retention(0, 5)
+            storage.add_audit_batch([("e", str(i), i, None) for i in range(20)])
+            storage._audit_thread.join(timeout=10)
+            self.assertEqual(storage.audit_stats()["rows"], 5)
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+
+def _import_storage():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage import audit
+    from storage.db import Storage
+
+    return audit, Storage
+
+
+class _CountingStorage:
+    def __init__(self, inner):
+        self.inner = inner
+        self.batches = []
+
+    def add_audit_batch(self, rows):
+        rows = list(rows)
+        self.batches.append(len(rows))
+        self.inner.add_audit_batch(rows)
+
+
+class AuditWriterTest(unittest.TestCase):
+    def test_events_from_many_threads_are_committed_in_batches(self):
+        audit, Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            counting = _CountingStorage(storage)
+            writer = audit.AuditWriter(counting, flush_ms=50, max_batch=100)
+
+            def _emit(t):
+                for i in range(100):
+                    writer.write("program_output", {"id": f"p{t}", "line": f"line {i}"})
+
+            threads = [threading.Thread(target=_emit, args=(t,)) for t in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            deadline = time.monotonic() + 2.0
+            while writer.written < 400 and time.monotonic() < deadline:
+                time.sleep(0.02)
+
+            self.assertEqual(writer.written, 400)
+            self.assertLess(len(counting.batches), 40)
+            rows = storage.get_audit(limit=1000)
+            self.assertEqual(len(rows), 400)
+            self.assertEqual(sum(json.loads(r["data"])["line"] == "line 99" for r in rows), 4)
+            writer.close()
+
+    def test_non_blocking_write_drops_when_the_queue_is_full(self):
+        audit, Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            entered, release = threading.Event(), threading.Event()
+
+            class _SlowStorage(_CountingStorage):
+                def add_audit_batch(self, rows):
+                    entered.set()
+                    release.wait(timeout=5.0)
+                    super().add_audit_batch(rows)
+
+            writer = audit.AuditWriter(_SlowStorage(storage), flush_ms=10, max_batch=2, max_pending=2)
+            writer.write("e", {"i": 0})
+            writer.write("e", {"i": 1})
+            self.assertTrue(entered.wait(timeout=2.0))
+            # The writer is stuck committing the first batch; fill the queue behind it.
+            writer.write("e", {"i": 2})
+            writer.write("e", {"i": 3})
+            started = time.monotonic()
+            writer.write("e", {"i": 4}, block=False)
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertEqual(writer.dropped, 1)
+
+            release.set()
+            writer.close()
+            self.assertEqual(writer.written, 4)
+            self.assertEqual(sorted(json.loads(r["data"])["i"] for r in storage.get_audit(limit=10)), [0, 1, 2, 3])
+
+    def test_oversized_payloads_move_out_of_line_and_close_flushes(self):
+        audit, Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            writer = audit.AuditWriter(storage, flush_ms=10000, max_batch=1000)
+            big = {"result": {"content": "x" * (audit.INLINE_MAX_CHARS * 2)}}
+            writer.write("brain_action", big)
+            writer.write("brain_response", {"text": "ok"})
+            self.assertEqual(storage.get_audit(limit=10), [])
+            writer.close()
+
+            rows = storage.get_audit(limit=10)
+            self.assertEqual([r["event"] for r in rows], ["brain_response", "brain_action"])
+            inline = json.loads(rows[1]["data"])
+            self.assertTrue(inline["truncated"])
+            self.assertEqual(inline["chars"], len(json.dumps(big)))
+            self.assertLessEqual(len(rows[1]["data"]), audit.PREVIEW_CHARS + 200)
+            self.assertEqual(json.loads(storage.get_audit_payload(rows[1]["id"])), big)
+            self.assertIsNone(storage.get_audit_payload(rows[0]["id"]))
+
+            # Writes after close go straight to storage.
+            writer.write("late", {})
+            self.assertEqual(storage.get_audit(limit=1)[0]["event"], "late")
+
+        inline, payload = audit.split_payload("y" * 50, inline_max=10, payload_max=20)
+        self.assertEqual(len(payload), 20)
+        self.assertEqual(json.loads(inline)["payload_chars"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
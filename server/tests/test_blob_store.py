@@ -0,0 +1,113 @@
+import base64
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+def _import_blobs():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import runtime as rt
+    from storage import blobs
+    from storage.db import Storage
+
+    return blobs, rt, Storage
+
+
+class BlobStoreTest(unittest.TestCase):
+    def test_externalize_dedupes_and_resolves(self):
+        blobs, _, _ = _import_blobs()
+        with tempfile.TemporaryDirectory() as td:
+            store = blobs.BlobStore(Path(td))
+            png = b"\x89PNG\r\n" + os.urandom(6000)
+            value = {
+                "status": "ok",
+                "image_base64": base64.b64encode(png).decode("ascii"),
+                "log": "x" * 5000,
+                "again": "x" * 5000,
+                "tensor": [0.25] * 2000,
+                "small": [1, 2, 3],
+            }
+            out = store.externalize(value, min_chars=4096)
+
+            self.assertEqual(out["status"], "ok")
+            self.assertEqual(out["small"], [1, 2, 3])
+            self.assertEqual(out["image_base64"]["encoding"], "base64")
+            self.assertEqual(out["image_base64"]["bytes"], len(png))
+            self.assertEqual(out["log"][blobs.BLOB_KEY], out["again"][blobs.BLOB_KEY])
+            self.assertEqual(out["log"]["preview"], "x" * blobs.PREVIEW_CHARS)
+            self.assertEqual(out["tensor"]["items"], 2000)
+            self.assertLess(len(json.dumps(out)), 1000)
+            self.assertEqual(len(list(Path(td).glob("??/*"))), 3)
+            self.assertEqual(store.resolve(out), value)
+
+            def get(digest, range_header=""):
+                status, headers, body = blobs.blob_response(store, digest, range_header)
+                return status, headers, b"".join(body)
+
+            status, headers, body = get(out["image_base64"][blobs.BLOB_KEY], "bytes=0-3")
+            self.assertEqual((status, headers["Content-Type"], body), (206, "image/png", png[:4]))
+            self.assertEqual(headers["Content-Range"], f"bytes 0-3/{len(png)}")
+            status, _, body = get(out["log"][blobs.BLOB_KEY], "bytes=-10")
+            self.assertEqual((status, body), (206, b"x" * 10))
+            self.assertEqual(get(out["log"][blobs.BLOB_KEY], "bytes=9999-")[0], 416)
+            # The full body is streamed in chunks; an invalid range (last < first) is ignored.
+            log = value["log"].encode("utf-8")
+            for range_header in ("", "bytes=5-3"):
+                status, headers, body = get(out["log"][blobs.BLOB_KEY], range_header)
+                self.assertEqual((status, headers["Content-Length"], body), (200, str(len(log)), log))
+            with mock.patch.object(blobs, "STREAM_CHUNK", 1024):
+                _, _, chunks = blobs.blob_response(store, out["log"][blobs.BLOB_KEY])
+                self.assertEqual([len(c) for c in chunks], [1024] * 4 + [904])
+            self.assertEqual(get("../app.db")[0], 404)
+
+    def test_least_recently_used_blobs_are_evicted_over_the_cap(self):
+        blobs, _, _ = _import_blobs()
+        with tempfile.TemporaryDirectory() as td:
+            store = blobs.BlobStore(Path(td), max_bytes=3000)
+            digests = []
+            for i in range(3):
+                digests.append(store.put(bytes([i]) * 1000))
+                os.utime(store.path(digests[-1]), (1000 + i, 1000 + i))
+            # Reading the oldest makes it the most recently used.
+            self.assertIsNotNone(store.read(digests[0]))
+            store.put(b"\xff" * 1000)
+
+            self.assertIsNone(store.path(digests[1]))
+            self.assertIsNotNone(store.path(digests[0]))
+            self.assertLessEqual(store.stats()["bytes"], 3000)
+
+    def test_recorded_tool_results_keep_references(self):
+        blobs, rt, Storage = _import_blobs()
+        with tempfile.TemporaryDirectory() as td:
+            user_dir = Path(td)
+            storage = Storage(user_dir / "app.db")
+            logs = []
+            capture = base64.b64encode(os.urandom(30000)).decode("ascii")
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=storage,
+                emit_log=lambda name, payload: logs.append((name, payload)),
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=lambda *_: {"status": "ok", "data_base64": capture},
+            )
+            item = {"id": "i1", "meta": {"session_id": "s"}}
+            result = brain._execute_action(item, {"type": "tool_invoke", "tool": "device_api", "args": {"action": "camera.capture"}})
+
+            self.assertEqual(result["data_base64"], capture)
+            row = storage.list_chat_messages("s")[-1]
+            self.assertLess(len(row["text"]), 1000)
+            ref = json.loads(row["text"])["result"]["data_base64"]
+            action_log = [p for name, p in logs if name == "brain_action"][-1]
+            self.assertEqual(action_log["result"]["data_base64"], ref)
+            self.assertEqual(storage.blobs.resolve(ref), capture)
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
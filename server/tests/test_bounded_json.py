@@ -0,0 +1,65 @@
+import json
+import sys
+import unittest
+from pathlib import Path
+
+
+def _import_bounded_json():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import bounded_json
+
+    return bounded_json
+
+
+class BoundedJsonTest(unittest.TestCase):
+    def test_small_values_encode_exactly_like_json_dumps(self):
+        bj = _import_bounded_json()
+        value = {"status": "ok", "items": [1, 2.5, None, True, {"a": "bあ"}], 3: "x"}
+        self.assertEqual(bj.dumps_bounded(value, 12000), json.dumps(value))
+
+    def test_large_blobs_are_clipped_within_limit_keeping_priority_keys_first(self):
+        bj = _import_bounded_json()
+        value = {
+            "meta": {"name": "frame.jpg"},
+            "data_b64": "A" * 2_000_000,
+            "content": "line\n" * 50_000,
+            "status": "ok",
+        }
+        out = bj.dumps_bounded(value, 6000)
+        self.assertLessEqual(len(out), 6000)
+        parsed = json.loads(out)
+        self.assertEqual(list(parsed)[0], "status")
+        self.assertEqual(parsed["status"], "ok")
+        self.assertTrue(parsed["truncated_for_model"])
+        self.assertEqual(parsed["data_b64_len"], 2_000_000)
+        self.assertIn("[truncated_for_model]", parsed["data_b64"])
+
+    def test_long_lists_and_deep_nesting_are_marked(self):
+        bj = _import_bounded_json()
+        out = bj.dumps_bounded({"items": [{"i": i, "pad": "z" * 50} for i in range(500)]}, 3000, max_list_items=20)
+        self.assertLessEqual(len(out), 3000)
+        items = json.loads(out)["items"]
+        self.assertTrue(items[-1]["truncated_for_model"])
+        self.assertEqual(len(items) - 1 + items[-1]["omitted_items"], 500)
+
+        deep: dict = {"leaf": "x" * 5000}
+        for _ in range(10):
+            deep = {"child": deep}
+        parsed = json.loads(bj.dumps_bounded(deep, 2000))
+        for _ in range(6):
+            parsed = parsed["child"]
+        self.assertEqual(parsed, "(truncated_for_model: max_depth)")
+
+    def test_non_ascii_strings_stay_within_limit(self):
+        bj = _import_bounded_json()
+        out = bj.dumps_bounded({"stdout": "日本語" * 20000, "code": 0}, 2500)
+        self.assertLessEqual(len(out), 2500)
+        parsed = json.loads(out)
+        self.assertEqual(parsed["code"], 0)
+        self.assertTrue(parsed["truncated_for_model"])
+
+
+if __name__ == "__main__":
+    unittest.main()
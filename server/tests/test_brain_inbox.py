@@ -0,0 +1,115 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _import_modules():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import runtime as rt
+    from storage.db import Storage
+
+    return rt, Storage
+
+
+class BrainInboxTest(unittest.TestCase):
+    def _brain(self, rt, storage, user_dir):
+        return rt.BrainRuntime(
+            user_dir=user_dir,
+            storage=storage,
+            emit_log=lambda *_: None,
+            shell_exec=lambda *_: {"status": "ok"},
+            tool_invoke=lambda *_: {"status": "ok"},
+        )
+
+    def test_claim_is_exclusive_and_dead_letters_after_failure(self):
+        _, Storage = _import_modules()
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = Storage(Path(tmp) / "app.db")
+            seq = storage.add_inbox_item("chat_1", "s1", "chat", json.dumps({"id": "chat_1"}))
+            self.assertIsNotNone(storage.claim_inbox_item(seq, "w1", 60000))
+            # A live lease can't be claimed by another worker.
+            self.assertIsNone(storage.claim_inbox_item(seq, "w2", 60000))
+            self.assertTrue(storage.renew_inbox_lease(seq, "w1", 60000))
+            self.assertFalse(storage.renew_inbox_lease(seq, "w2", 60000))
+            storage.fail_inbox_item(seq, "boom")
+            self.assertEqual(storage.inbox_counts(), {"dead": 1})
+
+    def test_items_survive_restart_and_paused_state_is_restored(self):
+        rt, Storage = _import_modules()
+        with tempfile.TemporaryDirectory() as tmp:
+            user_dir = Path(tmp)
+            storage = Storage(user_dir / "app.db")
+            brain = self._brain(rt, storage, user_dir)
+            brain.enqueue_chat("hello", meta={"session_id": "s1"})
+            brain._pause_for_permission(
+                "p_1",
+                {"permission_id": "p_1", "session_id": "s2", "item": {"id": "chat_0", "kind": "chat"}},
+            )
+            # Simulate a worker that died mid-item: claimed but never completed.
+            lane, item = brain._scheduler.take()
+            self.assertTrue(brain._claim_inbox_item(item))
+            self.assertEqual(storage.inbox_counts(), {"leased": 1, "paused": 1})
+
+            restarted = self._brain(rt, storage, user_dir)
+            self.assertEqual(restarted._scheduler.size(), 1)
+            self.assertIn("p_1", restarted._awaiting_permissions)
+            lane, item = restarted._scheduler.take()
+            self.assertEqual((lane, item["text"]), ("s1", "hello"))
+            self.assertTrue(restarted._claim_inbox_item(item))
+            restarted._finish_inbox_item(item)
+            self.assertEqual(restarted._take_paused_item("p_1")["session_id"], "s2")
+            self.assertEqual(storage.inbox_counts(), {})
+
+    def test_retryable_failures_are_requeued_until_attempts_run_out(self):
+        rt, Storage = _import_modules()
+        import requests
+
+        with tempfile.TemporaryDirectory() as tmp:
+            user_dir = Path(tmp)
+            storage = Storage(user_dir / "app.db")
+            brain = self._brain(rt, storage, user_dir)
+            brain._config.update({"inbox_max_attempts": 2, "inbox_retry_backoff_ms": 1000})
+            brain.enqueue_chat("hello", meta={"session_id": "s1"})
+            lane, item = brain._scheduler.take()
+            self.assertTrue(brain._claim_inbox_item(item))
+            self.assertFalse(brain._retry_inbox_item(lane, item, ValueError("bad tool arguments")))
+
+            flaky = requests.ConnectionError("connection reset")
+            self.assertTrue(brain._retry_inbox_item(lane, item, flaky))
+            brain._scheduler.done(lane)
+            self.assertEqual(storage.inbox_counts(), {"queued": 1})
+            # Backed off: not ready yet.
+            self.assertEqual(brain._scheduler.deferred(), 1)
+            self.assertIsNone(brain._scheduler.take())
+
+            self.assertTrue(brain._claim_inbox_item(item))
+            self.assertEqual(item["attempts"], 2)
+            self.assertFalse(brain._retry_inbox_item(lane, item, flaky))
+            brain._finish_inbox_item(item, error=str(flaky))
+            self.assertEqual(storage.inbox_counts(), {"dead": 1})
+
+    def test_only_transport_failures_and_server_errors_are_retryable(self):
+        _import_modules()
+        import requests
+
+        import transport
+
+        def http_error(status):
+            resp = requests.Response()
+            resp.status_code = status
+            return requests.HTTPError(f"{status} error", response=resp)
+
+        self.assertTrue(transport.is_retryable_error(requests.ConnectionError()))
+        self.assertTrue(transport.is_retryable_error(requests.Timeout()))
+        self.assertTrue(transport.is_retryable_error(http_error(503)))
+        self.assertTrue(transport.is_retryable_error(http_error(429)))
+        self.assertFalse(transport.is_retryable_error(http_error(401)))
+        self.assertFalse(transport.is_retryable_error(RuntimeError("no_tool_calls")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+
+def _import_runtime():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import runtime as rt
+    from storage.db import Storage
+
+    return rt, Storage
+
+
+class BrainMessagesPollTest(unittest.TestCase):
+    def _brain(self, rt, storage, user_dir):
+        return rt.BrainRuntime(
+            user_dir=user_dir,
+            storage=storage,
+            emit_log=lambda *_: None,
+            shell_exec=lambda *_: {"status": "ok"},
+            tool_invoke=lambda *_: {"status": "ok"},
+        )
+
+    def test_since_id_returns_only_newer_messages_of_the_session(self):
+        rt, Storage = _import_runtime()
+        with tempfile.TemporaryDirectory() as td:
+            user_dir = Path(td)
+            brain = self._brain(rt, Storage(user_dir / "app.db"), user_dir)
+            for i in range(5):
+                brain._record_message("user", f"a{i}", {"session_id": "a"})
+                brain._record_message("user", f"b{i}", {"session_id": "b"})
+
+            page = brain.poll_messages(session_id="a", limit=50)
+            self.assertEqual([m["text"] for m in page["messages"]], [f"a{i}" for i in range(5)])
+            self.assertEqual(page["cursor"], page["messages"][-1]["id"])
+
+            cursor = page["messages"][1]["id"]
+            page = brain.poll_messages(session_id="a", since_id=cursor, limit=2)
+            self.assertEqual([m["text"] for m in page["messages"]], ["a2", "a3"])
+            page = brain.poll_messages(session_id="a", since_id=page["cursor"], limit=2)
+            self.assertEqual([m["text"] for m in page["messages"]], ["a4"])
+
+            empty = brain.poll_messages(session_id="a", since_id=page["cursor"])
+            self.assertEqual(empty, {"messages": [], "cursor": page["cursor"], "draft_rev": 0})
+
+    def test_long_poll_wakes_on_new_message_or_times_out(self):
+        rt, Storage = _import_runtime()
+        with tempfile.TemporaryDirectory() as td:
+            user_dir = Path(td)
+            brain = self._brain(rt, Storage(user_dir / "app.db"), user_dir)
+            brain._record_message("user", "hello", {"session_id": "s"})
+            cursor = brain.poll_messages(session_id="s")["cursor"]
+
+            started = time.monotonic()
+            self.assertEqual(brain.poll_messages(session_id="s", since_id=cursor, wait_ms=200)["messages"], [])
+            self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+            def _reply():
+                time.sleep(0.2)
+                brain._record_message("assistant", "other session", {"session_id": "t"})
+                brain._record_message("assistant", "hi", {"session_id": "s"})
+
+            threading.Thread(target=_reply).start()
+            started = time.monotonic()
+            page = brain.poll_messages(session_id="s", since_id=cursor, wait_ms=5000)
+            self.assertLess(time.monotonic() - started, 2.0)
+            self.assertEqual([m["text"] for m in page["messages"]], ["hi"])
+            self.assertGreater(page["cursor"], cursor)
+
+            # A streaming draft update also wakes the poll; the draft rides along without an id.
+            threading.Timer(0.1, brain._set_stream_draft, args=("s", "item_1", "partial")).start()
+            page = brain.poll_messages(session_id="s", since_id=page["cursor"], wait_ms=5000)
+            self.assertEqual([m["meta"].get("streaming") for m in page["messages"]], [True])
+
+
+    def test_unchanged_streaming_draft_is_not_resent_and_the_poll_keeps_waiting(self):
+        rt, Storage = _import_runtime()
+        with tempfile.TemporaryDirectory() as td:
+            user_dir = Path(td)
+            brain = self._brain(rt, Storage(user_dir / "app.db"), user_dir)
+            brain._record_message("user", "hello", {"session_id": "s"})
+            brain._set_stream_draft("s", "item_1", "partial")
+            page = brain.poll_messages(session_id="s")
+            self.assertEqual([m["text"] for m in page["messages"]], ["hello", "partial"])
+            cursor, draft_rev = page["cursor"], page["draft_rev"]
+
+            started = time.monotonic()
+            page = brain.poll_messages(session_id="s", since_id=cursor, wait_ms=200, draft_rev=draft_rev)
+            self.assertEqual(page["messages"], [])
+            self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+            threading.Timer(0.1, brain._set_stream_draft, args=("s", "item_1", "partial reply")).start()
+            page = brain.poll_messages(session_id="s", since_id=cursor, wait_ms=5000, draft_rev=draft_rev)
+            self.assertEqual([m["text"] for m in page["messages"]], ["partial reply"])
+            self.assertGreater(page["draft_rev"], draft_rev)
+
+    def test_message_watchers_are_called_with_the_session_until_removed(self):
+        rt, Storage = _import_runtime()
+        with tempfile.TemporaryDirectory() as td:
+            user_dir = Path(td)
+            brain = self._brain(rt, Storage(user_dir / "app.db"), user_dir)
+            seen = []
+            brain.add_message_watcher(seen.append)
+            brain._record_message("user", "hello", {"session_id": "s"})
+            brain._set_stream_draft("t", "item_1", "partial")
+            brain.remove_message_watcher(seen.append)
+            brain._record_message("user", "again", {"session_id": "s"})
+            self.assertEqual(seen, ["s", "t"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+
+class _FakeStorage:
+    def __init__(self):
+        self._settings = {}
+        self._creds = {}
+
+    def get_setting(self, key: str):
+        return self._settings.get(key)
+
+    def set_setting(self, key: str, value: str):
+        self._settings[key] = value
+
+    def get_credential(self, name: str):
+        return self._creds.get(name)
+
+
+def _import_runtime():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import runtime as rt
+    from agents import scheduler as sch
+
+    return rt, sch
+
+
+class SessionSchedulerTest(unittest.TestCase):
+    def test_round_robin_and_per_session_order(self):
+        _, sch = _import_runtime()
+        s = sch.SessionScheduler()
+        for i in range(3):
+            s.put("a", {"id": f"a{i}"})
+        s.put("b", {"id": "b0"})
+        s.put("c", {"id": "c0"})
+
+        sid, item = s.take()
+        self.assertEqual((sid, item["id"]), ("a", "a0"))
+        # "a" is active: its next item must not be handed out until done().
+        sid2, item2 = s.take()
+        sid3, item3 = s.take()
+        self.assertEqual([(sid2, item2["id"]), (sid3, item3["id"])], [("b", "b0"), ("c", "c0")])
+        self.assertIsNone(s.take())
+
+        s.done("a")
+        s.done("b")
+        s.done("c")
+        sid, item = s.take()
+        self.assertEqual((sid, item["id"]), ("a", "a1"))
+        self.assertEqual(s.size(), 1)
+        self.assertEqual(s.active_sessions(), ["a"])
+
+    def test_take_wakes_on_put_and_releases_deferred_items_when_due(self):
+        _, sch = _import_runtime()
+        s = sch.SessionScheduler()
+        got = []
+        t = threading.Thread(target=lambda: got.append(s.take(timeout=5)))
+        t.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        s.put("a", {"id": "a0"})
+        t.join(2)
+        self.assertEqual(got[0][1]["id"], "a0")
+        self.assertLess(time.monotonic() - started, 0.5)
+        s.done("a")
+
+        s.put("b", {"id": "later"}, delay_s=0.2)
+        s.put("b", {"id": "now"})
+        self.assertEqual(s.deferred(), 1)
+        self.assertEqual(s.take(timeout=1)[1]["id"], "now")
+        s.done("b")
+        started = time.monotonic()
+        self.assertEqual(s.take(timeout=2)[1]["id"], "later")
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(s.stats()["samples"], 3)
+
+        s.done("b")
+        t = threading.Thread(target=lambda: got.append(s.take(timeout=5)))
+        t.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        s.wake()
+        t.join(2)
+        self.assertIsNone(got[-1])
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+class BrainWorkerPoolTest(unittest.TestCase):
+    def test_slow_session_does_not_block_other_sessions(self):
+        rt, _ = _import_runtime()
+        brain = rt.BrainRuntime(
+            user_dir=Path("/tmp/kugutz-test-user-pool"),
+            storage=_FakeStorage(),
+            emit_log=lambda *_: None,
+            shell_exec=lambda *_: {"status": "ok"},
+            tool_invoke=lambda *_: {"status": "ok"},
+        )
+        brain.update_config({"worker_threads": 2})
+
+        release = threading.Event()
+        finished = []
+
+        def process(item):
+            if item["meta"]["session_id"] == "slow":
+                release.wait(5)
+            finished.append(item["text"])
+
+        brain._process_item = process
+        brain.start()
+        try:
+            brain.enqueue_chat("slow-1", meta={"session_id": "slow"})
+            brain.enqueue_chat("slow-2", meta={"session_id": "slow"})
+            brain.enqueue_chat("fast-1", meta={"session_id": "fast"})
+            deadline = time.time() + 3
+            while "fast-1" not in finished and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertIn("fast-1", finished)
+            self.assertNotIn("slow-1", finished)
+            self.assertEqual(brain.status()["active_sessions"], ["slow"])
+            release.set()
+            deadline = time.time() + 3
+            while len(finished) < 3 and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual([t for t in finished if t.startswith("slow")], ["slow-1", "slow-2"])
+        finally:
+            release.set()
+            brain.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _import_db():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage import db
+
+    return db
+
+
+class ChatMetaColumnsTest(unittest.TestCase):
+    def test_meta_round_trips_through_columns_and_rest(self):
+        db = _import_db()
+        meta = {"session_id": "s", "actor": "brain", "item_id": "i1", "tool": "device_api:camera.capture", "ui": {"x": 1}}
+        columns, rest = db.split_chat_meta(json.dumps(meta))
+        self.assertEqual(columns["actor"], "brain")
+        self.assertIsNone(columns["error"])
+        self.assertEqual(json.loads(rest), {"ui": {"x": 1}})
+        self.assertEqual(db.chat_meta({"session_id": "s", "meta": rest, **columns}), meta)
+        self.assertEqual(db.split_chat_meta({"item_id": "i2"})[1], "")
+
+    def test_filters_by_role_item_and_error(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            storage.add_chat_message("s", "user", "take a photo", {"actor": "user"})
+            storage.add_chat_message("s", "tool", "{}", {"item_id": "i1", "kind": "action", "tool": "device_api:camera.capture"})
+            storage.add_chat_message("s", "tool", "{}", {"item_id": "i1", "kind": "action", "error": "permission_required"})
+            storage.add_chat_message("s", "assistant", "Done", {"item_id": "i1", "actor": "brain"})
+            storage.add_chat_message("t", "tool", "{}", {"item_id": "i1", "error": "boom"})
+
+            dialogue = storage.list_chat_messages("s", limit=2, roles=("user", "assistant"))
+            self.assertEqual([r["text"] for r in dialogue], ["take a photo", "Done"])
+            self.assertEqual([r["id"] for r in storage.list_chat_messages("s", item_id="i1")], [2, 3, 4])
+            errors = storage.list_chat_messages("s", errors_only=True)
+            self.assertEqual([db.chat_meta(r) for r in errors], [
+                {"item_id": "i1", "kind": "action", "error": "permission_required", "session_id": "s"}
+            ])
+            self.assertEqual(storage.list_chat_messages("s", since_id=1, roles=["user"]), [])
+            storage.close()
+
+    def test_existing_table_is_migrated(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "app.db"
+            conn = sqlite3.connect(path)
+            conn.execute(
+                "CREATE TABLE chat_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, role TEXT, "
+                "text TEXT, meta TEXT, created_at INTEGER)"
+            )
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, role, text, meta, created_at) VALUES (?, ?, ?, ?, 0)",
+                [
+                    ("s", "user", "hi", '{"actor": "user", "session_id": "s"}'),
+                    ("s", "tool", "{}", '{"item_id": "i1", "error": "unknown_tool", "extra": 1}'),
+                    ("s", "assistant", "ok", "not json"),
+                ],
+            )
+            conn.commit()
+            conn.close()
+
+            storage = db.Storage(path)
+            self.assertEqual(db.chat_meta(storage.list_chat_messages("s")[1])["error"], "unknown_tool")
+            storage.run_backfills()
+            rows = storage.list_chat_messages("s")
+            self.assertEqual([r["actor"] for r in rows], ["user", None, None])
+            self.assertEqual((rows[1]["item_id"], rows[1]["error"], rows[1]["meta"]), ("i1", "unknown_tool", '{"extra": 1}'))
+            self.assertEqual(db.chat_meta(rows[2]), {"session_id": "s"})
+            self.assertEqual(len(storage.list_chat_messages("s", errors_only=True)), 1)
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _import_db():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage import db
+
+    return db
+
+
+class ChatRetentionTest(unittest.TestCase):
+    def _count(self, storage, sid=None):
+        conn = storage._connect()
+        if sid is None:
+            return conn.execute("SELECT COUNT(*) AS n FROM chat_messages").fetchone()["n"]
+        return conn.execute("SELECT COUNT(*) AS n FROM chat_messages WHERE session_id = ?", (sid,)).fetchone()["n"]
+
+    def test_inserts_do_not_trim_until_compaction_is_due(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            storage.set_chat_retention(10, 25)
+            storage._chat_inserts = 0
+            storage._chat_compacted_at = float("inf")
+            for i in range(db.CHAT_COMPACT_EVERY - 1):
+                storage.add_chat_message("a", "user", f"m{i}", "{}")
+            self.assertEqual(self._count(storage, "a"), db.CHAT_COMPACT_EVERY - 1)
+
+            # The Nth insert queues a background compaction; the next write runs after it.
+            storage.add_chat_message("a", "user", "last", "{}")
+            storage.set_setting("sync", "1")
+            rows = storage.list_chat_messages("a", limit=100)
+            self.assertEqual(len(rows), 10)
+            self.assertEqual(rows[-1]["text"], "last")
+            storage.close()
+
+    def test_compact_applies_per_session_and_global_limits(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            for sid in ("a", "b", "c"):
+                for i in range(12):
+                    storage.add_chat_message(sid, "user", f"{sid}{i}", "{}")
+            storage.set_chat_retention(8, 20)
+            deleted = storage.compact_chat()
+
+            self.assertEqual(deleted, 36 - 20)
+            self.assertEqual(self._count(storage), 20)
+            self.assertEqual(self._count(storage, "a"), 4)
+            self.assertEqual([r["text"] for r in storage.list_chat_messages("c")], [f"c{i}" for i in range(4, 12)])
+            self.assertEqual(storage.compact_chat(["c"]), 0)
+            storage.close()
+
+
+class ChatSessionsIndexTest(unittest.TestCase):
+    def _aggregate(self, storage):
+        rows = storage._connect().execute(
+            "SELECT session_id, COUNT(*) AS count, MAX(id) AS last_id FROM chat_messages GROUP BY session_id"
+        ).fetchall()
+        return {r["session_id"]: (r["count"], r["last_id"]) for r in rows}
+
+    def _index(self, storage):
+        return {r["session_id"]: (r["count"], r["last_id"]) for r in storage.list_chat_sessions(limit=200)}
+
+    def test_index_follows_inserts_and_compaction_and_pages_by_recency(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            storage.add_chat_message("a", "assistant", "welcome", "{}")
+            storage.add_chat_message("a", "user", "take a photo " * 20, "{}")
+            storage.add_chat_message("a", "user", "and another", "{}")
+            for sid in ("b", "c", "d"):
+                for i in range(5):
+                    storage.add_chat_message(sid, "user", f"{sid}{i}", "{}")
+
+            first = storage.list_chat_sessions(limit=2)
+            self.assertEqual([r["session_id"] for r in first], ["d", "c"])
+            second = storage.list_chat_sessions(limit=2, before_id=first[-1]["last_id"])
+            self.assertEqual([r["session_id"] for r in second], ["b", "a"])
+            a = second[1]
+            self.assertEqual(a["title"], ("take a photo " * 20)[: db.SESSION_TITLE_CHARS])
+            self.assertEqual((a["last_role"], a["last_preview"]), ("user", "and another"))
+            self.assertEqual(self._index(storage), self._aggregate(storage))
+
+            storage.set_chat_retention(2, 5)
+            storage.compact_chat()
+            self.assertEqual(self._index(storage), self._aggregate(storage))
+            self.assertNotIn("a", self._index(storage))
+            storage.close()
+
+    def test_existing_history_is_indexed_on_first_start(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            for i in range(6):
+                storage.add_chat_message(f"s{i % 3}", "user" if i else "assistant", f"m{i}", "{}")
+            # A database from before the chat_sessions step.
+            storage._write(lambda conn: conn.execute("DELETE FROM chat_sessions"))
+            storage._write(lambda conn: conn.execute("PRAGMA user_version = 1"))
+            storage.close()
+
+            storage = db.Storage(Path(td) / "app.db")
+            self.assertEqual(self._index(storage), self._aggregate(storage))
+            titles = {r["session_id"]: r["title"] for r in storage.list_chat_sessions()}
+            self.assertEqual(titles, {"s0": "m3", "s1": "m1", "s2": "m2"})
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
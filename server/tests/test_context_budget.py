@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _import_context():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import context
+
+    return context
+
+
+class ContextBudgetTest(unittest.TestCase):
+    def test_dialogue_is_filled_newest_first_within_budget(self):
+        ctx = _import_context()
+        budget = ctx.ContextBudget(2000, shares={"instructions": 0, "memory": 0, "dialogue": 1, "tool_output": 0})
+        messages = [{"role": "user", "text": f"m{i} " + "x" * 400} for i in range(40)]
+        kept = budget.fit_dialogue(messages)
+        self.assertTrue(0 < len(kept) < 40)
+        self.assertEqual(kept[-1]["text"], messages[-1]["text"])
+        self.assertEqual([m["text"] for m in kept], [m["text"] for m in messages[-len(kept):]])
+        self.assertLessEqual(budget.used["dialogue"], budget.limit("dialogue"))
+
+        # A single oversized message is clipped rather than dropped.
+        huge = [{"role": "user", "text": "y" * 50000}]
+        kept = budget.fit_dialogue(huge)
+        self.assertEqual(len(kept), 1)
+        self.assertIn("[truncated_for_context]", kept[0]["text"])
+
+    def test_unused_instruction_and_memory_share_rolls_over_to_dialogue(self):
+        ctx = _import_context()
+        budget = ctx.ContextBudget(10000)
+        before = budget.limit("dialogue")
+        budget.fit_text("instructions", "short prompt")
+        budget.fit_text("memory", "")
+        self.assertGreater(budget.limit("dialogue"), before)
+        report = budget.report(round=0)
+        self.assertEqual(report["round"], 0)
+        self.assertIn("instructions", report["used"])
+
+    def test_estimators_are_pluggable_per_model(self):
+        ctx = _import_context()
+        self.assertEqual(ctx.heuristic_token_count("abcd" * 10), 10)
+        self.assertEqual(ctx.heuristic_token_count("こんにちは"), 5)
+        ctx.register_token_estimator("test-model", lambda text: len(text))
+        self.assertEqual(ctx.token_estimator("test-model-mini")("abcd"), 4)
+        self.assertIs(ctx.token_estimator("other"), ctx.heuristic_token_count)
+
+
+class RollingSummaryTest(unittest.TestCase):
+    def test_aged_out_turns_fold_into_summary_that_replaces_them_in_prompt(self):
+        _import_context()
+        from agents import runtime as rt
+        from storage.db import Storage
+
+        posts = []
+
+        def fake_post(url, headers=None, data=None, timeout=None, **_):
+            posts.append(json.loads(data or "{}"))
+
+            class _Resp:
+                def raise_for_status(self):
+                    return None
+
+                def json(self):
+                    return {"id": "resp_1", "output": [{"type": "message", "content": [{"type": "output_text", "text": "ok"}]}]}
+
+            return _Resp()
+
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                user_dir = Path(tmp)
+                logs = []
+                brain = rt.BrainRuntime(
+                    user_dir=user_dir,
+                    storage=Storage(user_dir / "app.db"),
+                    emit_log=lambda event, data: logs.append((event, data)),
+                    shell_exec=lambda *_: {"status": "ok"},
+                    tool_invoke=lambda *_: {"status": "ok"},
+                )
+                brain.update_config(
+                    {
+                        "model": "gpt-test",
+                        "provider_url": "https://api.openai.com/v1/responses",
+                        "summary_keep_messages": 10,
+                        "summary_batch_messages": 5,
+                        "summary_use_model": False,
+                        "chain_responses": False,
+                    }
+                )
+                for i in range(24):
+                    role = "user" if i % 2 == 0 else "assistant"
+                    brain._record_message(role, f"turn {i}", {"session_id": "s1"})
+                info = brain._compact_session("s1")
+                self.assertEqual((info["folded"], info["source"]), (14, "extractive"))
+                # Nothing new aged out yet: no second update.
+                self.assertIsNone(brain._compact_session("s1"))
+                for i in range(24, 30):
+                    brain._record_message("user", f"turn {i}", {"session_id": "s1"})
+                self.assertEqual(brain._compact_session("s1")["folded"], 20)
+                summary = brain._session_summary("s1")["summary"]
+                self.assertIn("turn 0", summary)
+                self.assertIn("turn 19", summary)
+
+                brain._process_with_responses_tools({"id": "chat_1", "kind": "chat", "text": "next", "meta": {"session_id": "s1"}})
+                texts = [m["content"] for m in posts[0]["input"]]
+                self.assertIn("rolling summary", texts[0])
+                self.assertNotIn("turn 19", texts[1:])
+                self.assertEqual(texts[1:-1], [f"turn {i}" for i in range(20, 30)])
+        finally:
+            rt.transport.post = original_post
+
+    def test_backlog_longer_than_a_page_is_folded_forward_from_through_id(self):
+        _import_context()
+        from agents import runtime as rt
+        from storage.db import Storage
+
+        with tempfile.TemporaryDirectory() as tmp:
+            user_dir = Path(tmp)
+            logs = []
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=Storage(user_dir / "app.db"),
+                emit_log=lambda event, data: logs.append((event, data)),
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=lambda *_: {"status": "ok"},
+            )
+            brain.update_config(
+                {
+                    "model": "gpt-test",
+                    "summary_keep_messages": 10,
+                    "summary_batch_messages": 5,
+                    "summary_use_model": False,
+                    "summarize_sessions": False,
+                }
+            )
+            for i in range(300):
+                role = "user" if i % 2 == 0 else "assistant"
+                brain._record_message(role, f"turn {i}", {"session_id": "s1"})
+            info = brain._compact_session("s1")
+            self.assertEqual(info["folded"], 290)
+            first_recent = brain._list_dialogue(session_id="s1", limit=10)[0]
+            self.assertEqual(first_recent["text"], "turn 290")
+            self.assertEqual(info["through_id"], first_recent["id"] - 1)
+            updates = [data for event, data in logs if event == "brain_summary_updated"]
+            self.assertEqual([u["folded"] for u in updates], [120, 240, 290])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+
+def _import_storage():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage.db import Storage
+
+    return Storage
+
+
+class HistorySearchTest(unittest.TestCase):
+    def _fill(self, storage):
+        storage.add_chat_message("a", "user", "Take a photo with the USB camera", "{}")
+        storage.add_chat_message("a", "assistant", "Done, the camera returned 640x480 frames", "{}")
+        storage.add_chat_message("b", "user", "What's the weather today?", "{}")
+        storage.add_chat_message("b", "user", "camerawork tips (100% off_topic)", "{}")
+        later = int(time.time() * 1000) + 1000
+        storage.add_audit_batch([("brain_action", '{"type": "tool_invoke", "result": {"camera": "opened"}}', later, None)])
+
+    def test_fts_matches_filters_pages_and_follows_deletes(self):
+        Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            self.assertTrue(storage._fts)
+            self._fill(storage)
+
+            page = storage.search_history("camera")
+            self.assertEqual(sorted(r["id"] for r in page["results"]), [1, 2])
+            self.assertIn("<mark>camera</mark>", page["results"][0]["snippet"])
+            self.assertEqual(len(storage.search_history("camera*")["results"]), 3)
+            self.assertEqual(storage.search_history("camera frames")["results"][0]["id"], 2)
+            self.assertEqual(storage.search_history("camera", session_id="b")["results"], [])
+
+            both = storage.search_history("camera", scope="all", order="recent", limit=2)
+            self.assertEqual([r["source"] for r in both["results"]], ["audit", "chat"])
+            rest = storage.search_history("camera", scope="all", order="recent", limit=2, offset=both["next_offset"])
+            self.assertEqual([(r["source"], r["id"]) for r in rest["results"]], [("chat", 1)])
+            self.assertIsNone(rest["next_offset"])
+
+            # Query syntax is never interpreted: quotes, operators and column filters are plain words.
+            self.assertEqual(storage.search_history('"camera OR text:weather')["results"], [])
+            with self.assertRaises(ValueError):
+                storage.search_history("camera", scope="everything")
+
+            storage.set_chat_retention(1, 1)
+            storage.compact_chat()
+            self.assertEqual([r["id"] for r in storage.search_history("camera*")["results"]], [4])
+            storage.close()
+
+    def test_existing_rows_are_indexed_and_like_fallback_matches_literally(self):
+        Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            self._fill(storage)
+            # A database from before the search index step.
+            storage._write(lambda conn: conn.execute("DROP TABLE chat_messages_fts"))
+            storage._write(lambda conn: conn.execute("PRAGMA user_version = 2"))
+            storage.close()
+
+            storage = Storage(Path(td) / "app.db")
+            self.assertEqual(len(storage.search_history("camera")["results"]), 2)
+
+            storage._fts = False
+            page = storage.search_history("100% off_topic")
+            self.assertEqual([r["id"] for r in page["results"]], [4])
+            self.assertIn("<mark>100%</mark>", page["results"][0]["snippet"])
+            self.assertEqual(storage.search_history("10_%")["results"], [])
+            audit = storage.search_history("opened", scope="audit")["results"]
+            self.assertEqual([r["event"] for r in audit], ["brain_action"])
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+
+def _import_log_broadcast():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    import log_broadcast
+
+    return log_broadcast
+
+
+class LogBroadcasterTest(unittest.TestCase):
+    def test_every_subscriber_gets_every_matching_event(self):
+        lb = _import_log_broadcast()
+
+        async def _run():
+            hub = lb.LogBroadcaster()
+            a = hub.subscribe()
+            b = hub.subscribe()
+            program = hub.subscribe(events=["program_*"], program_id="p1")
+            brain = hub.subscribe(events=["brain_response"])
+            # Publishers run on other threads (program readers, brain workers).
+            t = threading.Thread(
+                target=lambda: [
+                    hub.publish("program_output", {"id": "p1", "stream": "stdout", "line": "hi"}),
+                    hub.publish("program_output", {"id": "p2", "stream": "stdout", "line": "other"}),
+                    hub.publish("brain_response", {"text": "ok"}),
+                ]
+            )
+            t.start()
+            t.join()
+            await asyncio.sleep(0)
+            got_a = await a.next_batch(1.0)
+            got_b = await b.next_batch(1.0)
+            self.assertEqual([i["id"] for i in got_a], [1, 2, 3])
+            self.assertEqual(got_a, got_b)
+            self.assertEqual([i["data"].get("line") for i in await program.next_batch(1.0)], ["hi"])
+            self.assertEqual([i["event"] for i in await brain.next_batch(1.0)], ["brain_response"])
+            self.assertEqual(await a.next_batch(0.05), [])
+            hub.unsubscribe(a)
+            self.assertEqual(hub.stats()["subscribers"], 3)
+
+        asyncio.run(_run())
+
+    def test_slow_subscriber_is_bounded_and_resumes_from_last_event_id(self):
+        lb = _import_log_broadcast()
+
+        async def _run():
+            hub = lb.LogBroadcaster(replay_size=50, queue_size=3)
+            slow = hub.subscribe()
+            for i in range(10):
+                hub.publish("tool_invoked", {"n": i})
+            for i in range(4):
+                hub.publish("program_output", {"id": "p", "stream": "stdout", "line": f"l{i}"})
+            batch = await slow.next_batch(1.0)
+            self.assertEqual(batch[0]["event"], "log_dropped")
+            self.assertGreater(batch[0]["data"]["dropped"], 0)
+            # Output lines that arrive while the queue is full are merged, not dropped.
+            last = batch[-1]
+            self.assertEqual(last["id"], 14)
+            self.assertEqual(last["data"]["line"].split("\n")[-2:], ["l2", "l3"])
+            self.assertLessEqual(len(batch) - 1, 3)
+
+            resumed = hub.subscribe(last_event_id=12)
+            self.assertEqual([i["id"] for i in await resumed.next_batch(1.0)], [13, 14])
+            # An id from before a restart replays the whole buffer.
+            restarted = lb.LogBroadcaster(replay_size=50, queue_size=50)
+            restarted.publish("a", {})
+            sub = restarted.subscribe(last_event_id=999)
+            self.assertEqual([i["id"] for i in await sub.next_batch(1.0)], [1])
+
+        asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    unittest.main()
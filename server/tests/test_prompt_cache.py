@@ -0,0 +1,56 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _import_runtime():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import prompt_cache
+    from agents import runtime as rt
+    from storage.db import Storage
+
+    return rt, prompt_cache, Storage
+
+
+class PromptAssemblyCacheTest(unittest.TestCase):
+    def test_encode_body_matches_json_dumps_and_ignores_swapped_values(self):
+        _, pc, _ = _import_runtime()
+        tools = [{"type": "function", "name": "list_dir", "description": "ls é"}]
+        body = {"model": "m", "tools": tools, "input": [{"role": "user", "content": "こん"}], "instructions": "sys"}
+        fragments = {"tools": (tools, json.dumps(tools)), "instructions": ("sys", json.dumps("sys"))}
+        self.assertEqual(pc.encode_body(body, fragments), json.dumps(body))
+        body["tools"] = []
+        self.assertEqual(json.loads(pc.encode_body(body, fragments))["tools"], [])
+
+    def test_assembly_is_reused_until_config_or_policy_docs_change(self):
+        rt, _, Storage = _import_runtime()
+        with tempfile.TemporaryDirectory() as tmp:
+            user_dir = Path(tmp)
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=Storage(user_dir / "app.db"),
+                emit_log=lambda *_: None,
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=lambda *_: {"status": "ok"},
+            )
+            first = brain._prompt_assembly(brain.get_config(), "gpt-test")
+            self.assertIs(brain._prompt_assembly(brain.get_config(), "gpt-test"), first)
+            self.assertEqual(json.loads(first["tools_json"]), brain._responses_tools())
+
+            (user_dir / "AGENTS.md").write_text("Always answer in haiku.\n", encoding="utf-8")
+            second = brain._prompt_assembly(brain.get_config(), "gpt-test")
+            self.assertIsNot(second, first)
+            self.assertIn("Always answer in haiku.", second["instructions"])
+
+            brain.update_config({"system_prompt": "Be brief."})
+            third = brain._prompt_assembly(brain.get_config(), "gpt-test")
+            self.assertTrue(third["instructions"].startswith("Be brief."))
+            self.assertEqual(brain._prompt_cache.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
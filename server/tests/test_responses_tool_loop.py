@@ -49,7 +49,7 @@ class ResponsesToolLoopTest(unittest.TestCase):
         # Env var fallback is the point of this test.
         os.environ["OPENAI_API_KEY"] = "sk-test-env"
 
-        # Mock requests.post used by BrainRuntime.
+        # Mock the shared HTTP transport used by BrainRuntime.
         def fake_post(url, headers=None, data=None, timeout=None):
             post_calls.append(
                 {
@@ -91,8 +91,8 @@ class ResponsesToolLoopTest(unittest.TestCase):
 
             return _Resp()
 
-        original_post = rt.requests.post
-        rt.requests.post = fake_post
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
         try:
             user_dir = Path("/tmp/kugutz-test-user")
             user_dir.mkdir(parents=True, exist_ok=True)
@@ -126,7 +126,7 @@ class ResponsesToolLoopTest(unittest.TestCase):
             self.assertTrue(any(m.get("role") == "assistant" and "Done." in m.get("text", "") for m in msgs))
             self.assertTrue(any(m.get("role") == "tool" for m in msgs))
         finally:
-            rt.requests.post = original_post
+            rt.transport.post = original_post
 
     def test_tool_output_truncated_for_large_read_file(self):
         server_dir = Path(__file__).resolve().parents[1]
@@ -184,8 +184,8 @@ class ResponsesToolLoopTest(unittest.TestCase):
 
             return _Resp()
 
-        original_post = rt.requests.post
-        rt.requests.post = fake_post
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
         try:
             user_dir = Path("/tmp/kugutz-test-user-truncate")
             user_dir.mkdir(parents=True, exist_ok=True)
@@ -223,7 +223,7 @@ class ResponsesToolLoopTest(unittest.TestCase):
             self.assertTrue(out.get("truncated_for_model") or "[truncated_for_model]" in (out.get("content") or ""))
             self.assertLessEqual(len(out.get("content") or ""), 5000)
         finally:
-            rt.requests.post = original_post
+            rt.transport.post = original_post
 
     def test_tool_policy_required_forces_function_call_when_model_returns_text_only(self):
         server_dir = Path(__file__).resolve().parents[1]
@@ -295,8 +295,8 @@ class ResponsesToolLoopTest(unittest.TestCase):
 
             return _Resp()
 
-        original_post = rt.requests.post
-        rt.requests.post = fake_post
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
         try:
             user_dir = Path("/tmp/kugutz-test-user")
             user_dir.mkdir(parents=True, exist_ok=True)
@@ -327,8 +327,508 @@ class ResponsesToolLoopTest(unittest.TestCase):
             self.assertFalse(any("Sure, I ran it." in (m.get("text") or "") for m in msgs))
             self.assertTrue(any("Done, output was 123." in (m.get("text") or "") for m in msgs))
         finally:
-            rt.requests.post = original_post
+            rt.transport.post = original_post
 
+    def test_streaming_shows_partial_text_and_runs_calls_before_response_completes(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        from agents import runtime as rt
+
+        storage = _FakeStorage()
+        shell_calls = []
+        post_calls = []
+        observed = {}
+        brain = None
+
+        def shell_exec(cmd: str, args: str, cwd: str):
+            shell_calls.append((cmd, args, cwd))
+            return {"status": "ok", "code": 0, "output": "123\n"}
+
+        def tool_invoke(tool: str, args: dict, request_id, detail: str):
+            return {"status": "ok", "tool": tool}
+
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+
+        def sse(event: dict):
+            return ["event: " + event["type"], "data: " + json.dumps(event), ""]
+
+        def round_one():
+            call = {
+                "type": "function_call",
+                "name": "shell_exec",
+                "call_id": "call_1",
+                "arguments": json.dumps({"cmd": "python", "args": "-c \"print(123)\"", "cwd": ""}),
+            }
+            yield from sse({"type": "response.created", "response": {"id": "resp_1"}})
+            yield from sse({"type": "response.output_text.delta", "output_index": 0, "delta": "Running "})
+            yield from sse({"type": "response.output_text.delta", "output_index": 0, "delta": "it now."})
+            msgs = brain.list_messages_for_session(session_id="s1", limit=50)
+            observed["draft"] = [m["text"] for m in msgs if (m.get("meta") or {}).get("streaming")]
+            yield from sse({"type": "response.output_item.done", "output_index": 1, "item": call})
+            # The call ran before the provider finished the response.
+            observed["calls_before_completed"] = len(shell_calls)
+            msg = {"type": "message", "content": [{"type": "output_text", "text": "Running it now."}]}
+            yield from sse({"type": "response.completed", "response": {"id": "resp_1", "output": [msg, call]}})
+
+        def round_two():
+            msg = {"type": "message", "content": [{"type": "output_text", "text": "Done, output was 123."}]}
+            yield from sse({"type": "response.output_text.delta", "output_index": 0, "delta": "Done, output was 123."})
+            yield from sse({"type": "response.output_item.done", "output_index": 0, "item": msg})
+            # Abbreviated completion: output is rebuilt from the item events.
+            yield from sse({"type": "response.completed", "response": {"id": "resp_2"}})
+
+        def fake_post(url, headers=None, data=None, timeout=None, stream=False):
+            body = json.loads(data or "{}")
+            post_calls.append({"body": body, "stream": stream})
+            lines = round_one() if len(post_calls) == 1 else round_two()
+
+            class _Resp:
+                headers = {"Content-Type": "text/event-stream"}
+
+                def raise_for_status(self):
+                    return None
+
+                def iter_lines(self, decode_unicode=False):
+                    return lines
+
+                def close(self):
+                    return None
+
+            return _Resp()
+
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            user_dir = Path("/tmp/kugutz-test-user-stream")
+            user_dir.mkdir(parents=True, exist_ok=True)
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=storage,
+                emit_log=lambda *_: None,
+                shell_exec=shell_exec,
+                tool_invoke=tool_invoke,
+            )
+            brain.update_config(
+                {
+                    "enabled": True,
+                    "stream": True,
+                    "model": "gpt-test",
+                    "provider_url": "https://api.openai.com/v1/responses",
+                    "api_key_credential": "openai_api_key",
+                }
+            )
+
+            item = {"id": "chat_4", "kind": "chat", "text": "Run python", "meta": {"session_id": "s1"}, "created_at": 0}
+            brain._process_with_responses_tools(item)
+
+            self.assertTrue(all(c["stream"] and c["body"].get("stream") is True for c in post_calls))
+            self.assertEqual(observed["draft"], ["Running it now."])
+            self.assertEqual(observed["calls_before_completed"], 1)
+            # Executed early, not a second time after the response completed.
+            self.assertEqual(len(shell_calls), 1)
+            input2 = post_calls[1]["body"].get("input") or []
+            self.assertTrue(any(isinstance(x, dict) and x.get("call_id") == "call_1" for x in input2))
+
+            msgs = brain.list_messages_for_session(session_id="s1", limit=50)
+            self.assertFalse(any((m.get("meta") or {}).get("streaming") for m in msgs))
+            self.assertTrue(any("Done, output was 123." in (m.get("text") or "") for m in msgs))
+        finally:
+            rt.transport.post = original_post
+
+    def test_independent_calls_in_one_round_run_concurrently_in_order(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        import threading
+        import time
+
+        from agents import runtime as rt
+
+        post_calls = []
+        running = {"now": 0, "peak": 0}
+        started_order = []
+        lock = threading.Lock()
+
+        def tool_invoke(tool: str, args: dict, request_id, detail: str):
+            return {"status": "ok", "action": args.get("action")}
+
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+        calls = [
+            ("read_file", {"path": "a.txt"}),
+            ("read_file", {"path": "b.txt"}),
+            # May pause for permission: ends the first run, so usb.list starts only after it.
+            ("device_api", {"action": "camera.status", "payload": {}, "detail": "status"}),
+            ("device_api", {"action": "usb.list", "payload": {}, "detail": "status"}),
+        ]
+
+        def fake_post(url, headers=None, data=None, timeout=None):
+            post_calls.append(json.loads(data or "{}"))
+            if len(post_calls) == 1:
+                output = [
+                    {"type": "function_call", "name": name, "call_id": f"call_{i}", "arguments": json.dumps(args)}
+                    for i, (name, args) in enumerate(calls)
+                ]
+            else:
+                output = [{"type": "message", "content": [{"type": "output_text", "text": "All good."}]}]
+
+            class _Resp:
+                def raise_for_status(self):
+                    return None
+
+                def json(self):
+                    return {"id": f"resp_{len(post_calls)}", "output": output}
+
+            return _Resp()
+
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            user_dir = Path("/tmp/kugutz-test-user-parallel")
+            user_dir.mkdir(parents=True, exist_ok=True)
+            (user_dir / "a.txt").write_text("A", encoding="utf-8")
+            (user_dir / "b.txt").write_text("B", encoding="utf-8")
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=_FakeStorage(),
+                emit_log=lambda *_: None,
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=tool_invoke,
+            )
+            brain.update_config(
+                {
+                    "enabled": True,
+                    "model": "gpt-test",
+                    "provider_url": "https://api.openai.com/v1/responses",
+                    "api_key_credential": "openai_api_key",
+                }
+            )
+            execute = brain._execute_function_tool
+
+            def slow_execute(item, name, args):
+                with lock:
+                    started_order.append(args.get("path") or args.get("action"))
+                    running["now"] += 1
+                    running["peak"] = max(running["peak"], running["now"])
+                time.sleep(0.3)
+                try:
+                    return execute(item, name, args)
+                finally:
+                    with lock:
+                        running["now"] -= 1
+
+            brain._execute_function_tool = slow_execute
+
+            started = time.monotonic()
+            brain._process_with_responses_tools({"id": "chat_5", "kind": "chat", "text": "status", "meta": {}})
+            elapsed = time.monotonic() - started
+
+            self.assertLess(elapsed, 1.0)
+            self.assertEqual(running["peak"], 3)
+            self.assertEqual(started_order[-1], "usb.list")
+            outputs = [x for x in post_calls[1].get("input") or [] if x.get("type") == "function_call_output"]
+            self.assertEqual([x["call_id"] for x in outputs], ["call_0", "call_1", "call_2", "call_3"])
+            self.assertEqual(json.loads(outputs[3]["output"])["action"], "usb.list")
+        finally:
+            rt.transport.post = original_post
+
+    def test_read_after_write_in_one_round_sees_the_write(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        import tempfile
+
+        from agents import runtime as rt
+
+        post_calls = []
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+        user_dir = Path(tempfile.mkdtemp(prefix="kugutz-test-rw-"))
+        (user_dir / "a.txt").write_text("OLD", encoding="utf-8")
+        calls = [
+            ("read_file", {"path": "a.txt"}),
+            ("write_file", {"path": "a.txt", "content": "NEW"}),
+            ("read_file", {"path": "a.txt"}),
+            ("list_dir", {"path": ""}),
+        ]
+
+        def fake_post(url, headers=None, data=None, timeout=None):
+            post_calls.append(json.loads(data or "{}"))
+            if len(post_calls) == 1:
+                output = [
+                    {"type": "function_call", "name": name, "call_id": f"call_{i}", "arguments": json.dumps(args)}
+                    for i, (name, args) in enumerate(calls)
+                ]
+            else:
+                output = [{"type": "message", "content": [{"type": "output_text", "text": "Done."}]}]
+
+            class _Resp:
+                def raise_for_status(self):
+                    return None
+
+                def json(self):
+                    return {"id": f"resp_{len(post_calls)}", "output": output}
+
+            return _Resp()
+
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=_FakeStorage(),
+                emit_log=lambda *_: None,
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=lambda *_: {"status": "ok"},
+            )
+            brain.update_config(
+                {
+                    "enabled": True,
+                    "model": "gpt-test",
+                    "provider_url": "https://api.openai.com/v1/responses",
+                    "api_key_credential": "openai_api_key",
+                }
+            )
+            brain._process_with_responses_tools({"id": "chat_rw", "kind": "chat", "text": "update a.txt", "meta": {}})
+
+            outputs = [json.loads(x["output"]) for x in post_calls[1]["input"] if x.get("type") == "function_call_output"]
+            self.assertEqual(outputs[0]["content"], "OLD")
+            self.assertEqual(outputs[2]["content"], "NEW")
+            tools = [m for m in brain.list_messages(limit=50) if m.get("role") == "tool"]
+            ops = [json.loads(m["text"])["action"].get("op") or json.loads(m["text"])["action"].get("type") for m in tools]
+            # The write is recorded before the run after it; calls within that run finish in any order.
+            self.assertEqual(ops[:2], ["read_file", "write_file"])
+            self.assertEqual(sorted(ops[2:]), ["list_dir", "read_file"])
+        finally:
+            rt.transport.post = original_post
+
+    def test_next_chat_item_chains_previous_response_and_rebuilds_when_rejected(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        import requests
+
+        from agents import runtime as rt
+
+        post_calls = []
+        reject = {"on": False}
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+
+        def fake_post(url, headers=None, data=None, timeout=None):
+            body = json.loads(data or "{}")
+            post_calls.append(body)
+            rejected = reject["on"] and bool(body.get("previous_response_id"))
+            idx = len(post_calls)
+
+            class _Resp:
+                status_code = 400 if rejected else 200
+
+                def raise_for_status(self):
+                    if rejected:
+                        raise requests.HTTPError("400 Client Error: previous response not found", response=self)
+
+                def json(self):
+                    text = f"Answer {idx}."
+                    return {"id": f"resp_{idx}", "output": [{"type": "message", "content": [{"type": "output_text", "text": text}]}]}
+
+            return _Resp()
+
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            user_dir = Path("/tmp/kugutz-test-user-chain")
+            user_dir.mkdir(parents=True, exist_ok=True)
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=_FakeStorage(),
+                emit_log=lambda *_: None,
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=lambda *_: {"status": "ok"},
+            )
+            brain.update_config(
+                {
+                    "enabled": True,
+                    "model": "gpt-test",
+                    "provider_url": "https://api.openai.com/v1/responses",
+                    "api_key_credential": "openai_api_key",
+                }
+            )
+
+            def chat(idx: int, text: str):
+                brain._process_with_responses_tools(
+                    {"id": f"chat_{idx}", "kind": "chat", "text": text, "meta": {"session_id": "s1"}}
+                )
+
+            chat(1, "What is 2+2?")
+            self.assertNotIn("previous_response_id", post_calls[0])
+            chat(2, "And 3+3?")
+            self.assertEqual(post_calls[1].get("previous_response_id"), "resp_1")
+            self.assertEqual(post_calls[1]["input"], [{"role": "user", "content": "And 3+3?"}])
+            self.assertTrue(post_calls[1].get("instructions") is not None)
+
+            # A message added outside the chain (e.g. a local ack) breaks it: full rebuild.
+            brain._record_message("assistant", "Noted.", {"session_id": "s1"})
+            chat(3, "Thanks")
+            self.assertNotIn("previous_response_id", post_calls[2])
+            self.assertGreater(len(post_calls[2]["input"]), 3)
+
+            # Provider rejects the chained id: retried once with the full conversation.
+            reject["on"] = True
+            chat(4, "Bye")
+            self.assertEqual(post_calls[3].get("previous_response_id"), "resp_3")
+            self.assertNotIn("previous_response_id", post_calls[4])
+            self.assertGreater(len(post_calls[4]["input"]), 3)
+            msgs = brain.list_messages_for_session(session_id="s1", limit=50)
+            self.assertEqual(msgs[-1]["text"], "Answer 5.")
+        finally:
+            rt.transport.post = original_post
+
+
+    def test_repeated_calls_are_memoized_and_a_call_loop_forces_finalization(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        import tempfile
+
+        from agents import runtime as rt
+
+        post_calls = []
+        logs = []
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+        user_dir = Path(tempfile.mkdtemp(prefix="kugutz-test-memo-"))
+        (user_dir / "photos").mkdir()
+
+        def fake_post(url, headers=None, data=None, timeout=None):
+            body = json.loads(data or "{}")
+            post_calls.append(body)
+            if len(post_calls) == 2:
+                # The directory changes between rounds 1 and 2: round 2 must list it again.
+                (user_dir / "photos" / "new.jpg").write_bytes(b"x")
+            if body.get("tool_choice") == "none":
+                output = [{"type": "message", "content": [{"type": "output_text", "text": "photos/ has new.jpg."}]}]
+            else:
+                output = [
+                    {
+                        "type": "function_call",
+                        "name": "list_dir",
+                        "call_id": f"call_{len(post_calls)}",
+                        "arguments": json.dumps({"path": "photos", "show_hidden": False, "limit": 50}),
+                    }
+                ]
+
+            class _Resp:
+                def raise_for_status(self):
+                    return None
+
+                def json(self):
+                    return {"id": f"resp_{len(post_calls)}", "output": output}
+
+            return _Resp()
+
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            brain = rt.BrainRuntime(
+                user_dir=user_dir,
+                storage=_FakeStorage(),
+                emit_log=lambda event, data: logs.append((event, data)),
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=lambda *_: {"status": "ok"},
+            )
+            brain.update_config(
+                {
+                    "enabled": True,
+                    "model": "gpt-test",
+                    "provider_url": "https://api.openai.com/v1/responses",
+                    "api_key_credential": "openai_api_key",
+                }
+            )
+            brain._process_with_responses_tools({"id": "chat_memo", "kind": "chat", "text": "what is in photos?", "meta": {}})
+
+            # Rounds 1-3 repeat the same call, then the finalization request (no tools) ends the item.
+            self.assertEqual(len(post_calls), 4)
+            self.assertEqual(post_calls[3].get("tool_choice"), "none")
+            self.assertIn("repeated the same tool calls", post_calls[3]["instructions"])
+            outputs = [json.loads(x["output"]) for body in post_calls[1:4] for x in body["input"] if x.get("type") == "function_call_output"]
+            self.assertEqual([o.get("memoized", False) for o in outputs], [False, False, True])
+            self.assertEqual([e["name"] for e in outputs[1]["entries"]], ["new.jpg"])
+            events = [e for e, _ in logs]
+            self.assertEqual(events.count("brain_action"), 2)
+            self.assertIn("brain_tool_loop_detected", events)
+            msgs = brain.list_messages(limit=50)
+            self.assertTrue(any(m.get("role") == "assistant" and "new.jpg" in m.get("text", "") for m in msgs))
+        finally:
+            rt.transport.post = original_post
+
+    def test_memo_is_consulted_after_earlier_writes_of_the_same_round(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        import tempfile
+
+        from agents import runtime as rt
+
+        post_calls = []
+        memory = {"content": "OLD"}
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+        rounds = [
+            [("memory_get", {})],
+            [("memory_set", {"content": "NEW"}), ("memory_get", {})],
+        ]
+
+        def tool_invoke(tool: str, args: dict, request_id, detail: str):
+            if args.get("action") == "brain.memory.set":
+                memory["content"] = args["payload"]["content"]
+            return {"status": "ok", "content": memory["content"]}
+
+        def fake_post(url, headers=None, data=None, timeout=None):
+            post_calls.append(json.loads(data or "{}"))
+            n = len(post_calls)
+            if n <= len(rounds):
+                output = [
+                    {"type": "function_call", "name": name, "call_id": f"call_{n}_{i}", "arguments": json.dumps(args)}
+                    for i, (name, args) in enumerate(rounds[n - 1])
+                ]
+            else:
+                output = [{"type": "message", "content": [{"type": "output_text", "text": "Saved."}]}]
+
+            class _Resp:
+                def raise_for_status(self):
+                    return None
+
+                def json(self):
+                    return {"id": f"resp_{n}", "output": output}
+
+            return _Resp()
+
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            brain = rt.BrainRuntime(
+                user_dir=Path(tempfile.mkdtemp(prefix="kugutz-test-memo-rw-")),
+                storage=_FakeStorage(),
+                emit_log=lambda *_: None,
+                shell_exec=lambda *_: {"status": "ok"},
+                tool_invoke=tool_invoke,
+            )
+            brain.update_config(
+                {
+                    "enabled": True,
+                    "model": "gpt-test",
+                    "provider_url": "https://api.openai.com/v1/responses",
+                    "api_key_credential": "openai_api_key",
+                }
+            )
+            brain._process_with_responses_tools(
+                {"id": "chat_memo_rw", "kind": "chat", "text": "save NEW to memory", "meta": {}}
+            )
+
+            outputs = [
+                json.loads(x["output"]) for body in post_calls[1:3] for x in body["input"] if x.get("type") == "function_call_output"
+            ]
+            self.assertEqual([o["content"] for o in outputs], ["OLD", "NEW", "NEW"])
+            self.assertFalse(outputs[2].get("memoized", False))
+        finally:
+            rt.transport.post = original_post
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,91 @@
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+def _import_db():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage import db
+
+    return db
+
+
+def _plan(storage, sql, params=()):
+    rows = storage._connect().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return " ".join(r["detail"] for r in rows)
+
+
+class SchemaMigrationsTest(unittest.TestCase):
+    def test_new_database_is_current_and_reopens_without_ddl(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            storage = db.Storage(Path(td) / "app.db")
+            self.assertEqual(storage._connect().execute("PRAGMA user_version").fetchone()["user_version"], db.SCHEMA_VERSION)
+            self.assertIn(
+                "idx_permissions_status",
+                _plan(storage, "SELECT * FROM permissions WHERE status = 'pending' ORDER BY created_at"),
+            )
+            self.assertIn("idx_audit_log_created", _plan(storage, "SELECT id FROM audit_log WHERE created_at < ?", (1,)))
+            storage.close()
+
+            with mock.patch.object(db.Storage, "_migrate", side_effect=AssertionError("migrated again")):
+                storage = db.Storage(Path(td) / "app.db")
+            self.assertTrue(storage._fts)
+            storage.add_chat_message("s", "user", "hello", {})
+            self.assertEqual(len(storage.search_history("hello")["results"]), 1)
+            storage.close()
+
+    def test_unversioned_database_is_upgraded_and_backfilled_in_batches(self):
+        db = _import_db()
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "app.db"
+            conn = sqlite3.connect(path)
+            conn.execute(
+                "CREATE TABLE permissions (id TEXT PRIMARY KEY, tool TEXT, detail TEXT, status TEXT, scope TEXT, "
+                "expires_at INTEGER, created_at INTEGER)"
+            )
+            conn.execute(
+                "CREATE TABLE chat_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, role TEXT, "
+                "text TEXT, meta TEXT, created_at INTEGER)"
+            )
+            conn.execute("INSERT INTO permissions VALUES ('p_1', 'camera', '', 'pending', 'once', NULL, 1)")
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, role, text, meta, created_at) VALUES ('s', 'tool', ?, ?, 0)",
+                [(f"m{i}", f'{{"item_id": "i{i}"}}') for i in range(4)] + [("m4", '{"item_id": "i4", "error": "boom"}')],
+            )
+            conn.commit()
+            conn.close()
+
+            with mock.patch.object(db, "BACKFILL_BATCH", 2), mock.patch.object(db.Storage, "_start_backfills"):
+                storage = db.Storage(path)
+                self.assertEqual([p["id"] for p in storage.get_pending_permissions()], ["p_1"])
+                self.assertEqual(len(storage.list_chat_sessions()), 1)
+                # Written after the upgrade, so not part of the backfill.
+                storage.add_chat_message("s", "tool", "new", {"item_id": "i9", "extra": 1})
+
+                self.assertTrue(storage._write(storage._backfill_step))
+                rows = storage.list_chat_messages("s")
+                self.assertEqual([r["item_id"] for r in rows], ["i0", "i1", None, None, None, "i9"])
+                self.assertEqual([db.chat_meta(r)["item_id"] for r in rows], ["i0", "i1", "i2", "i3", "i4", "i9"])
+                # The filters still see rows the backfill has not reached.
+                for item_id, texts in (("i1", ["m1"]), ("i3", ["m3"]), ("i9", ["new"])):
+                    self.assertEqual([r["text"] for r in storage.list_chat_messages("s", item_id=item_id)], texts)
+                self.assertEqual([r["text"] for r in storage.list_chat_messages("s", errors_only=True)], ["m4"])
+
+                storage.run_backfills()
+                rows = storage.list_chat_messages("s")
+                self.assertEqual([r["item_id"] for r in rows], ["i0", "i1", "i2", "i3", "i4", "i9"])
+                self.assertEqual(rows[-1]["meta"], '{"extra": 1}')
+                self.assertEqual([r["text"] for r in storage.list_chat_messages("s", item_id="i3")], ["m3"])
+                self.assertEqual([r["text"] for r in storage.list_chat_messages("s", errors_only=True)], ["m4"])
+                self.assertIsNone(storage._connect().execute("SELECT * FROM schema_backfills").fetchone())
+                storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import io
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+
+def _import_shell():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from tools import shell
+
+    return shell
+
+
+class CapturedOutputTest(unittest.TestCase):
+    def test_concurrent_run_python_calls_keep_their_own_output(self):
+        shell = _import_shell()
+        original = sys.stdout
+        outputs = {}
+        start = threading.Barrier(2)
+
+        def run_python(name: str) -> None:
+            # What shell_exec does for `python -c ...`: exec the code with output captured.
+            code = f"import time\nfor i in range(5):\n    print('{name}', i)\n    time.sleep(0.01)\n"
+            buffer = io.StringIO()
+            start.wait()
+            with shell.captured_output(buffer):
+                exec(code, {"__name__": "__main__"})
+            outputs[name] = buffer.getvalue()
+
+        threads = [threading.Thread(target=run_python, args=(name,)) for name in ("a", "b")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for name in ("a", "b"):
+            self.assertEqual(outputs[name], "".join(f"{name} {i}\n" for i in range(5)))
+        self.assertIs(sys.stdout, original)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+
+def _import_storage():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from storage.db import Storage
+
+    return Storage
+
+
+class StorageConnectionsTest(unittest.TestCase):
+    def test_concurrent_writers_share_one_writer_and_readers_see_commits(self):
+        Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            ids = []
+
+            def _chat(t):
+                for i in range(50):
+                    ids.append(storage.add_chat_message(f"s{t}", "user", f"m{i}", "{}"))
+                    storage.add_audit("tool_invoked", f'{{"t": {t}, "i": {i}}}')
+                    # A write is visible to this thread's reader as soon as it returns.
+                    self.assertEqual(storage.list_chat_messages(f"s{t}", limit=1)[0]["text"], f"m{i}")
+
+            threads = [threading.Thread(target=_chat, args=(t,)) for t in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            self.assertEqual(len(set(ids)), 300)
+            self.assertEqual(len(storage.get_audit(limit=1000)), 300)
+            self.assertEqual(sorted(s["count"] for s in storage.list_chat_sessions()), [50] * 6)
+            conn = storage._connect()
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()["journal_mode"], "wal")
+            self.assertIs(storage._connect(), conn)
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM settings")
+            storage.close()
+
+    def test_release_connection_closes_the_thread_reader(self):
+        Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            storage.set_setting("a", "1")
+            conn = storage._connect()
+            storage.release_connection()
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+            storage.release_connection()
+            self.assertEqual(storage.get_setting("a"), "1")
+            self.assertIsNot(storage._connect(), conn)
+            storage.close()
+
+    def test_failing_write_is_isolated_and_writes_after_close_still_land(self):
+        Storage = _import_storage()
+        with tempfile.TemporaryDirectory() as td:
+            storage = Storage(Path(td) / "app.db")
+            storage.set_setting("a", "1")
+
+            def _bad(conn):
+                conn.execute("INSERT INTO settings (key, value, updated_at) VALUES ('b', '2', 0)")
+                conn.execute("INSERT INTO no_such_table VALUES (1)")
+
+            with self.assertRaises(sqlite3.OperationalError):
+                storage._write(_bad)
+            self.assertIsNone(storage.get_setting("b"))
+            self.assertEqual(storage.get_setting("a"), "1")
+
+            storage.close()
+            storage.set_setting("c", "3")
+            self.assertEqual(storage.get_setting("c"), "3")
+
+
+if __name__ == "__main__":
+    unittest.main()
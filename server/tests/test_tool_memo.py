@@ -0,0 +1,58 @@
+import sys
+import unittest
+from pathlib import Path
+
+
+def _import_tool_memo():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import tool_memo
+
+    return tool_memo
+
+
+class ToolCallMemoTest(unittest.TestCase):
+    def _memo(self, tm, **kw):
+        return tm.ToolCallMemo(is_idempotent=lambda name, args: name in {"read_file", "web_search"}, **kw)
+
+    def test_results_are_reused_until_a_side_effect_or_changed_fingerprint(self):
+        tm = _import_tool_memo()
+        stamps = {"a.txt": "1"}
+        memo = self._memo(tm, fingerprint=lambda name, args: stamps.get(args.get("path"), ""))
+        memo.put("read_file", {"path": "a.txt", "max_bytes": 10}, {"status": "ok", "content": "hi"})
+        hit = memo.get("read_file", {"max_bytes": 10, "path": "a.txt"})
+        self.assertEqual(hit, {"status": "ok", "content": "hi", "memoized": True})
+
+        stamps["a.txt"] = "2"
+        self.assertIsNone(memo.get("read_file", {"path": "a.txt", "max_bytes": 10}))
+
+        memo.put("web_search", {"query": "x"}, {"status": "ok", "results": []})
+        memo.put("write_file", {"path": "b.txt", "content": ""}, {"status": "ok"})
+        self.assertIsNone(memo.get("web_search", {"query": "x"}))
+
+        memo.put("web_search", {"query": "y"}, {"status": "error", "error": "timeout"})
+        self.assertIsNone(memo.get("web_search", {"query": "y"}))
+        self.assertEqual(memo.hits, 1)
+
+    def test_repeated_round_blocks_are_detected_and_sleep_resets(self):
+        tm = _import_tool_memo()
+        memo = self._memo(tm, loop_repeats=3)
+        a = [("read_file", {"path": "a"})]
+        b = [("web_search", {"query": "q"}), ("read_file", {"path": "b"})]
+        self.assertEqual([memo.note_round(r) for r in (a, b, a, b, a)], [False] * 5)
+        self.assertTrue(memo.note_round(list(reversed(b))))
+
+        memo = self._memo(tm, loop_repeats=3)
+        self.assertFalse(memo.note_round(a))
+        self.assertFalse(memo.note_round(a))
+        self.assertFalse(memo.note_round([("sleep", {"seconds": 1})]))
+        self.assertFalse(memo.note_round(a))
+        self.assertFalse(memo.note_round(a))
+        self.assertTrue(memo.note_round(a))
+
+        self.assertFalse(any(self._memo(tm, loop_repeats=0).note_round(a) for _ in range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _import_runtime():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import runtime as rt
+    from agents import tool_select
+    from storage.db import Storage
+
+    return rt, tool_select, Storage
+
+
+class ToolSelectionTest(unittest.TestCase):
+    def _brain(self, rt, Storage, user_dir):
+        return rt.BrainRuntime(
+            user_dir=user_dir,
+            storage=Storage(user_dir / "app.db"),
+            emit_log=lambda *_: None,
+            shell_exec=lambda *_: {"status": "ok"},
+            tool_invoke=lambda *_: {"status": "ok"},
+        )
+
+    def test_selection_follows_request_text_and_recent_usage(self):
+        rt, ts, Storage = _import_runtime()
+        with tempfile.TemporaryDirectory() as tmp:
+            all_tools = self._brain(rt, Storage, Path(tmp))._responses_tools()
+        notes = ts.select_tools(all_tools, text="What did I say earlier about the trip?")
+        names = {t["name"] for t in notes.tools()}
+        self.assertIn("read_file", names)
+        self.assertNotIn("device_api", names)
+        self.assertNotIn("run_python", names)
+        self.assertIn(ts.REQUEST_TOOLS, names)
+
+        photo = ts.select_tools(all_tools, text="Take a photo", recent=["device_api:usb.list"])
+        device = next(t for t in photo.tools() if t["name"] == "device_api")
+        actions = device["parameters"]["properties"]["action"]["enum"]
+        self.assertIn("camera.capture", actions)
+        self.assertIn("usb.list", actions)
+        self.assertNotIn("ssh.status", actions)
+
+        # A clearly tool-needing request that matches no group gets every tool.
+        self.assertTrue(ts.select_tools(all_tools, text="check status", needs_tool=True).full)
+
+        # Calling a filtered-out action or asking via request_tools widens the set.
+        self.assertEqual(photo.note_call("device_api", {"action": "ssh.status"}), ["device:ssh"])
+        self.assertEqual(photo.handle_request({"groups": ["code"]})["enabled"], ["code"])
+        self.assertIn("run_python", photo.names())
+        self.assertEqual(photo.version, 2)
+
+    def test_tool_loop_adds_requested_tools_for_the_next_round(self):
+        rt, _, Storage = _import_runtime()
+        posts = []
+        replies = [
+            {"id": "r1", "output": [{"type": "function_call", "name": "request_tools", "call_id": "c1", "arguments": json.dumps({"groups": ["code"]})}]},
+            {"id": "r2", "output": [{"type": "message", "content": [{"type": "output_text", "text": "Done."}]}]},
+        ]
+
+        def fake_post(url, headers=None, data=None, timeout=None, **_):
+            posts.append(json.loads(data))
+            payload = replies[len(posts) - 1]
+
+            class _Resp:
+                def raise_for_status(self):
+                    return None
+
+                def json(self):
+                    return payload
+
+            return _Resp()
+
+        os.environ["OPENAI_API_KEY"] = "sk-test-env"
+        original_post = rt.transport.post
+        rt.transport.post = fake_post
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                brain = self._brain(rt, Storage, Path(tmp))
+                brain.update_config({"model": "gpt-test", "provider_url": "https://api.openai.com/v1/responses"})
+                brain._process_with_responses_tools({"id": "chat_1", "kind": "chat", "text": "hello there", "meta": {}})
+        finally:
+            rt.transport.post = original_post
+        first = {t["name"] for t in posts[0]["tools"]}
+        second = {t["name"] for t in posts[1]["tools"]}
+        self.assertNotIn("run_python", first)
+        self.assertIn("run_python", second)
+        output = json.loads(posts[1]["input"][0]["output"])
+        self.assertEqual(output["enabled"], ["code"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import base64
+import json
+import sys
+import unittest
+from pathlib import Path
+
+
+def _import_tool_summaries():
+    server_dir = Path(__file__).resolve().parents[1]
+    if str(server_dir) not in sys.path:
+        sys.path.insert(0, str(server_dir))
+    from agents import tool_summaries
+
+    return tool_summaries
+
+
+class ToolSummariesTest(unittest.TestCase):
+    def test_small_results_and_unknown_tools_pass_through(self):
+        ts = _import_tool_summaries()
+        small = {"status": "ok", "path": "/u", "entries": [{"name": "a.txt", "type": "file", "size": 1, "mtime": 1}]}
+        self.assertIs(ts.summarize_tool_result("list_dir", {}, small), small)
+        other = {"status": "ok", "content": "x" * 10000}
+        self.assertIs(ts.summarize_tool_result("read_file", {}, other), other)
+
+    def test_large_listing_is_aggregated(self):
+        ts = _import_tool_summaries()
+        entries = [{"name": f"f{i}.jpg", "type": "file", "size": i, "mtime": i} for i in range(300)]
+        entries += [{"name": f"d{i}", "type": "dir", "size": 0, "mtime": 0} for i in range(5)]
+        out = ts.summarize_tool_result("list_dir", {}, {"status": "ok", "path": "/u", "entries": entries})
+        self.assertEqual(len(out["entries"]), ts.LIST_DIR_KEEP)
+        self.assertEqual(out["omitted_entries"], 305 - ts.LIST_DIR_KEEP)
+        summary = out["summary"]
+        self.assertEqual((summary["files"], summary["dirs"]), (300, 5))
+        self.assertEqual(summary["by_extension"]["jpg"], {"count": 300, "bytes": sum(range(300))})
+        self.assertEqual(summary["largest"][0]["name"], "f299.jpg")
+
+    def test_usb_descriptors_are_parsed_into_a_tree(self):
+        ts = _import_tool_summaries()
+        raw = bytes(
+            [18, 0x01, 0x00, 0x02, 0xEF, 0x02, 0x01, 64, 0x6D, 0x04, 0x5E, 0x08, 0, 0, 1, 2, 3, 1]
+            + [9, 0x02, 32, 0, 1, 1, 0, 0x80, 250]
+            + [9, 0x04, 0, 0, 1, 0x0E, 0x01, 0, 0]
+            + [5, 0x24, 0x01, 0x00, 0x01]
+            + [7, 0x05, 0x83, 0x03, 16, 0, 8]
+        )
+        result = {"status": "ok", "http_status": 200, "body": {"status": "ok", "data_b64": base64.b64encode(raw).decode(), "length": len(raw)}}
+        out = ts.summarize_tool_result("device_api", {"action": "usb.raw_descriptors"}, result)
+        self.assertNotIn("data_b64", out["body"])
+        tree = out["body"]["descriptors"]
+        self.assertEqual(tree["device"]["vendor_id"], "0x046d")
+        self.assertEqual(tree["device"]["product_id"], "0x085e")
+        config = tree["configurations"][0]
+        self.assertEqual(config["max_power_ma"], 500)
+        intf = config["interfaces"][0]
+        self.assertEqual((intf["class"], intf["subclass"]), (0x0E, 0x01))
+        self.assertEqual(intf["class_specific"], {"0x24/0x01": 1})
+        self.assertEqual(intf["endpoints"][0], {"address": "0x83", "direction": "in", "type": "interrupt", "max_packet_size": 16, "interval": 8})
+
+    def test_vision_outputs_keep_shape_and_top_k(self):
+        ts = _import_tool_summaries()
+        values = [0.001 * i for i in range(1001)]
+        values[417] = 9.5
+        body = {"model": "m", "outputs": [{"index": 0, "shape": [1, 1001], "dtype": "FLOAT32", "value": values}]}
+        out = ts.summarize_tool_result("device_api", {"action": "vision.run"}, {"status": "ok", "body": body})
+        tensor = out["body"]["outputs"][0]
+        self.assertNotIn("value", tensor)
+        self.assertEqual(tensor["shape"], [1, 1001])
+        self.assertEqual(tensor["count"], 1001)
+        self.assertEqual(tensor["top_k"][0], {"index": 417, "value": 9.5})
+        self.assertEqual(len(tensor["top_k"]), ts.TENSOR_TOP_K)
+        self.assertEqual(body["outputs"][0]["value"], values)
+
+    def test_python_output_keeps_tail_and_error_lines(self):
+        ts = _import_tool_summaries()
+        lines = [f"progress {i}" for i in range(500)]
+        lines[10] = "ValueError: bad input"
+        result = {"status": "ok", "code": 1, "output": "\n".join(lines)}
+        out = ts.summarize_tool_result("run_python", {"args": "x.py"}, result)
+        self.assertEqual(out["code"], 1)
+        self.assertEqual(out["error_lines"], ["ValueError: bad input"])
+        self.assertTrue(out["output_tail"].endswith("progress 499"))
+        self.assertLess(len(json.dumps(out)), 2500)
+
+
+if __name__ == "__main__":
+    unittest.main()
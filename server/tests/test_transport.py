@@ -0,0 +1,106 @@
+import json
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    peers = []
+    dropped = []
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        sent = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        _Handler.peers.append(self.client_address)
+        if self.path == "/bye":
+            # Answer as if keeping the connection alive, then close it.
+            self.close_connection = True
+        if self.path == "/drop":
+            # Read the request, then close the kept-alive connection without answering.
+            _Handler.dropped.append(self.command)
+            self.close_connection = True
+            return
+        status = 404 if self.path == "/missing" else 200
+        body = json.dumps({"path": self.path, "sent": sent, "identity": self.headers.get("X-Kugutz-Identity")}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):
+        return
+
+
+class HttpTransportTest(unittest.TestCase):
+    def setUp(self):
+        server_dir = Path(__file__).resolve().parents[1]
+        if str(server_dir) not in sys.path:
+            sys.path.insert(0, str(server_dir))
+        _Handler.peers = []
+        _Handler.dropped = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_json_calls_reuse_one_kept_alive_connection(self):
+        import transport
+
+        t = transport.HttpTransport(retries=1)
+        try:
+            for i in range(5):
+                code, body = t.request_json("POST", self.base + "/a", {"i": i}, headers={"X-Kugutz-Identity": "s1"})
+                self.assertEqual((code, body["sent"], body["identity"]), (200, {"i": i}, "s1"))
+            code, body = t.request_json("GET", self.base + "/missing")
+            self.assertEqual((code, body["path"]), (404, "/missing"))
+            # Same client socket for every JSON request.
+            self.assertEqual(len(set(_Handler.peers)), 1)
+            for _ in range(3):
+                self.assertEqual(t.post(self.base + "/b", data="{}", timeout=5).json()["path"], "/b")
+            self.assertEqual(len(set(_Handler.peers)), 2)
+
+            # Reconfiguring rebuilds the pools.
+            t.configure(pool_maxsize=2)
+            t.request_json("GET", self.base + "/c")
+            self.assertEqual(len(set(_Handler.peers)), 3)
+        finally:
+            t.close()
+
+    def test_client_does_not_resend_a_post_the_server_may_have_run(self):
+        lib_dir = Path(__file__).resolve().parents[2] / "user" / "lib"
+        if str(lib_dir) not in sys.path:
+            sys.path.insert(0, str(lib_dir))
+        from kugutz.client import KugutzClient
+
+        client = KugutzClient(self.base)
+        try:
+            self.assertTrue(client.request_json("GET", "/a")["ok"])
+            # Sent on the kept-alive connection, which then drops: a POST is not repeated.
+            self.assertFalse(client.request_json("POST", "/drop", {"action": "camera.capture"})["ok"])
+            self.assertEqual(_Handler.dropped, ["POST"])
+            self.assertTrue(client.request_json("GET", "/a")["ok"])
+            # A GET is retried once on a fresh connection.
+            self.assertFalse(client.request_json("GET", "/drop")["ok"])
+            self.assertEqual(_Handler.dropped, ["POST", "GET", "GET"])
+            # A connection the server closed while idle is replaced before the POST is sent.
+            self.assertTrue(client.request_json("GET", "/bye")["ok"])
+            time.sleep(0.1)
+            self.assertEqual(client.request_json("POST", "/a", {"i": 1})["json"]["sent"], {"i": 1})
+        finally:
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
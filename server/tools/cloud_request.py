@@ -1,10 +1,10 @@
-import json
 import os
+import threading
 import time
-import urllib.error
-import urllib.request
 from typing import Any, Dict
 
+import transport
+
 
 class CloudRequestTool:
     """
@@ -17,43 +17,40 @@ class CloudRequestTool:
     def __init__(self, base_url: str = "http://127.0.0.1:8765"):
         self.base_url = base_url.rstrip("/")
         self._identity = (os.environ.get("KUGUTZ_IDENTITY") or os.environ.get("KUGUTZ_SESSION_ID") or "").strip() or "default"
+        # Per-call identity (thread-local): the instance is shared by brain workers of different sessions.
+        self._call = threading.local()
 
     def set_identity(self, identity: str) -> None:
+        """Set the default identity used when a call doesn't carry one."""
         self._identity = str(identity or "").strip() or "default"
 
+    def _current_identity(self) -> str:
+        return str(getattr(self._call, "identity", "") or self._identity)
+
     def _request_json(self, method: str, path: str, body: Dict[str, Any] | None, *, timeout_s: float = 120.0) -> Dict[str, Any]:
-        url = self.base_url + path
-        data = None
-        headers = {"Accept": "application/json"}
-        if body is not None:
-            data = json.dumps(body).encode("utf-8")
-            headers["Content-Type"] = "application/json"
-        if self._identity:
-            headers["X-Kugutz-Identity"] = self._identity
-        req = urllib.request.Request(url, data=data, headers=headers, method=method)
+        headers: Dict[str, str] = {}
+        identity = self._current_identity()
+        if identity:
+            headers["X-Kugutz-Identity"] = identity
         try:
-            with urllib.request.urlopen(req, timeout=float(timeout_s)) as resp:
-                raw = resp.read()
-                try:
-                    parsed = json.loads(raw.decode("utf-8")) if raw else {}
-                except Exception:
-                    parsed = {"raw": raw.decode("utf-8", errors="replace")}
-                return {"status": "ok", "http_status": resp.status, "body": parsed}
-        except urllib.error.HTTPError as e:
-            raw = e.read()
-            try:
-                parsed = json.loads(raw.decode("utf-8")) if raw else {}
-            except Exception:
-                parsed = {"raw": raw.decode("utf-8", errors="replace")}
-            return {"status": "ok", "http_status": e.code, "body": parsed}
+            code, parsed = transport.shared().request_json(
+                method, self.base_url + path, body, headers=headers, timeout_s=float(timeout_s)
+            )
         except Exception as e:
             return {"status": "error", "error": "request_failed", "detail": str(e)}
+        # HTTP errors are returned as-is; the caller inspects http_status.
+        return {"status": "ok", "http_status": code, "body": parsed}
 
     def run(self, args: Dict[str, Any]) -> Dict[str, Any]:
         identity = str(args.get("identity") or args.get("session_id") or "").strip()
-        if identity:
-            self.set_identity(identity)
+        prev = getattr(self._call, "identity", "")
+        self._call.identity = identity
+        try:
+            return self._run(args)
+        finally:
+            self._call.identity = prev
 
+    def _run(self, args: Dict[str, Any]) -> Dict[str, Any]:
         req = args.get("request")
         payload = req if isinstance(req, dict) else args
         if not isinstance(payload, dict):
@@ -80,8 +77,9 @@ class CloudRequestTool:
 
         def do(pid: str) -> Dict[str, Any]:
             p = dict(payload)
-            if self._identity and "identity" not in p:
-                p["identity"] = self._identity
+            identity = self._current_identity()
+            if identity and "identity" not in p:
+                p["identity"] = identity
             if pid:
                 p["permission_id"] = pid
             return self._request_json("POST", "/cloud/request", p, timeout_s=tool_timeout_s)
@@ -3,10 +3,11 @@ import os
 import time
 import base64
 import struct
-import urllib.error
-import urllib.request
+import threading
 from typing import Any, Dict, Optional
 
+import transport
+
 
 class DeviceApiTool:
     _ACTIONS: Dict[str, Dict[str, Any]] = {
@@ -73,10 +74,14 @@ class DeviceApiTool:
     def __init__(self, base_url: str = "http://127.0.0.1:8765"):
         self.base_url = base_url.rstrip("/")
         self._identity = (os.environ.get("KUGUTZ_IDENTITY") or os.environ.get("KUGUTZ_SESSION_ID") or "").strip() or "default"
-        # Cache approvals (in-memory). Kotlin also reuses approvals server-side by identity/capability.
+        # Per-call identity. One tool instance is shared by brain workers serving different sessions,
+        # so the identity of the call in flight is thread-local rather than instance state.
+        self._call = threading.local()
+        # Cache approvals (in-memory), keyed by identity. Kotlin also reuses approvals server-side by
+        # identity/capability.
         self._permission_ids: Dict[str, str] = {}
         # Conservative defaults: a few device actions can legitimately take longer than the tool runner
-        # or urllib's default timeout.
+        # or the HTTP client's default timeout.
         self._action_timeout_s: Dict[str, float] = {
             "camera.capture": 45.0,
             "camera.preview.start": 25.0,
@@ -90,8 +95,12 @@ class DeviceApiTool:
         }
 
     def set_identity(self, identity: str) -> None:
+        """Set the default identity used when a call doesn't carry one."""
         self._identity = str(identity or "").strip() or "default"
 
+    def _current_identity(self) -> str:
+        return str(getattr(self._call, "identity", "") or self._identity)
+
     def _wait_for_permission(self, permission_id: str, *, timeout_s: float = 45.0, poll_s: float = 0.8) -> str:
         pid = str(permission_id or "").strip()
         if not pid:
@@ -109,19 +118,20 @@ class DeviceApiTool:
         return "timeout"
 
     def run(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        # Prefer per-chat identity if provided so approvals can be remembered for the session.
+        # Fallback is install identity from env (shared across sessions).
+        identity = str(args.get("identity") or args.get("session_id") or "").strip() if isinstance(args, dict) else ""
+        prev = getattr(self._call, "identity", "")
+        self._call.identity = identity
         try:
             return self._run(args)
         except Exception as ex:
             # Never let exceptions bubble into the agent loop; surface as a normal tool error.
             return {"status": "error", "error": "device_api_exception", "detail": str(ex)}
+        finally:
+            self._call.identity = prev
 
     def _run(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        # Prefer per-chat identity if provided so approvals can be remembered for the session.
-        # Fallback is install identity from env (shared across sessions).
-        identity = str(args.get("identity") or args.get("session_id") or "").strip()
-        if identity:
-            self.set_identity(identity)
-
         action = str(args.get("action") or "").strip()
         if not action:
             return {"status": "error", "error": "missing_action"}
@@ -412,7 +422,7 @@ class DeviceApiTool:
 
     def _get_or_request_permission(self, tool: str, capability: str, scope: str, detail: str) -> tuple[str, Dict[str, Any]]:
         # If we already have an approved permission id, keep using it.
-        cache_key = f"{tool}::{capability}::{scope}"
+        cache_key = f"{self._current_identity()}::{tool}::{capability}::{scope}"
         cached = self._permission_ids.get(cache_key, "")
         if cached and self._is_approved(cached):
             return cached, {"id": cached, "status": "approved"}
@@ -449,7 +459,7 @@ class DeviceApiTool:
                 "detail": detail,
                 # "once" makes agent usage unbearable; keep a short-lived approval.
                 "scope": scope,
-                "identity": self._identity,
+                "identity": self._current_identity(),
                 "capability": capability,
             },
         )
@@ -459,25 +469,16 @@ class DeviceApiTool:
         return body if isinstance(body, dict) else {"status": "error", "error": "invalid_permission_response"}
 
     def _request_json(self, method: str, path: str, body: Optional[Dict[str, Any]] = None, *, timeout_s: float = 12.0) -> Dict[str, Any]:
-        data = None
-        headers = {"Accept": "application/json"}
-        if body is not None:
-            data = json.dumps(body).encode("utf-8")
-            headers["Content-Type"] = "application/json"
-        if self._identity:
-            headers["X-Kugutz-Identity"] = self._identity
-        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        headers: Dict[str, str] = {}
+        identity = self._current_identity()
+        if identity:
+            headers["X-Kugutz-Identity"] = identity
         try:
-            with urllib.request.urlopen(req, timeout=float(timeout_s)) as resp:
-                raw = resp.read().decode("utf-8", errors="replace")
-                parsed = json.loads(raw) if raw else {}
-                return {"status": "ok", "http_status": int(resp.status), "body": parsed}
-        except urllib.error.HTTPError as ex:
-            raw = ex.read().decode("utf-8", errors="replace")
-            try:
-                parsed = json.loads(raw) if raw else {}
-            except Exception:
-                parsed = {"raw": raw}
-            return {"status": "http_error", "http_status": int(ex.code), "body": parsed}
+            code, parsed = transport.shared().request_json(
+                method, self.base_url + path, body, headers=headers, timeout_s=float(timeout_s)
+            )
         except Exception as ex:
             return {"status": "error", "error": str(ex)}
+        if code >= 400:
+            return {"status": "http_error", "http_status": code, "body": parsed}
+        return {"status": "ok", "http_status": code, "body": parsed}
@@ -1,5 +1,20 @@
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, TextIO
+import contextlib
 import subprocess
+import threading
+
+
+# python/pip/curl (shell_exec) run in-process: their output is captured by swapping the
+# process-wide sys.stdout/sys.stderr, and pip rewrites os.environ. Brain workers and HTTP handler
+# threads can start them concurrently, so only one runs at a time.
+IN_PROCESS_EXEC_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def captured_output(buffer: TextIO) -> Iterator[None]:
+    """Redirect stdout/stderr into buffer while holding IN_PROCESS_EXEC_LOCK."""
+    with IN_PROCESS_EXEC_LOCK, contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        yield
 
 
 class ShellTool:
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import urllib.request
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name) or default)
+    except Exception:
+        return default
+
+
+class HttpTransport:
+    """
+    Shared keep-alive HTTP transport for the brain, tools and control-plane helpers.
+
+    One requests.Session with a per-host connection pool: provider calls reuse their TLS connection
+    across tool rounds and the many small calls to the Kotlin control plane (127.0.0.1:8765) reuse
+    their TCP connection instead of opening one per request.
+
+    Retries only cover failures where the request could not have been processed: connection errors
+    (any method) and dropped/reset keep-alive connections on idempotent methods. HTTP error statuses
+    are returned to the caller as-is.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff_factor: float = 0.2,
+    ):
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._adapter: Optional[HTTPAdapter] = None
+        self._retry: Optional[Retry] = None
+        self._settings: Dict[str, Any] = {
+            # Number of distinct hosts whose pools are kept (control plane + provider + a few others).
+            "pool_connections": pool_connections or _env_int("KUGUTZ_HTTP_POOL_CONNECTIONS", 4),
+            # Kept-alive connections per host; size for brain workers + parallel tool calls.
+            "pool_maxsize": pool_maxsize or _env_int("KUGUTZ_HTTP_POOL_MAXSIZE", 8),
+            "retries": _env_int("KUGUTZ_HTTP_RETRIES", 1) if retries is None else retries,
+            "backoff_factor": backoff_factor,
+        }
+
+    def settings(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._settings)
+
+    def configure(self, **changes: Any) -> Dict[str, Any]:
+        """Update pool/retry settings; the session is rebuilt lazily on the next request."""
+        with self._lock:
+            changed = False
+            for key, value in changes.items():
+                if key in self._settings and value is not None and self._settings[key] != value:
+                    self._settings[key] = value
+                    changed = True
+            old = self._session if changed else None
+            if changed:
+                self._session = None
+                self._adapter = None
+                self._retry = None
+            settings = dict(self._settings)
+        if old is not None:
+            # In-flight requests keep their connection; idle pooled ones are closed.
+            old.close()
+        return settings
+
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                self._session, self._adapter = self._build_session(self._settings)
+                self._retry = self._adapter.max_retries
+            return self._session
+
+    def _pool_manager(self):
+        self.session()
+        with self._lock:
+            return (self._adapter.poolmanager if self._adapter is not None else None), self._retry
+
+    def _build_session(self, settings: Dict[str, Any]) -> Tuple[requests.Session, HTTPAdapter]:
+        retries = max(0, int(settings.get("retries") or 0))
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=0,
+            other=0,
+            backoff_factor=float(settings.get("backoff_factor") or 0),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=max(1, int(settings.get("pool_connections") or 1)),
+            pool_maxsize=max(1, int(settings.get("pool_maxsize") or 1)),
+            max_retries=retry,
+        )
+        session = requests.Session()
+        # requests re-scans proxy/netrc environment on every call, which costs more than the request
+        # itself on a kept-alive localhost connection. Only pay for it when a proxy is configured.
+        session.trust_env = bool(urllib.request.getproxies_environment()) or bool(os.environ.get("NETRC"))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session, adapter
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        return self.session().request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request_json(
+        self,
+        method: str,
+        url: str,
+        body: Optional[Dict[str, Any]] = None,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        timeout_s: float = 12.0,
+    ) -> Tuple[int, Any]:
+        """
+        Send an optional JSON body and return (http_status, parsed JSON body).
+
+        Non-JSON bodies come back as {"raw": text}. Transport errors raise (requests exceptions).
+        """
+        hdrs = {"Accept": "application/json"}
+        hdrs.update(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            hdrs["Content-Type"] = "application/json"
+        pool, retry = self._pool_manager()
+        if pool is None or self.session().trust_env:
+            resp = self.request(method.upper(), url, data=data, headers=hdrs, timeout=float(timeout_s))
+            status, content = int(resp.status_code), resp.content
+        else:
+            # Small JSON calls (mostly to the control plane) go straight to the session's urllib3 pool
+            # manager, with the same retry policy but without requests' per-call overhead.
+            resp = pool.request(
+                method.upper(), url, body=data, headers=hdrs, timeout=float(timeout_s), retries=retry, redirect=False
+            )
+            status, content = int(resp.status), resp.data
+        raw = content.decode("utf-8", errors="replace") if content else ""
+        try:
+            parsed = json.loads(raw) if raw else {}
+        except Exception:
+            parsed = {"raw": raw}
+        return status, parsed
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session = self._session, None
+            self._adapter = None
+            self._retry = None
+        if session is not None:
+            session.close()
+
+
+_SHARED = HttpTransport()
+
+
+def shared() -> HttpTransport:
+    """Process-wide transport used by every in-process HTTP caller."""
+    return _SHARED
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return _SHARED.get(url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return _SHARED.post(url, **kwargs)
+
+
+def is_retryable_error(ex: BaseException) -> bool:
+    """
+    Whether a failed call may succeed if repeated later: connection problems, timeouts and
+    429/5xx responses. Other HTTP errors (4xx) and non-transport exceptions are terminal.
+    """
+    if isinstance(ex, requests.HTTPError):
+        status = getattr(ex.response, "status_code", 0) or 0
+        return status == 429 or status >= 500
+    return isinstance(
+        ex, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+    )
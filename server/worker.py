@@ -1,4 +1,3 @@
-import contextlib
 import ctypes.util
 import io
 import json
@@ -11,7 +10,7 @@ import subprocess
 import sys
 import threading
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from typing import Dict, Optional
 from urllib.parse import parse_qs, urlparse
@@ -19,8 +18,11 @@ import urllib.request
 import urllib.error
 
 from agents.runtime import BrainRuntime
+from storage.audit import AuditWriter
+from storage.blobs import blob_response
 from storage.db import Storage
 from tools.router import ToolRouter
+from tools.shell import captured_output
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,6 +37,7 @@ if PYENV_DIR.exists():
     os.environ.setdefault("KUGUTZ_PYENV", str(PYENV_DIR))
 
 STORAGE = Storage(DATA_DIR / "app.db")
+AUDIT_WRITER = AuditWriter(STORAGE)
 TOOL_ROUTER = ToolRouter(DATA_DIR)
 
 
@@ -99,7 +102,7 @@ def _now_ms() -> int:
 
 def _emit_log(event: str, data: Dict):
     try:
-        STORAGE.add_audit(event, json.dumps(data))
+        AUDIT_WRITER.write(event, data)
     except Exception:
         pass
 
@@ -355,7 +358,7 @@ def _shell_exec_impl(cmd: str, raw_args: str, cwd: str) -> Dict:
     output = io.StringIO()
     code = 0
 
-    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+    with captured_output(output):
         try:
             if cmd == "pip":
                 # Heuristic guardrail:
@@ -505,6 +508,15 @@ BRAIN_RUNTIME = BrainRuntime(
 class WorkerHandler(BaseHTTPRequestHandler):
     server_version = "KugutzWorker/0.2"
 
+    def finish(self):
+        # ThreadingHTTPServer runs each request on a fresh thread; close the read connection the
+        # request may have opened instead of leaving it to the garbage collector. The module-level
+        # STORAGE, AUDIT_WRITER, TOOL_ROUTER and BRAIN_RUNTIME are shared by all request threads.
+        try:
+            super().finish()
+        finally:
+            STORAGE.release_connection()
+
     def do_GET(self):
         parsed = urlparse(self.path)
         if parsed.path == "/health":
@@ -516,25 +528,78 @@ class WorkerHandler(BaseHTTPRequestHandler):
         if parsed.path == "/brain/config":
             self._send_json(BRAIN_RUNTIME.get_config())
             return
-        if parsed.path == "/brain/messages":
+        if parsed.path in {"/brain/messages", "/brain/messages/stream"}:
             query = parse_qs(parsed.query or "")
             session_id = str((query.get("session_id") or [""])[0] or "").strip()
             try:
                 limit = int((query.get("limit") or ["50"])[0])
             except Exception:
                 limit = 50
-            if session_id:
-                self._send_json({"messages": BRAIN_RUNTIME.list_messages_for_session(session_id=session_id, limit=limit)})
+            try:
+                since_id = int((query.get("since_id") or ["0"])[0])
+                wait_ms = int((query.get("wait_ms") or ["0"])[0])
+                draft_rev = int((query.get("draft_rev") or ["0"])[0])
+            except Exception:
+                since_id, wait_ms, draft_rev = 0, 0, 0
+            if parsed.path == "/brain/messages/stream":
+                self._stream_messages(session_id or "default", since_id, limit)
+            elif session_id or since_id:
+                self._send_json(
+                    BRAIN_RUNTIME.poll_messages(
+                        session_id=session_id or "default",
+                        since_id=since_id,
+                        limit=limit,
+                        wait_ms=wait_ms,
+                        draft_rev=draft_rev,
+                    )
+                )
             else:
                 self._send_json({"messages": BRAIN_RUNTIME.list_messages(limit=limit)})
             return
+        if parsed.path == "/brain/search":
+            query = parse_qs(parsed.query or "")
+            q = (query.get("q") or [""])[0]
+            if not q.strip():
+                self._send_json({"error": "missing_query"}, status=400)
+                return
+            scope = (query.get("scope") or ["chat"])[0]
+            if scope != "chat":
+                AUDIT_WRITER.flush()
+            try:
+                ints = {k: int((query.get(k) or ["0"])[0]) for k in ("since", "until", "limit", "offset")}
+            except Exception:
+                self._send_json({"error": "invalid_request"}, status=400)
+                return
+            page = BRAIN_RUNTIME.search_history(
+                q,
+                scope=scope,
+                session_id=(query.get("session_id") or [""])[0],
+                since_ms=ints["since"],
+                until_ms=ints["until"],
+                limit=ints["limit"] or 20,
+                offset=ints["offset"],
+                order=(query.get("order") or ["rank"])[0],
+            )
+            self._send_json(page, status=400 if page.get("error") else 200)
+            return
+        if parsed.path.startswith("/brain/blobs/"):
+            digest = parsed.path.removeprefix("/brain/blobs/").strip()
+            status, headers, body = blob_response(STORAGE.blobs, digest, self.headers.get("Range", ""))
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            for chunk in body:
+                self.wfile.write(chunk)
+            return
         if parsed.path == "/brain/sessions":
             query = parse_qs(parsed.query or "")
             try:
                 limit = int((query.get("limit") or ["50"])[0])
+                before_id = int((query.get("before_id") or ["0"])[0])
             except Exception:
-                limit = 50
-            self._send_json({"sessions": BRAIN_RUNTIME.list_sessions(limit=limit)})
+                limit, before_id = 50, 0
+            self._send_json(BRAIN_RUNTIME.session_page(limit=limit, before_id=before_id))
             return
         if parsed.path.startswith("/vault/credentials/"):
             name = parsed.path.removeprefix("/vault/credentials/").strip()
@@ -564,6 +629,7 @@ class WorkerHandler(BaseHTTPRequestHandler):
             return
 
         if parsed.path == "/shutdown":
+            AUDIT_WRITER.flush()
             self._send_json({"status": "stopping"})
             threading.Thread(target=self.server.shutdown, daemon=True).start()
             return
@@ -610,7 +676,11 @@ class WorkerHandler(BaseHTTPRequestHandler):
             if not name.strip():
                 self._send_json({"error": "missing_name"}, status=400)
                 return
-            self._send_json(BRAIN_RUNTIME.enqueue_event(name=name, payload=body))
+            try:
+                delay_ms = int((payload or {}).get("delay_ms") or 0)
+            except (TypeError, ValueError):
+                delay_ms = 0
+            self._send_json(BRAIN_RUNTIME.enqueue_event(name=name, payload=body, delay_ms=delay_ms))
             return
         if parsed.path == "/brain/debug/comment":
             # Debug-only: insert a message into a given session without enqueuing agent work.
@@ -669,6 +739,36 @@ class WorkerHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(body)
 
+    def _stream_messages(self, session_id: str, since_id: int, limit: int):
+        # SSE: the current history (unless resuming from since_id), then each batch of new messages.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        cursor = max(0, since_id)
+        draft_rev = 0
+        try:
+            if not cursor:
+                page = BRAIN_RUNTIME.poll_messages(session_id=session_id, limit=limit)
+                cursor, draft_rev = page["cursor"], page["draft_rev"]
+                self.wfile.write(f"data: {json.dumps(page)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            while True:
+                # An unchanged streaming draft is not resent; the poll keeps waiting instead.
+                page = BRAIN_RUNTIME.poll_messages(
+                    session_id=session_id, since_id=cursor, limit=limit, wait_ms=15000, draft_rev=draft_rev
+                )
+                draft_rev = page["draft_rev"]
+                if page["messages"]:
+                    cursor = page["cursor"]
+                    chunk = f"data: {json.dumps(page)}\n\n"
+                else:
+                    chunk = ": keep-alive\n\n"
+                self.wfile.write(chunk.encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
     def _read_json_body(self):
         length = int(self.headers.get("Content-Length", "0") or "0")
         raw = self.rfile.read(length).decode("utf-8", errors="replace") if length > 0 else ""
@@ -690,8 +790,13 @@ class WorkerHandler(BaseHTTPRequestHandler):
 
 def main():
     BRAIN_RUNTIME.maybe_autostart()
-    server = HTTPServer(("127.0.0.1", 8776), WorkerHandler)
-    server.serve_forever()
+    # Threaded: long polls and message streams must not block other requests.
+    server = ThreadingHTTPServer(("127.0.0.1", 8776), WorkerHandler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    finally:
+        AUDIT_WRITER.close()
 
 
 if __name__ == "__main__":
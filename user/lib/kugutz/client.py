@@ -1,8 +1,13 @@
+import http.client
 import json
 import os
-import urllib.request
-import urllib.error
+import select
+import threading
 from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+# Methods that may be sent again after the connection dropped before a response arrived.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
 
 
 class KugutzClient:
@@ -15,6 +20,41 @@ class KugutzClient:
     def __init__(self, base_url: str = "http://127.0.0.1:8765", *, identity: Optional[str] = None):
         self.base_url = base_url.rstrip("/")
         self.identity = (identity or os.environ.get("KUGUTZ_IDENTITY") or os.environ.get("KUGUTZ_SESSION_ID") or "").strip()
+        parts = urlsplit(self.base_url)
+        self._scheme = parts.scheme or "http"
+        self._host = parts.hostname or "127.0.0.1"
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        # One kept-alive connection per thread (http.client connections are not thread-safe), so
+        # scripts making many small calls don't pay a TCP setup per request.
+        self._local = threading.local()
+
+    def _connection(self, timeout_s: float) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            # Readable while idle: the server closed it (or sent junk). Don't send a request into it.
+            self._drop_connection()
+            conn = None
+        if conn is None:
+            cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            conn = cls(self._host, self._port, timeout=timeout_s)
+            self._local.conn = conn
+        conn.timeout = timeout_s
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout_s)
+        return conn
+
+    def _drop_connection(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self._drop_connection()
 
     def request_json(
         self,
@@ -31,18 +71,39 @@ class KugutzClient:
             headers["Content-Type"] = "application/json; charset=utf-8"
         if self.identity:
             headers["X-Kugutz-Identity"] = self.identity
-        req = urllib.request.Request(self.base_url + path, data=data, method=method.upper(), headers=headers)
-        try:
-            with urllib.request.urlopen(req, timeout=float(timeout_s)) as resp:
+        method = method.upper()
+        for _ in range(2):
+            conn = self._connection(float(timeout_s))
+            reused = conn.sock is not None
+            sent = False
+            try:
+                conn.request(method, self._prefix + path, body=data, headers=headers)
+                sent = True
+                resp = conn.getresponse()
+                status = int(resp.status)
                 raw = resp.read().decode("utf-8", errors="replace")
-                return {"ok": True, "status": resp.status, "json": json.loads(raw) if raw else {}}
-        except urllib.error.HTTPError as ex:
-            raw = ex.read().decode("utf-8", errors="replace")
+                if resp.will_close:
+                    self._drop_connection()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as ex:
+                # The server closed the idle kept-alive connection; reconnect once. A non-idempotent
+                # request (tool/action POST) that was fully sent may already have run, so it is not repeated.
+                self._drop_connection()
+                if not reused or (sent and method not in IDEMPOTENT_METHODS):
+                    return {"ok": False, "status": 0, "error": str(ex)}
+            except Exception as ex:
+                self._drop_connection()
+                return {"ok": False, "status": 0, "error": str(ex)}
+        else:
+            return {"ok": False, "status": 0, "error": "connection_closed"}
+        if status >= 400:
             try:
                 j = json.loads(raw) if raw else {}
             except Exception:
                 j = {"raw": raw}
-            return {"ok": False, "status": int(ex.code), "json": j}
+            return {"ok": False, "status": status, "json": j}
+        try:
+            return {"ok": True, "status": status, "json": json.loads(raw) if raw else {}}
         except Exception as ex:
             return {"ok": False, "status": 0, "error": str(ex)}
 